@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measures the MagnetoPy CLI startup cost with ``python -X importtime``.
+
+Every case runs in a fresh interpreter from the repository root, so the results do not depend
+on modules already imported by this script. Run it from the repository root:
+
+    python benchmarks/benchmark_startup.py --repeat 5 --output startup.json
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from time import perf_counter
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def startup_cases() -> dict:
+    """
+    Returns the command line of every benchmark case: the CLI help and the import of every
+    command module as ``Magnetopy`` does it when the command is selected.
+
+    :return: Case name and interpreter arguments
+    :rtype: dict
+    """
+    sys.path.insert(0, REPOSITORY_PATH)
+    from magnetopy import COMMANDS
+
+    cases = {'--help': ['magnetopy.py', '--help']}
+    for command, (module_name, _) in COMMANDS.items():
+        cases[command] = ['-c', f'import magnetopy, importlib; importlib.import_module("{module_name}")']
+
+    return cases
+
+
+def run_case(arguments) -> dict:
+    """
+    Runs one case with ``-X importtime`` and parses the cumulative import times.
+
+    :param arguments: list, interpreter arguments
+    :return: Wall time in ms, total import time in ms and the slowest top-level imports
+    :rtype: dict
+    """
+    start = perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', *arguments],
+        cwd=REPOSITORY_PATH, capture_output=True, text=True
+    )
+    wall_ms = (perf_counter() - start) * 1e3
+
+    top_level = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        # Top-level imports are the ones without indentation, their cumulative time includes every nested import
+        if match and len(match.group(3)) == 1:
+            top_level[match.group(4)] = int(match.group(2)) / 1e3
+
+    return {
+        'wall_ms': wall_ms,
+        'import_ms': sum(top_level.values()),
+        'modules': dict(sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:5])
+    }
+
+
+def benchmark_startup(repeat) -> dict:
+    """
+    Runs every case ``repeat`` times and keeps the median times.
+
+    :param repeat: int
+    :return: Results by case
+    :rtype: dict
+    """
+    results = {}
+    for case, arguments in startup_cases().items():
+        runs = [run_case(arguments) for _ in range(repeat)]
+        results[case] = {
+            'wall_ms': statistics.median(run['wall_ms'] for run in runs),
+            'import_ms': statistics.median(run['import_ms'] for run in runs),
+            'modules': runs[-1]['modules']
+        }
+        print(f'{case:20s} wall {results[case]["wall_ms"]:8.1f} ms   imports {results[case]["import_ms"]:8.1f} ms   '
+              f'slowest: {", ".join(results[case]["modules"])}')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MagnetoPy CLI startup benchmark.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case, the median is reported (default: 5).')
+    parser.add_argument('--output', type=str, help='JSON file where the results are written (optional).')
+    args = parser.parse_args()
+
+    startup_results = benchmark_startup(args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version, 'repeat': args.repeat, 'results': startup_results}, f, indent=2)
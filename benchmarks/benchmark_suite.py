@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+MagnetoPy benchmark suite.
+
+Times every stage of the diurnal variation and IGRF pipelines on deterministic synthetic data
+and writes the results to JSON, so runs on different commits can be compared:
+
+    python benchmarks/benchmark_suite.py --rows 1000 100000 --igrf_points 1000 100000 --output new.json
+    python benchmarks/benchmark_suite.py --rows 1000 100000 --compare old.json
+
+Survey stages: csv_load, date_parsing, base_matching, diurnal_correction, save, and
+logging_info and logging_quiet (one logger lookup and one record per survey row, formatted into
+an in-memory stream at --log-level INFO, and dropped with --quiet). IGRF
+stages: decimal_dates, coefficients, legendre, synthesis, components and lookup (interpolation
+from an IGRF lookup table of a one degree survey block).
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_PATH)
+os.chdir(REPOSITORY_PATH)
+
+from benchmarks.synthetic_survey import generate_survey, generate_igrf_points, STATIONS_COLS, BASE_STATION_COLS
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+from src.magnetopy.magnetopy_utils.magnetopy_base_station_helper import MagnetoPyBaseStationHelper
+from src.magnetopy.magnetopy_utils.magnetopy_conversions_helper import MagnetoPyConversionsHelper
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper, IGRFCoefficientProvider, IGRFLookupTable
+from src.magnetopy.magnetopy_core.diurnal_variation import DiurnalVariation
+
+BENCHMARK_PROJECT = 'benchmark_suite'
+
+
+def time_stage(function, repeat) -> tuple:
+    """
+    Runs ``function`` ``repeat`` times and returns the best time and the last result.
+
+    :param function: callable without arguments
+    :param repeat: int
+    :return: Seconds and result
+    :rtype: tuple
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function()
+        best = min(best, perf_counter() - start)
+
+    return best, result
+
+
+def stage_result(seconds, items) -> dict:
+    """
+    :param seconds: float
+    :param items: int, rows or points processed by the stage
+    :return: Seconds and throughput of a stage
+    :rtype: dict
+    """
+    return {'seconds': seconds, 'items_per_second': items / seconds if seconds > 0 else None}
+
+
+def benchmark_logging(stations_df, date_col, time_col, level, repeat) -> float:
+    """
+    Times the per-record logging path on the rows of a survey: every row fetches its logger and
+    logs its date and time. The records are written to an in-memory stream, so the time covers
+    their formatting but not the terminal.
+
+    :param stations_df: pd.DataFrame
+    :param date_col: str
+    :param time_col: str
+    :param level: str or int, level of the MagnetoPy loggers during the stage
+    :param repeat: int
+    :return: Seconds
+    :rtype: float
+    """
+    records = list(zip(stations_df[date_col].tolist(), stations_df[time_col].tolist()))
+
+    def log_records():
+        for index, (date_str, time_str) in enumerate(records):
+            magnetopy_logging = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyBenchmark: logging')
+            magnetopy_logging.info(f'Station {index}: {date_str} {time_str}')
+
+    handler = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyBenchmark: logging').handlers[0]
+    stream = handler.setStream(io.StringIO())
+    MagnetopyLogging.set_level(level)
+    try:
+        seconds, _ = time_stage(log_records, repeat)
+    finally:
+        MagnetopyLogging.set_level(logging.ERROR)
+        handler.setStream(stream)
+
+    return seconds
+
+
+def benchmark_survey(rows, data_folder, repeat) -> dict:
+    """
+    Times the diurnal variation pipeline stages on a synthetic survey of ``rows`` readings.
+
+    :param rows: int
+    :param data_folder: str
+    :param repeat: int
+    :return: Results of every stage
+    :rtype: dict
+    """
+    stations_file, base_station_file = generate_survey(data_folder, rows)
+    stations_cols = STATIONS_COLS.split(',')
+    base_station_cols = BASE_STATION_COLS.split(',')
+    stages = {}
+
+    seconds, (stations_df, base_stations_df) = time_stage(lambda: (
+        MagnetoPyFilesHelper.read_columns(stations_file, stations_cols, MagnetoPyFilesHelper.column_dtypes(stations_cols)),
+        MagnetoPyFilesHelper.read_columns(base_station_file, base_station_cols, MagnetoPyFilesHelper.column_dtypes(base_station_cols))
+    ), repeat)
+    stages['csv_load'] = stage_result(seconds, rows)
+
+    # --quiet is the same as --log-level ERROR
+    stages['logging_info'] = stage_result(benchmark_logging(stations_df, stations_cols[0], stations_cols[1], 'INFO', repeat), rows)
+    stages['logging_quiet'] = stage_result(benchmark_logging(stations_df, stations_cols[0], stations_cols[1], logging.ERROR, repeat), rows)
+
+    seconds, ((stations_df, _), (base_stations_df, _)) = time_stage(lambda: (
+        MagnetoPyFilesHelper.parse_date_time_columns(stations_df.copy(), stations_cols[0], stations_cols[1]),
+        MagnetoPyFilesHelper.parse_date_time_columns(base_stations_df.copy(), base_station_cols[0], base_station_cols[1])
+    ), repeat)
+    stages['date_parsing'] = stage_result(seconds, rows)
+
+    seconds, _ = time_stage(lambda: MagnetoPyBaseStationHelper.nearest_reading_indices(base_stations_df['datetime'], stations_df['datetime']), repeat)
+    stages['base_matching'] = stage_result(seconds, rows)
+
+    base_stations_df['magfield_mean'] = base_stations_df.groupby(base_station_cols[0])[base_station_cols[2]].transform('mean')
+    stations_df = stations_df.add_prefix('sta_')
+    base_stations_df = base_stations_df.add_prefix('base_')
+    seconds, result_df = time_stage(lambda: DiurnalVariation.correct_chunk(stations_df, base_stations_df, stations_cols, base_station_cols), repeat)
+    stages['diurnal_correction'] = stage_result(seconds, rows)
+
+    seconds, _ = time_stage(lambda: MagnetoPyFilesHelper.save_data(result_df, BENCHMARK_PROJECT), repeat)
+    stages['save'] = stage_result(seconds, rows)
+
+    return {'rows': rows, 'stages': stages}
+
+
+def benchmark_igrf(points, repeat) -> dict:
+    """
+    Times the IGRF stages on ``points`` random query points at observation dates spread over
+    the IGRF-13 validity period.
+
+    :param points: int
+    :param repeat: int
+    :return: Results of every stage
+    :rtype: dict
+    """
+    helper = MagnetoPyIGRFHelper()
+    igrf = helper.load_igrf_coefficients()
+    nmax = igrf.parameters['nmax']
+
+    lat, lon = generate_igrf_points(points)
+    dates = np.linspace(1990, 2024.9, points)
+    stages = {}
+
+    # Observation times every 10 ms from 1990
+    datetimes = np.datetime64('1990-01-01', 'ns') + np.arange(points) * np.timedelta64(10, 'ms')
+    seconds, _ = time_stage(lambda: MagnetoPyConversionsHelper.convert_datetime64_to_decimal_dates(datetimes), repeat)
+    stages['decimal_dates'] = stage_result(seconds, points)
+
+    provider = IGRFCoefficientProvider(igrf)
+    seconds, _ = time_stage(lambda: IGRFCoefficientProvider(igrf).coefficients(dates), repeat)
+    stages['coefficients'] = stage_result(seconds, points)
+
+    altitude = np.full(points, 2.0)
+    radius, theta, _, _ = helper.gg_to_geo(altitude, 90 - lat)
+    phi = lon
+
+    seconds, _ = time_stage(lambda: helper.legendre_poly_packed(nmax, theta), repeat)
+    stages['legendre'] = stage_result(seconds, points)
+
+    coeffs_2020 = provider.coefficients(2020.0)
+    seconds, _ = time_stage(lambda: helper.synth_values(coeffs_2020, radius, theta, phi), repeat)
+    stages['synthesis'] = stage_result(seconds, points)
+
+    coeffs_sv, coeffsm = provider.epoch_coefficients(2020.0)
+    seconds, _ = time_stage(lambda: helper.igrf_components(coeffs_2020, coeffs_sv, coeffsm, 2.0, lat, lon, nmax), repeat)
+    stages['components'] = stage_result(seconds, points)
+
+    # Dense survey block of one degree and 3 km of altitude, the table is built once
+    table = IGRFLookupTable(helper, igrf, provider, 2020.0, (20, 21), (-105, -104), (0, 3), tolerance=0.1)
+    rng = np.random.default_rng(0)
+    block = (rng.uniform(20, 21, points), rng.uniform(-105, -104, points), rng.uniform(0, 3, points))
+    seconds, _ = time_stage(lambda: table.components(*block, 2020.0), repeat)
+    stages['lookup'] = stage_result(seconds, points)
+
+    return {'points': points, 'stages': stages}
+
+
+def metadata() -> dict:
+    """
+    :return: Commit, interpreter, library versions and machine of the run
+    :rtype: dict
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPOSITORY_PATH, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare(results, reference, threshold) -> None:
+    """
+    Prints the time ratio of every stage against a reference run and flags the regressions.
+
+    :param results: dict, current run
+    :param reference: dict, reference run
+    :param threshold: float, ratio above which a stage is reported as a regression
+    :return: Nothing to return
+    :rtype: None
+    """
+    print(f'\nComparison with {reference["metadata"].get("commit")} ({reference["metadata"].get("date")})')
+    for section, size_key in [('survey', 'rows'), ('igrf', 'points')]:
+        reference_runs = {run[size_key]: run for run in reference.get(section, [])}
+        for run in results.get(section, []):
+            reference_run = reference_runs.get(run[size_key])
+            if reference_run is None:
+                continue
+            for stage, result in run['stages'].items():
+                if stage not in reference_run['stages']:
+                    continue
+                ratio = result['seconds'] / reference_run['stages'][stage]['seconds']
+                flag = '  REGRESSION' if ratio > threshold else ''
+                size = f'{size_key}={run[size_key]}'
+                print(f'{section:7s} {size:17s} {stage:20s} {ratio:6.2f}x{flag}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MagnetoPy benchmark suite.')
+    parser.add_argument('--rows', type=int, nargs='*', default=[1000, 100000], help='Synthetic survey sizes (default: 1000 100000).')
+    parser.add_argument('--igrf_points', type=int, nargs='*', default=[1000, 100000], help='Number of IGRF query points (default: 1000 100000).')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the best time is reported (default: 3).')
+    parser.add_argument('--data_folder', type=str, help='Folder where the synthetic surveys are kept (default: a temporary folder).')
+    parser.add_argument('--output', type=str, help='JSON file where the results are written (optional).')
+    parser.add_argument('--compare', type=str, help='JSON results of a previous run to compare with (optional).')
+    parser.add_argument('--threshold', type=float, default=1.1, help='Time ratio reported as a regression (default: 1.1).')
+    args = parser.parse_args()
+
+    MagnetopyLogging.set_level(logging.ERROR)
+
+    data_folder = args.data_folder or tempfile.mkdtemp(prefix='magnetopy_benchmark_')
+    results = {'metadata': metadata(), 'survey': [], 'igrf': []}
+
+    try:
+        for survey_rows in args.rows:
+            results['survey'].append(benchmark_survey(survey_rows, data_folder, args.repeat))
+            for name, stage in results['survey'][-1]['stages'].items():
+                print(f'survey  {"rows=" + str(survey_rows):17s} {name:20s} {stage["seconds"]:10.4f} s {stage["items_per_second"]:14.0f} rows/s')
+
+        for igrf_points in args.igrf_points:
+            results['igrf'].append(benchmark_igrf(igrf_points, args.repeat))
+            for name, stage in results['igrf'][-1]['stages'].items():
+                print(f'igrf    {"points=" + str(igrf_points):17s} {name:20s} {stage["seconds"]:10.4f} s {stage["items_per_second"]:14.0f} points/s')
+    finally:
+        shutil.rmtree(os.path.join(REPOSITORY_PATH, 'resources', BENCHMARK_PROJECT), ignore_errors=True)
+        if args.data_folder is None:
+            shutil.rmtree(data_folder, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f), args.threshold)
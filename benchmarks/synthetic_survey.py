@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic survey generator used by the benchmarks.
+
+Writes a rover stations file and a base station file with the layout of the cerritos example
+(``date`` as dd/mm/YYYY and ``time`` as HHMMSS). The same size and seed always give the same
+files. Rows are generated and written in blocks, so files of 1e8 rows never have to fit in
+memory.
+
+    python benchmarks/synthetic_survey.py --rows 1000000 --folder /tmp/survey
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+STATIONS_COLS = 'date,time,gpslat,gpslon,magfield'
+BASE_STATION_COLS = 'date,time,nT'
+
+# Survey layout: readings every 10 s, 3600 readings per field day from 08:00, lines of 500 readings
+START_DATE = np.datetime64('2019-03-26')
+FIRST_READING_SECONDS = 8 * 3600
+READING_INTERVAL = 10
+READINGS_PER_DAY = 3600
+READINGS_PER_LINE = 500
+# Base station readings every 20 s, from 5 minutes before the first reading to 5 minutes after the last
+BASE_INTERVAL = 20
+BASE_MARGIN = 300
+ORIGIN_LAT = 19.66
+ORIGIN_LON = -101.21
+LINE_SPACING_DEG = 0.001
+STEP_DEG = 0.00002
+BLOCK_ROWS = 1_000_000
+
+
+def format_dates(day_index) -> np.ndarray:
+    """
+    Formats field day numbers as dd/mm/YYYY, formatting every distinct day once.
+
+    :param day_index: numpy.ndarray of int
+    :return: numpy.ndarray of str
+    """
+    unique_days, inverse = np.unique(day_index, return_inverse=True)
+    dates = pd.to_datetime(START_DATE + unique_days.astype('timedelta64[D]')).strftime('%d/%m/%Y').to_numpy()
+
+    return dates[inverse]
+
+
+def format_times(seconds) -> np.ndarray:
+    """
+    Formats seconds of the day as HHMMSS integers.
+
+    :param seconds: numpy.ndarray of int
+    :return: numpy.ndarray of int
+    """
+    return (seconds // 3600) * 10000 + (seconds // 60 % 60) * 100 + seconds % 60
+
+
+def diurnal_signal(day_index, seconds) -> np.ndarray:
+    """
+    Smooth daily variation of the external field, in nT.
+
+    :param day_index: numpy.ndarray of int
+    :param seconds: numpy.ndarray of int
+    :return: numpy.ndarray of float
+    """
+    return 25 * np.sin(2 * np.pi * (seconds - 6 * 3600) / 86400) + 3 * np.sin(day_index)
+
+
+def generate_stations_block(start, stop, rng) -> pd.DataFrame:
+    """
+    Generates the rover readings ``start`` to ``stop``.
+
+    :param start: int
+    :param stop: int
+    :param rng: numpy.random.Generator
+    :return: Rover readings
+    :rtype: pd.DataFrame
+    """
+    reading = np.arange(start, stop)
+    day_index = reading // READINGS_PER_DAY
+    seconds = FIRST_READING_SECONDS + (reading % READINGS_PER_DAY) * READING_INTERVAL
+
+    line = reading // READINGS_PER_LINE
+    step = reading % READINGS_PER_LINE
+    # Lines are walked back and forth
+    step = np.where(line % 2 == 0, step, READINGS_PER_LINE - 1 - step)
+    lat = ORIGIN_LAT + (line % 200) * LINE_SPACING_DEG
+    lon = ORIGIN_LON + step * STEP_DEG
+
+    anomaly = 150 * np.exp(-((lat - ORIGIN_LAT - 0.1) ** 2 + (lon - ORIGIN_LON - 0.005) ** 2) / 0.002 ** 2)
+    magfield = 40120 + anomaly + diurnal_signal(day_index, seconds) + rng.normal(0, 0.5, reading.size)
+
+    return pd.DataFrame({
+        'date': format_dates(day_index),
+        'time': format_times(seconds),
+        'station': reading,
+        'magfield': magfield.round(2),
+        'gpslat': lat.round(6),
+        'gpslon': lon.round(6)
+    })
+
+
+def generate_base_station(days, rng) -> pd.DataFrame:
+    """
+    Generates the base station readings of every field day.
+
+    :param days: int
+    :param rng: numpy.random.Generator
+    :return: Base station readings
+    :rtype: pd.DataFrame
+    """
+    last_reading_seconds = FIRST_READING_SECONDS + (READINGS_PER_DAY - 1) * READING_INTERVAL
+    day_seconds = np.arange(FIRST_READING_SECONDS - BASE_MARGIN, last_reading_seconds + BASE_MARGIN + 1, BASE_INTERVAL)
+
+    day_index = np.repeat(np.arange(days), day_seconds.size)
+    seconds = np.tile(day_seconds, days)
+    nT = 40125 + diurnal_signal(day_index, seconds) + rng.normal(0, 0.2, seconds.size)
+
+    return pd.DataFrame({
+        'date': format_dates(day_index),
+        'time': format_times(seconds),
+        'nT': nT.round(2),
+        'sq': 99
+    })
+
+
+def generate_survey(folder, rows, seed=0) -> tuple:
+    """
+    Writes ``rows`` rover readings and the base station readings that cover them.
+
+    :param folder: str
+    :param rows: int
+    :param seed: int
+    :return: Stations file path and base station file path
+    :rtype: tuple
+    """
+    os.makedirs(folder, exist_ok=True)
+    stations_file = os.path.join(folder, f'synthetic_stations_{rows}.csv')
+    base_station_file = os.path.join(folder, f'synthetic_base_{rows}.csv')
+
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, rows, BLOCK_ROWS):
+        block = generate_stations_block(start, min(start + BLOCK_ROWS, rows), rng)
+        block.to_csv(stations_file, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+    days = (rows - 1) // READINGS_PER_DAY + 1
+    generate_base_station(days, rng).to_csv(base_station_file, index=False)
+
+    return stations_file, base_station_file
+
+
+def generate_igrf_points(points, seed=0) -> tuple:
+    """
+    Generates random geodetic query points over the globe, poles included.
+
+    :param points: int
+    :param seed: int
+    :return: Latitudes and longitudes in degrees
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(seed)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, points)))
+    lon = rng.uniform(-180, 180, points)
+    lat[:2] = [90.0, -90.0][:points]
+
+    return lat, lon
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MagnetoPy synthetic survey generator.')
+    parser.add_argument('--rows', type=int, required=True, help='Number of rover readings.')
+    parser.add_argument('--folder', type=str, required=True, help='Folder where the files are written.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+    args = parser.parse_args()
+
+    print(*generate_survey(args.folder, args.rows, args.seed), sep='\n')
@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
+from importlib import import_module
 from logging import getLogger
 from argparse import Namespace
 
-from src.magnetopy.magnetopy_core.diurnal_variation import DiurnalVariation
-from src.magnetopy.magnetopy_core.calculate_igrf import CalculateIGRF
-from src.magnetopy.magnetopy_core.plot_profile import PlotProfile
 from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
 from src.magnetopy.magnetopy_cli.magnetopy_parser import MagnetopyParser
 
+# Module and class of every command. The module is only imported when its command is selected,
+# so pandas, scipy and matplotlib are not loaded for --help or for commands that do not use them.
+COMMANDS = {
+    'diurnal-variation': ('src.magnetopy.magnetopy_core.diurnal_variation', 'DiurnalVariation'),
+    'calculate-igrf': ('src.magnetopy.magnetopy_core.calculate_igrf', 'CalculateIGRF'),
+    'reduce': ('src.magnetopy.magnetopy_core.reduce', 'Reduce'),
+    'igrf-grid': ('src.magnetopy.magnetopy_core.igrf_grid', 'IGRFGrid'),
+    'batch': ('src.magnetopy.magnetopy_core.batch', 'Batch'),
+    'plot-profile': ('src.magnetopy.magnetopy_core.plot_profile', 'PlotProfile')
+}
+
 
 class Magnetopy:
     
@@ -16,6 +25,7 @@ class Magnetopy:
 
         self.__parser: MagnetopyParser = MagnetopyParser()
         self.__arguments: Namespace = self.__parser.get_arguments()
+        MagnetopyLogging.set_level('ERROR' if self.__arguments.quiet else self.__arguments.log_level)
         self.command: str = self.__arguments.command
 
         self.__magnetopy_flow()
@@ -29,15 +39,11 @@ class Magnetopy:
         """
         self.__print_banner()
 
-        if self.command == 'diurnal-variation':
-            self.magnetopy_logging.info("diurnal-variation command selected")
-            DiurnalVariation(arguments=self.__arguments)
-        elif self.command == 'calculate-igrf':
-            self.magnetopy_logging.info("calculate-igrf command selected")
-            CalculateIGRF(arguments=self.__arguments)
-        elif self.command == 'plot-profile':
-            self.magnetopy_logging.info("plot-profile command selected")
-            PlotProfile(arguments=self.__arguments)
+        if self.command in COMMANDS:
+            self.magnetopy_logging.info(f"{self.command} command selected")
+            module_name, class_name = COMMANDS[self.command]
+            command_class = getattr(import_module(module_name), class_name)
+            command_class(arguments=self.__arguments)
 
     def __print_banner(self) -> None:
         """
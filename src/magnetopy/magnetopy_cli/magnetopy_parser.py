@@ -14,6 +14,18 @@ class MagnetopyParser:
             prog='MagnetoPy', 
             description='MagnetoPy is an open-source tool that performs magnetic data processing.'
             )
+        self.__magnetopy_parser.add_argument(
+            '--log-level',
+            type=str.upper,
+            choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+            default='DEBUG',
+            help='Minimum level of the log messages shown (default: DEBUG).'
+        )
+        self.__magnetopy_parser.add_argument(
+            '--quiet',
+            action='store_true',
+            help='Only show errors, same as --log-level ERROR.'
+        )
         self.__subparsers = self.__magnetopy_parser.add_subparsers(
             title='commands',
             description='magnetopy commands',
@@ -53,16 +65,106 @@ class MagnetopyParser:
         diurnal_variation.add_argument(
             '--base_station_file',
             type=str,
-            help='Base station file path (required).',
+            nargs='+',
+            help='Base station file path, or several base station files with their coordinates in --base_station_cols (required).',
             required=True
         )
         diurnal_variation.add_argument(
             '--base_station_cols',
             type=str,
-            help='Base station file columns names separated by commas (required). In the following order: date,time,magnetic_field.',
+            help='Base station file columns names separated by commas (required). In the following order: date,time,magnetic_field, followed by latitude,longitude when several base station files are given.',
             required=True
         )
+        diurnal_variation.add_argument(
+            '--base_index_dir',
+            type=str,
+            help='Folder where the parsed base station readings are kept as memory-mapped indexes keyed by the hash of the base station file, so later runs open them instead of parsing the file again (optional).'
+        )
+        diurnal_variation.add_argument(
+            '--base_interpolation',
+            type=str,
+            choices=['nearest', 'linear', 'cubic'],
+            default='nearest',
+            help='Method used to estimate the base station field at each station time (default: nearest).'
+        )
+        diurnal_variation.add_argument(
+            '--max_base_gap',
+            type=float,
+            help='Maximum gap in seconds between base station readings. Stations that fall in a longer base station outage are flagged in the base_gap_flag column (optional).'
+        )
+        self.__add_output_arguments(diurnal_variation)
+        self.__add_invalid_dates_arguments(diurnal_variation)
+        self.__add_profile_arguments(diurnal_variation)
     
+    @staticmethod
+    def __add_output_arguments(command_parser) -> None:
+        """
+        Add the output file parameters shared by the commands that write a table.
+
+        :param command_parser: argparse.ArgumentParser
+        :return: Nothing to return
+        :rtype: None
+        """
+        command_parser.add_argument(
+            '--output_format',
+            type=str,
+            choices=['csv', 'parquet', 'feather', 'npz'],
+            default='csv',
+            help='Output file format (default: csv). The parquet and feather formats require the pyarrow package.'
+        )
+        command_parser.add_argument(
+            '--output_compression',
+            type=str,
+            help='Compression of the output file (optional). csv: gzip, bz2, xz; parquet: snappy, gzip, zstd, brotli, lz4; feather: zstd, lz4; npz: zip.'
+        )
+        command_parser.add_argument(
+            '--output_cols',
+            type=str,
+            help='Output columns names separated by commas without spaces (optional). By default every column is written.'
+        )
+        command_parser.add_argument(
+            '--chunk_size',
+            type=int,
+            help='Number of stations read, processed and written at a time (optional). By default the whole stations file is loaded.'
+        )
+
+    @staticmethod
+    def __add_invalid_dates_arguments(command_parser) -> None:
+        """
+        Add the parameter that chooses what happens to the rows whose date or time cannot be parsed.
+
+        :param command_parser: argparse.ArgumentParser
+        :return: Nothing to return
+        :rtype: None
+        """
+        command_parser.add_argument(
+            '--invalid_dates',
+            type=str,
+            choices=['drop', 'raise'],
+            default='drop',
+            help='Rows whose date or time cannot be parsed are dropped and their row numbers logged, or stop the run with raise (default: drop).'
+        )
+
+    @staticmethod
+    def __add_profile_arguments(command_parser) -> None:
+        """
+        Add the profiling parameters shared by every command.
+
+        :param command_parser: argparse.ArgumentParser
+        :return: Nothing to return
+        :rtype: None
+        """
+        command_parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Record the wall time, CPU time, rows per second and peak memory of every stage and save them as a JSON report next to the output (optional).'
+        )
+        command_parser.add_argument(
+            '--profile_cprofile',
+            action='store_true',
+            help='With --profile, also save the cProfile statistics of the slowest stage as a .prof file (optional).'
+        )
+
     def __add_calculate_igrf_arguments(self) -> None:
         """
         Add the calculate-igrf command and parameters.
@@ -89,21 +191,306 @@ class MagnetopyParser:
         calculate_igrf.add_argument(
             '--stations_cols',
             type=str,
-            help='Stations file columns names separated by commas (required).',
+            help='Stations file columns names separated by commas without spaces (required). In the following order: date,time,latitude,longitude,magnetic_field and optionally altitude in km.',
             required=True
         )
         calculate_igrf.add_argument(
+            '--altitude',
+            type=float,
+            help='Altitude in km used for every station (required without an altitude column in --stations_cols).',
+            required=False
+        )
+        calculate_igrf.add_argument(
+            '--date',
+            type=str,
+            help='Date in format YYYY-MM-DD used for every station (optional). By default each station is evaluated at its own observation date and time.',
+            required=False
+        )
+        calculate_igrf.add_argument(
+            '--igrf_mode',
+            type=str,
+            choices=['average', 'station'],
+            default='average',
+            help='Compute a single IGRF value at the average station position or one value per station (default: average).'
+        )
+        calculate_igrf.add_argument(
+            '--igrf_lookup_tolerance',
+            type=float,
+            help='In station mode, interpolate the IGRF from a latitude, longitude and altitude table of the survey bounding box refined until its error at random points is below this tolerance in nT (optional). By default every station is synthesized.',
+            required=False
+        )
+        calculate_igrf.add_argument(
+            '--memory_budget',
+            type=float,
+            default=256,
+            help='Memory budget in MB used to split the per-station IGRF synthesis into chunks (default: 256).'
+        )
+        self.__add_output_arguments(calculate_igrf)
+        self.__add_invalid_dates_arguments(calculate_igrf)
+        self.__add_profile_arguments(calculate_igrf)
+
+    def __add_reduce_arguments(self) -> None:
+        """
+        Add the reduce command and parameters.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        reduce = self.__subparsers.add_parser(
+            'reduce',
+            help='Command that applies the diurnal variation correction, computes the IGRF and the residual anomaly in one pass.'
+        )
+        reduce.add_argument(
+            '--project_name',
+            type=str,
+            help='Project name (without spaces or special characters) to name the folder where the output will be saved (required).',
+            required=True
+        )
+        reduce.add_argument(
+            '--stations_file',
+            type=str,
+            help='Stations file path (required).',
+            required=True
+        )
+        reduce.add_argument(
+            '--stations_cols',
+            type=str,
+            help='Stations file columns names separated by commas without spaces (required). In the following order: date,time,latitude,longitude,magnetic_field and optionally altitude in km.',
+            required=True
+        )
+        reduce.add_argument(
+            '--base_station_file',
+            type=str,
+            nargs='+',
+            help='Base station file path, or several base station files with their coordinates in --base_station_cols (required).',
+            required=True
+        )
+        reduce.add_argument(
+            '--base_station_cols',
+            type=str,
+            help='Base station file columns names separated by commas (required). In the following order: date,time,magnetic_field, followed by latitude,longitude when several base station files are given.',
+            required=True
+        )
+        reduce.add_argument(
+            '--base_index_dir',
+            type=str,
+            help='Folder where the parsed base station readings are kept as memory-mapped indexes keyed by the hash of the base station file, so later runs open them instead of parsing the file again (optional).'
+        )
+        reduce.add_argument(
+            '--altitude',
+            type=float,
+            help='Altitude in km used for every station (required without an altitude column in --stations_cols).',
+            required=False
+        )
+        reduce.add_argument(
+            '--date',
+            type=str,
+            help='Date in format YYYY-MM-DD used for every station (optional). By default each station is evaluated at its own observation date and time.'
+        )
+        reduce.add_argument(
+            '--base_interpolation',
+            type=str,
+            choices=['nearest', 'linear', 'cubic'],
+            default='nearest',
+            help='Method used to estimate the base station field at each station time (default: nearest).'
+        )
+        reduce.add_argument(
+            '--max_base_gap',
+            type=float,
+            help='Maximum gap in seconds between base station readings. Stations that fall in a longer base station outage are flagged in the base_gap_flag column (optional).'
+        )
+        reduce.add_argument(
+            '--igrf_mode',
+            type=str,
+            choices=['average', 'station'],
+            default='station',
+            help='Compute a single IGRF value at the average station position or one value per station (default: station).'
+        )
+        reduce.add_argument(
+            '--igrf_lookup_tolerance',
+            type=float,
+            help='In station mode, interpolate the IGRF from a latitude, longitude and altitude table of the survey bounding box refined until its error at random points is below this tolerance in nT (optional). By default every station is synthesized.',
+            required=False
+        )
+        reduce.add_argument(
+            '--memory_budget',
+            type=float,
+            default=256,
+            help='Memory budget in MB used to split the per-station IGRF synthesis into chunks (default: 256).'
+        )
+        self.__add_output_arguments(reduce)
+        self.__add_invalid_dates_arguments(reduce)
+        self.__add_profile_arguments(reduce)
+
+    def __add_igrf_grid_arguments(self) -> None:
+        """
+        Add the igrf-grid command and parameters.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        igrf_grid = self.__subparsers.add_parser(
+            'igrf-grid',
+            help='Command that computes the IGRF components over a latitude/longitude bounding box.'
+        )
+        igrf_grid.add_argument(
+            '--project_name',
+            type=str,
+            help='Project name (without spaces or special characters) to name the folder where the output will be saved (required).',
+            required=True
+        )
+        igrf_grid.add_argument(
+            '--bbox',
+            type=str,
+            help='Bounding box in degrees separated by commas without spaces (required). In the following order: lat_min,lat_max,lon_min,lon_max.',
+            required=True
+        )
+        igrf_grid.add_argument(
+            '--resolution',
+            type=float,
+            help='Grid spacing in degrees (required).',
+            required=True
+        )
+        igrf_grid.add_argument(
             '--altitude',
             type=float,
             help='Altitude in km (required).',
             required=True
         )
-        calculate_igrf.add_argument(
+        igrf_grid.add_argument(
             '--date',
             type=str,
             help='Date in format YYYY-MM-DD (required).',
             required=True
         )
+        igrf_grid.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes used to compute the grid tiles (default: 1).'
+        )
+        igrf_grid.add_argument(
+            '--memory_budget',
+            type=float,
+            default=256,
+            help='Memory budget in MB of each grid tile (default: 256).'
+        )
+        igrf_grid.add_argument(
+            '--output_format',
+            type=str,
+            choices=['npz', 'netcdf'],
+            default='npz',
+            help='Output file format: compressed numpy arrays or NetCDF (default: npz).'
+        )
+        self.__add_profile_arguments(igrf_grid)
+
+    def __add_batch_arguments(self) -> None:
+        """
+        Add the batch command and parameters.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        batch = self.__subparsers.add_parser(
+            'batch',
+            help='Command that runs diurnal-variation or calculate-igrf on many stations files in parallel.'
+        )
+        batch.add_argument(
+            '--operation',
+            type=str,
+            choices=['diurnal-variation', 'calculate-igrf'],
+            help='Command run on every stations file (required).',
+            required=True
+        )
+        batch.add_argument(
+            '--project_name',
+            type=str,
+            help='Project name (without spaces or special characters) to name the folder where the outputs will be saved (required).',
+            required=True
+        )
+        stations_files = batch.add_mutually_exclusive_group(required=True)
+        stations_files.add_argument(
+            '--stations_glob',
+            type=str,
+            help='Glob pattern of the stations files, quoted so the shell does not expand it.'
+        )
+        stations_files.add_argument(
+            '--manifest',
+            type=str,
+            help='Text file with one stations file path per line. Relative paths are resolved from the manifest folder.'
+        )
+        batch.add_argument(
+            '--stations_cols',
+            type=str,
+            help='Stations files columns names separated by commas without spaces (required). In the following order: date,time,latitude,longitude,magnetic_field.',
+            required=True
+        )
+        batch.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes (default: 1).'
+        )
+        batch.add_argument(
+            '--base_station_file',
+            type=str,
+            nargs='+',
+            help='Base station file paths, loaded once for the whole batch (required by diurnal-variation).'
+        )
+        batch.add_argument(
+            '--base_station_cols',
+            type=str,
+            help='Base station file columns names separated by commas (required by diurnal-variation). In the following order: date,time,magnetic_field, followed by latitude,longitude when several base station files are given.'
+        )
+        batch.add_argument(
+            '--base_index_dir',
+            type=str,
+            help='Folder where the parsed base station readings are kept as memory-mapped indexes keyed by the hash of the base station file, so later runs open them instead of parsing the file again (optional).'
+        )
+        batch.add_argument(
+            '--base_interpolation',
+            type=str,
+            choices=['nearest', 'linear', 'cubic'],
+            default='nearest',
+            help='Method used to estimate the base station field at each station time (default: nearest).'
+        )
+        batch.add_argument(
+            '--max_base_gap',
+            type=float,
+            help='Maximum gap in seconds between base station readings (optional).'
+        )
+        batch.add_argument(
+            '--altitude',
+            type=float,
+            help='Altitude in km (required by calculate-igrf without an altitude column in --stations_cols).'
+        )
+        batch.add_argument(
+            '--date',
+            type=str,
+            help='Date in format YYYY-MM-DD used for every station (optional). By default each station is evaluated at its own observation date and time.'
+        )
+        batch.add_argument(
+            '--igrf_mode',
+            type=str,
+            choices=['average', 'station'],
+            default='average',
+            help='Compute a single IGRF value at the average station position of each file or one value per station (default: average).'
+        )
+        batch.add_argument(
+            '--igrf_lookup_tolerance',
+            type=float,
+            help='In station mode, interpolate the IGRF from a latitude, longitude and altitude table of the survey bounding box refined until its error at random points is below this tolerance in nT (optional). By default every station is synthesized.',
+            required=False
+        )
+        batch.add_argument(
+            '--memory_budget',
+            type=float,
+            default=256,
+            help='Memory budget in MB used to split the per-station IGRF synthesis into chunks (default: 256).'
+        )
+        self.__add_output_arguments(batch)
+        self.__add_invalid_dates_arguments(batch)
+        self.__add_profile_arguments(batch)
 
     def __add_plot_profile_arguments(self) -> None:
         """
@@ -114,7 +501,7 @@ class MagnetopyParser:
         """
         plot_profile = self.__subparsers.add_parser(
             'plot-profile',
-            help='Command that reads the project file and plots the profile of the selected column.'
+            help='Command that reads the project file and plots the profile of the selected columns.'
         )
         plot_profile.add_argument(
             '--project_file',
@@ -125,9 +512,34 @@ class MagnetopyParser:
         plot_profile.add_argument(
             '--col_to_plot',
             type=str,
-            help='Column to plot (required).',
+            help='Columns to plot separated by commas without spaces, one panel per column (required).',
             required=True
         )
+        plot_profile.add_argument(
+            '--output',
+            type=str,
+            help='PNG, SVG or PDF file where the plot is rendered without a display (optional). By default the plot is shown in a window.'
+        )
+        plot_profile.add_argument(
+            '--downsample',
+            type=str,
+            choices=['minmax', 'lttb', 'none'],
+            default='minmax',
+            help='Downsampling of the profiles to the plot width: minimum and maximum per pixel column, largest triangle three buckets or none (default: minmax).'
+        )
+        plot_profile.add_argument(
+            '--width',
+            type=int,
+            default=1600,
+            help='Plot width in pixels (default: 1600).'
+        )
+        plot_profile.add_argument(
+            '--height',
+            type=int,
+            default=900,
+            help='Plot height in pixels (default: 900).'
+        )
+        self.__add_profile_arguments(plot_profile)
 
     def get_arguments(self) -> argparse.Namespace:
         """
@@ -138,6 +550,9 @@ class MagnetopyParser:
         """
         self.__add_diurnal_variation_arguments()
         self.__add_calculate_igrf_arguments()
+        self.__add_reduce_arguments()
+        self.__add_igrf_grid_arguments()
+        self.__add_batch_arguments()
         self.__add_plot_profile_arguments()
 
         arguments = self.__magnetopy_parser.parse_args()
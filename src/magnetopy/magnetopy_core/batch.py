@@ -0,0 +1,199 @@
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+from time import perf_counter
+import os
+import glob
+import pandas as pd
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper
+from src.magnetopy.magnetopy_utils.magnetopy_profiler import MagnetoPyProfiler
+from src.magnetopy.magnetopy_core.diurnal_variation import DiurnalVariation
+from src.magnetopy.magnetopy_core.calculate_igrf import CalculateIGRF
+
+# Arguments and shared inputs of the batch in the current process, set once per worker
+BATCH_STATE: dict = {}
+
+
+def init_batch_worker(arguments, base_stations_df, igrf, log_level) -> None:
+    """
+    Stores the batch arguments, the base station readings and the IGRF coefficients in the
+    worker process, so they are sent once per worker instead of once per file. With a base
+    station index the readings are not sent: every worker memory-maps the same index files.
+
+    :param arguments: Namespace, batch arguments
+    :param base_stations_df: pd.DataFrame, MagnetoPyBaseIndex or None
+    :param igrf: IGRF or None
+    :param log_level: int
+    :return: Nothing to return
+    :rtype: None
+    """
+    MagnetopyLogging.set_level(log_level)
+
+    if base_stations_df is None and arguments.operation == 'diurnal-variation' and getattr(arguments, 'base_index_dir', None):
+        base_stations_df = DiurnalVariation.load_base_station(arguments.base_station_file, arguments.base_station_cols.split(','), index_dir=arguments.base_index_dir, invalid_dates=getattr(arguments, 'invalid_dates', 'drop'))
+
+    BATCH_STATE.update(arguments=arguments, base_stations_df=base_stations_df, igrf=igrf)
+
+
+def process_stations_file(task) -> dict:
+    """
+    Runs the batch operation on one stations file. Errors are returned in the report instead of
+    being raised, so one bad file does not stop the batch.
+
+    :param task: tuple (stations_file, output_suffix)
+    :return: Report of the file
+    :rtype: dict
+    """
+    stations_file, output_suffix = task
+    arguments = Namespace(**{**vars(BATCH_STATE['arguments']), 'stations_file': stations_file, 'output_suffix': output_suffix})
+
+    report = {'stations_file': stations_file, 'status': 'ok', 'rows': 0, 'seconds': 0.0, 'rows_per_second': 0.0, 'output_file': None, 'error': None}
+
+    start = perf_counter()
+    try:
+        if arguments.operation == 'diurnal-variation':
+            result = DiurnalVariation(arguments=arguments, base_stations_df=BATCH_STATE['base_stations_df'])
+        else:
+            result = CalculateIGRF(arguments=arguments, igrf=BATCH_STATE['igrf'])
+        report['rows'] = result.rows
+        report['output_file'] = result.output_file
+    except Exception as e:
+        report['status'] = 'failed'
+        report['error'] = f'{type(e).__name__}: {e}'
+
+    report['seconds'] = perf_counter() - start
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] > 0 else 0.0
+
+    return report
+
+
+class Batch:
+    def __init__(self, arguments: Namespace):
+        self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='Batch')
+
+        self.arguments: Namespace = arguments
+        self.project_name: str = arguments.project_name
+        self.operation: str = arguments.operation
+        self.stations_glob: str = getattr(arguments, 'stations_glob', None)
+        self.manifest: str = getattr(arguments, 'manifest', None)
+        self.workers: int = getattr(arguments, 'workers', 1)
+
+        self.reports: list = []
+        self.profiler: MagnetoPyProfiler = MagnetoPyProfiler(getattr(arguments, 'profile', False), getattr(arguments, 'profile_cprofile', False))
+
+        self.__batch()
+
+        self.profiler.report(self.project_name, 'batch', arguments, '_batch')
+
+    def __batch(self) -> None:
+        """
+        Runs diurnal-variation or calculate-igrf on every stations file of a glob or a manifest.
+        The base station readings and the IGRF coefficients are loaded once for the whole batch.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        self.__magnetopy_logging.info(f'Running {self.operation} in batch')
+
+        stations_files = self.__stations_files()
+
+        self.__magnetopy_logging.info(f'{len(stations_files)} stations files found')
+
+        base_stations_df = None
+        igrf = None
+        if self.operation == 'diurnal-variation':
+            if not getattr(self.arguments, 'base_station_file', None) or not getattr(self.arguments, 'base_station_cols', None):
+                self.__magnetopy_logging.error('Error: diurnal-variation batches require --base_station_file and --base_station_cols')
+                raise ValueError('diurnal-variation batches require --base_station_file and --base_station_cols')
+            base_stations_df = DiurnalVariation.load_base_station(self.arguments.base_station_file, self.arguments.base_station_cols.split(','), self.profiler, getattr(self.arguments, 'base_index_dir', None), getattr(self.arguments, 'invalid_dates', 'drop'))
+        else:
+            if getattr(self.arguments, 'altitude', None) is None and len(self.arguments.stations_cols.split(',')) < 6:
+                self.__magnetopy_logging.error('Error: calculate-igrf batches require --altitude or an altitude column in --stations_cols')
+                raise ValueError('calculate-igrf batches require --altitude or an altitude column in --stations_cols')
+            with self.profiler.stage('load_igrf_coefficients'):
+                igrf = MagnetoPyIGRFHelper().load_igrf_coefficients()
+
+        # Files with the same name in different folders get a counter to keep their outputs apart
+        tasks = []
+        seen_names = {}
+        for stations_file in stations_files:
+            name = os.path.splitext(os.path.basename(stations_file))[0]
+            seen_names[name] = seen_names.get(name, 0) + 1
+            tasks.append((stations_file, f'_{name}' if seen_names[name] == 1 else f'_{name}_{seen_names[name]}'))
+
+        initargs = (self.arguments, base_stations_df, igrf, MagnetopyLogging.LEVEL)
+
+        # Every file writes its own profile report with the stages of the operation, with several
+        # workers the memory peak of this stage only covers this process
+        start = perf_counter()
+        with self.profiler.stage('process_files') as stage:
+            if self.workers > 1 and len(tasks) > 1:
+                if getattr(self.arguments, 'base_index_dir', None):
+                    # The index was built above, the workers open it instead of receiving a copy
+                    initargs = (self.arguments, None, igrf, MagnetopyLogging.LEVEL)
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=init_batch_worker, initargs=initargs) as executor:
+                    for report in executor.map(process_stations_file, tasks):
+                        self.__log_report(report)
+            else:
+                init_batch_worker(*initargs)
+                for task in tasks:
+                    self.__log_report(process_stations_file(task))
+            stage['rows'] = sum(report['rows'] for report in self.reports)
+        total_seconds = perf_counter() - start
+
+        report_df = pd.DataFrame(self.reports)
+        report_path = MagnetoPyFilesHelper.save_data(report_df, self.project_name, suffix='_batch')
+
+        failed = int((report_df['status'] == 'failed').sum())
+        total_rows = int(report_df['rows'].sum())
+        self.__magnetopy_logging.info(f'Batch completed: {len(report_df) - failed} files processed, {failed} failed, '
+                                      f'{total_rows} rows in {total_seconds:.2f} s ({total_rows / total_seconds:.0f} rows/s)')
+        self.__magnetopy_logging.info(f'Batch report saved on: {report_path}')
+
+        if failed:
+            self.__magnetopy_logging.error(f'Error: {failed} stations files failed, see the batch report')
+
+    def __stations_files(self) -> list:
+        """
+        Returns the stations files of the glob pattern or of the manifest. The manifest lists one
+        file per line, blank lines and lines starting with # are ignored and relative paths are
+        resolved from the manifest folder.
+
+        :return: Stations file paths
+        :rtype: list
+        """
+        if self.manifest is not None:
+            if not os.path.isfile(self.manifest):
+                self.__magnetopy_logging.error(f'Error: Manifest not found at path: "{self.manifest}"')
+                raise ValueError(f'Manifest not found at path: {self.manifest}')
+
+            manifest_folder = os.path.dirname(os.path.abspath(self.manifest))
+            with open(self.manifest) as f:
+                lines = [line.strip() for line in f]
+            stations_files = [os.path.join(manifest_folder, line) for line in lines if line and not line.startswith('#')]
+        else:
+            stations_files = sorted(glob.glob(self.stations_glob, recursive=True))
+
+        if not stations_files:
+            self.__magnetopy_logging.error('Error: No stations files to process')
+            raise ValueError('No stations files to process')
+
+        return stations_files
+
+    def __log_report(self, report) -> None:
+        """
+        Logs the result of one stations file and keeps it for the batch report.
+
+        :param report: dict
+        :return: Nothing to return
+        :rtype: None
+        """
+        self.reports.append(report)
+
+        if report['status'] == 'ok':
+            self.__magnetopy_logging.info(f'{report["stations_file"]}: {report["rows"]} rows in {report["seconds"]:.2f} s ({report["rows_per_second"]:.0f} rows/s)')
+        else:
+            self.__magnetopy_logging.error(f'Error: {report["stations_file"]} failed: {report["error"]}')
@@ -1,25 +1,44 @@
 from argparse import Namespace
 from logging import getLogger
-import pandas as pd
-from scipy import interpolate
+import numpy as np
 
 from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
-from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper, MagnetoPyChunkWriter
 from src.magnetopy.magnetopy_utils.magnetopy_conversions_helper import MagnetoPyConversionsHelper
-from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper, IGRFCoefficientProvider, IGRFLookupTable
+from src.magnetopy.magnetopy_utils.magnetopy_profiler import MagnetoPyProfiler
 
 class CalculateIGRF:
-    def __init__(self, arguments: Namespace):
+    def __init__(self, arguments: Namespace, igrf=None):
         self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='CalculateIGRF')
 
         self.project_name: str = arguments.project_name
         self.stations_file: str = arguments.stations_file
         self.stations_cols: str = arguments.stations_cols
-        self.altitude: float = arguments.altitude
+        self.altitude: float = getattr(arguments, 'altitude', None)
         self.date: str = arguments.date
-        
+        self.igrf_mode: str = getattr(arguments, 'igrf_mode', 'average')
+        self.memory_budget: float = getattr(arguments, 'memory_budget', 256)
+        self.igrf_lookup_tolerance: float = getattr(arguments, 'igrf_lookup_tolerance', None)
+        self.output_format: str = getattr(arguments, 'output_format', 'csv')
+        self.output_compression: str = getattr(arguments, 'output_compression', None)
+        self.output_cols: list = getattr(arguments, 'output_cols', None)
+        if isinstance(self.output_cols, str):
+            self.output_cols = self.output_cols.split(',')
+        self.chunk_size: int = getattr(arguments, 'chunk_size', None)
+        self.invalid_dates: str = getattr(arguments, 'invalid_dates', 'drop')
+        self.output_suffix: str = getattr(arguments, 'output_suffix', '')
+
+        self.rows: int = 0
+        self.output_file: str = None
+        self.igrf = igrf
+        self.lookup_table: IGRFLookupTable = None
+        self.profiler: MagnetoPyProfiler = MagnetoPyProfiler(getattr(arguments, 'profile', False), getattr(arguments, 'profile_cprofile', False))
+
         self.__calculate_igrf()
 
+        self.profiler.report(self.project_name, 'calculate-igrf', arguments, self.output_suffix)
+
     def __calculate_igrf(self) -> None:
         """
         Performs the IGRF correction to a data set based on the 13th generation coefficients.
@@ -32,108 +51,354 @@ class CalculateIGRF:
         _project_name = self.project_name
         _stations_file_path = self.stations_file
         _stations_cols = self.stations_cols.split(',')
-        _altitude = self.altitude
         _date = self.date
+        _igrf_mode = self.igrf_mode
+
+        if self.altitude is None and len(_stations_cols) < 6:
+            self.__magnetopy_logging.error('Error: The altitude is required, use --altitude or add an altitude column to --stations_cols')
+            raise ValueError('The altitude is required, use --altitude or add an altitude column to --stations_cols')
+        if len(_stations_cols) >= 6:
+            self.__magnetopy_logging.info(f'Using the altitude column "{_stations_cols[5]}" of every station')
 
         # Create an instance of the MagnetoPyIGRFHelper class
         magnetopyIGRFHelper = MagnetoPyIGRFHelper()
 
-        igrf = magnetopyIGRFHelper.load_igrf_coefficients()
+        with self.profiler.stage('load_igrf_coefficients'):
+            igrf = self.igrf if self.igrf is not None else magnetopyIGRFHelper.load_igrf_coefficients()
 
-        stations_df = MagnetoPyFilesHelper.read_and_verify_columns(_stations_file_path, _stations_cols)
+            provider = IGRFCoefficientProvider(igrf)
 
-        stations_df[_stations_cols[0]] = stations_df[_stations_cols[0]].apply(lambda x: MagnetoPyFilesHelper.validate_date(x))
-        stations_df[_stations_cols[1]] = stations_df[_stations_cols[1]].apply(lambda x: MagnetoPyFilesHelper.validate_time(x))
-        stations_df['datetime'] = pd.to_datetime(stations_df[_stations_cols[0]] + ' ' + stations_df[_stations_cols[1]])
+        if _date is not None:
+            self.__magnetopy_logging.info(f'Using the date {_date} for every station')
 
-        stations_df['decimal_date'] = stations_df[_stations_cols[0]].apply(lambda x: MagnetoPyConversionsHelper.convert_date_to_decimal_date(x))
+        mean_position = None
+        with self.profiler.stage('read_stations'):
+            if self.chunk_size is None:
+                stations_chunks = MagnetoPyFilesHelper.read_and_verify_columns(_stations_file_path, _stations_cols, MagnetoPyFilesHelper.column_dtypes(_stations_cols))
+                stations_chunks = None if stations_chunks is None else [stations_chunks]
+            else:
+                stations_chunks = MagnetoPyFilesHelper.read_columns(_stations_file_path, _stations_cols, MagnetoPyFilesHelper.column_dtypes(_stations_cols), chunksize=self.chunk_size)
 
-        # Get the unique dates in the stations_df dataframe
-        #unique_dates = stations_df['decimal_date'].unique()
+        if stations_chunks is None:
+            self.__magnetopy_logging.error(f'Error: Could not read the stations file: "{_stations_file_path}"')
+            raise ValueError(f'Could not read the stations file: {_stations_file_path}')
 
-        # Convert the unique dates to a numpy array
-        #unique_dates = unique_dates.astype(float)
+        if self.chunk_size is not None and _igrf_mode == 'average':
+            with self.profiler.stage('mean_position'):
+                mean_position = self.mean_position(_stations_file_path, self.position_cols(_stations_cols), self.chunk_size)
 
-        date = MagnetoPyConversionsHelper.convert_date_to_decimal_date(_date)
+        position_bounds = None
+        if self.chunk_size is not None and _igrf_mode == 'station' and self.igrf_lookup_tolerance is not None:
+            with self.profiler.stage('position_bounds'):
+                position_bounds = self.position_bounds(_stations_file_path, self.position_cols(_stations_cols), self.chunk_size)
 
-        lat_avg = stations_df[_stations_cols[2]].mean()
-        lon_avg = stations_df[_stations_cols[3]].mean()
+        writer = MagnetoPyChunkWriter(_project_name, self.output_format, self.output_compression, self.output_cols, self.output_suffix)
 
-        colat = 90 - lat_avg
+        stations_chunks = iter(stations_chunks)
+        while True:
+            # Chunks are read lazily, the read time of every chunk is part of the read_stations stage
+            with self.profiler.stage('read_stations') as stage:
+                stations_df = next(stations_chunks, None)
+                stage['rows'] = 0 if stations_df is None else len(stations_df)
+            if stations_df is None:
+                break
 
-        alt, colat, sd, cd = magnetopyIGRFHelper.gg_to_geo(_altitude, colat)
+            result_df = self.__igrf_chunk(magnetopyIGRFHelper, igrf, provider, stations_df, mean_position, position_bounds)
 
-        f = interpolate.interp1d(igrf.time, igrf.coeffs, fill_value='extrapolate')
-        coeffs = f(date)
+            with self.profiler.stage('save', rows=len(result_df)):
+                writer.write(result_df)
 
-        B_radius, B_theta, B_phi = magnetopyIGRFHelper.synth_values(coeffs.T, alt, colat, lon_avg, igrf.parameters['nmax'])
+        self.rows = writer.rows
+        with self.profiler.stage('save'):
+            self.output_file = writer.close()
 
-        #for date in unique_dates:
-        epoch = (date - 1900) // 5
-        epoch_start = epoch * 5
+        self.__magnetopy_logging.info('IGRF correction completed')
 
-        coeffs_sv = f(1900 + epoch_start + 1) - f(1900 + epoch_start)
-        Brs, Bts, Bps = magnetopyIGRFHelper.synth_values(coeffs_sv.T, alt, colat, lon_avg, igrf.parameters['nmax'])
+        return None
 
-        coeffsm = f(1900 + epoch_start)
-        Brm, Btm, Bpm = magnetopyIGRFHelper.synth_values(coeffsm.T, alt, colat, lon_avg, igrf.parameters['nmax'])
+    def __igrf_chunk(self, magnetopyIGRFHelper, igrf, provider, stations_df, mean_position=None, position_bounds=None):
+        """
+        Computes the IGRF components of a chunk of stations and adds them to its columns.
 
-        X = -B_theta
-        Y = B_phi
-        Z = -B_radius
+        :param stations_df: pd.DataFrame, stations as read from the file
+        :param mean_position: numpy.ndarray, optional average position of the whole file
+        :param position_bounds: tuple, optional minimum and maximum position of the whole file
+        :return: Stations with the IGRF components
+        :rtype: pd.DataFrame
+        """
+        _stations_cols = self.stations_cols.split(',')
+        _altitude = self.altitude
+        _date = self.date
 
-        dX = -Bts
-        dY = Bps
-        dZ = -Brs
+        with self.profiler.stage('parse_dates', rows=len(stations_df)):
+            stations_df, failed_rows = MagnetoPyFilesHelper.parse_date_time_columns(stations_df, _stations_cols[0], _stations_cols[1])
+            MagnetoPyFilesHelper.check_failed_rows(failed_rows, self.stations_file, self.invalid_dates)
 
-        Xm = -Btm
-        Ym = Bpm
-        Zm = -Brm
+        with self.profiler.stage('decimal_dates', rows=len(stations_df)):
+            # Decimal date of the day of every station, at midnight
+            stations_df['decimal_date'] = MagnetoPyConversionsHelper.convert_datetime64_to_decimal_dates(stations_df['datetime'].to_numpy().astype('datetime64[D]'))
 
-        # Rotate back to geodetic coordinates if necessary
-        t = X
-        X = X * cd + Z * sd
-        Z = Z * cd - t * sd
+            if _date is not None:
+                date = MagnetoPyConversionsHelper.convert_date_to_decimal_date(_date)
+            else:
+                # Every station is evaluated at its own observation epoch, including the time of day
+                date = MagnetoPyConversionsHelper.convert_datetime64_to_decimal_dates(stations_df['datetime'])
+                self.__magnetopy_logging.info(f'Using the observation date of every station ({len(np.unique(date))} distinct epochs)')
 
-        t = dX
-        dX = dX * cd + dZ * sd
-        dZ = dZ * cd - t * sd
+        lat, lon, altitude = self.station_positions(stations_df, _stations_cols, self.igrf_mode, _altitude, mean_position)
 
-        t = Xm
-        Xm = Xm * cd + Zm * sd
-        Zm = Zm * cd - t * sd
+        if self.igrf_mode == 'station' and self.igrf_lookup_tolerance is not None and self.lookup_table is None:
+            # The table of the first chunk covers the whole file when its bounds are known
+            with self.profiler.stage('igrf_lookup_table'):
+                self.lookup_table = self.igrf_lookup_table(magnetopyIGRFHelper, igrf, provider, date, altitude, lat, lon, self.igrf_lookup_tolerance, position_bounds, self.memory_budget)
 
-        # Compute the four non-linear components
-        dec, hoz, inc, eff = magnetopyIGRFHelper.xyz2dhif(X, Y, Z)
+        with self.profiler.stage('igrf_synthesis', rows=len(stations_df)):
+            results = self.igrf_columns(magnetopyIGRFHelper, igrf, provider, date, altitude, lat, lon, len(stations_df), self.memory_budget, self.lookup_table)
 
-        # The IGRF SV coefficients are relative to the main field components
-        # at the start of each five year epoch e. g. 2010, 2015, 2020.
-        decs, hozs, incs, effs = magnetopyIGRFHelper.xyz2dhif_sv(Xm, Ym, Zm, dX, dY, dZ)
+            return MagnetoPyFilesHelper.write_igrf_components_to_dataframe(stations_df, results)
+
+    @staticmethod
+    def position_cols(stations_cols, prefix='') -> list:
+        """
+        :param stations_cols: list, stations file columns
+        :param prefix: str, optional prefix of the column names in the dataframe
+        :return: Latitude and longitude columns, followed by the altitude column when the stations have one
+        :rtype: list
+        """
+        # The optional altitude column follows the magnetic field column
+        return [prefix + col for col in stations_cols[2:4] + stations_cols[5:6]]
 
-        # Convert the results to a dictionary as above
+    @staticmethod
+    def station_positions(stations_df, stations_cols, igrf_mode, altitude, mean_position=None, prefix='') -> tuple:
+        """
+        Returns the positions where the IGRF of a chunk of stations is evaluated: arrays with the
+        coordinates of every station in station mode, otherwise the average position of the file
+        or of the chunk. The altitude column of the stations, when there is one, replaces the
+        ``altitude`` shared by every station.
+
+        :param stations_df: pd.DataFrame
+        :param stations_cols: list, stations file columns
+        :param igrf_mode: str, average or station
+        :param altitude: float, km, used when the stations have no altitude column
+        :param mean_position: numpy.ndarray, optional average position of the whole file
+        :param prefix: str, optional prefix of the column names in the dataframe
+        :return: Latitude, longitude and altitude
+        :rtype: tuple
+        """
+        position_cols = CalculateIGRF.position_cols(stations_cols, prefix)
+
+        if igrf_mode == 'station':
+            position = [stations_df[col].to_numpy(dtype=float) for col in position_cols]
+        elif mean_position is not None:
+            position = list(mean_position)
+        else:
+            position = [stations_df[col].mean() for col in position_cols]
+
+        if len(position) == 2:
+            position.append(altitude)
+
+        return tuple(position)
+
+    @staticmethod
+    def mean_position(stations_file, position_cols, chunk_size) -> np.ndarray:
+        """
+        Computes the average position of a stations file in one pass over its coordinate
+        columns, reading ``chunk_size`` rows at a time.
+
+        :param stations_file: str
+        :param position_cols: list, latitude and longitude columns, optionally followed by the altitude column
+        :param chunk_size: int
+        :return: Average of every position column
+        :rtype: numpy.ndarray
+        """
+        sums = np.zeros(len(position_cols))
+        counts = np.zeros(len(position_cols))
+        for position_df in MagnetoPyFilesHelper.read_columns(stations_file, position_cols, dict.fromkeys(position_cols, 'float64'), chunksize=chunk_size):
+            sums += position_df.sum().to_numpy()
+            counts += position_df.count().to_numpy()
+
+        return sums / counts
+
+    @staticmethod
+    def position_bounds(stations_file, position_cols, chunk_size) -> tuple:
+        """
+        Computes the minimum and maximum of the position columns of a stations file in one pass,
+        reading ``chunk_size`` rows at a time. The longitude bounds are those of the narrower of
+        its -180..180 and 0..360 ranges, see longitude_bounds.
+
+        :param stations_file: str
+        :param position_cols: list, latitude and longitude columns, optionally followed by the altitude column
+        :param chunk_size: int
+        :return: Minimum and maximum of every position column
+        :rtype: tuple
+        """
+        lows = np.full(len(position_cols) + 1, np.inf)
+        highs = np.full(len(position_cols) + 1, -np.inf)
+        for position_df in MagnetoPyFilesHelper.read_columns(stations_file, position_cols, dict.fromkeys(position_cols, 'float64'), chunksize=chunk_size):
+            positions = position_df.to_numpy()
+            lon = positions[:, 1:2]
+            frames = np.hstack([positions[:, :1], (lon + 180) % 360 - 180, lon % 360, positions[:, 2:]])
+            lows = np.fmin(lows, np.nanmin(frames, axis=0, initial=np.inf))
+            highs = np.fmax(highs, np.nanmax(frames, axis=0, initial=-np.inf))
+
+        return CalculateIGRF.longitude_bounds(lows, highs)
+
+    @staticmethod
+    def longitude_bounds(lows, highs) -> tuple:
+        """
+        Keeps the longitude bounds of the narrower of the -180..180 and 0..360 ranges, so a survey
+        across the antimeridian gets a lookup table as wide as the survey instead of about 360
+        degrees. The bounds in the 0..360 range can go past 180 degrees.
+
+        :param lows: numpy.ndarray, minimum latitude, longitude in -180..180 and 0..360, optionally followed by the minimum altitude
+        :param highs: numpy.ndarray, maximum of the same values
+        :return: Minimum and maximum of the latitude, longitude and optional altitude
+        :rtype: tuple
+        """
+        frame = 2 if highs[2] - lows[2] < highs[1] - lows[1] else 1
+        keep = [0, frame] + list(range(3, len(lows)))
+
+        return lows[keep], highs[keep]
+
+    @staticmethod
+    def igrf_lookup_table(magnetopyIGRFHelper, igrf, provider, date, altitude, lat, lon, tolerance, position_bounds=None, memory_budget=256) -> IGRFLookupTable:
+        """
+        Builds the IGRF lookup table of a survey at the median of its decimal dates, over the
+        bounding box of the given stations or over ``position_bounds`` when they are known.
+
+        :param date: float or numpy.ndarray, decimal dates
+        :param altitude: float or numpy.ndarray, km
+        :param lat: numpy.ndarray, geodetic latitude in degrees
+        :param lon: numpy.ndarray, longitude in degrees
+        :param tolerance: float, maximum interpolation error in nT
+        :param position_bounds: tuple, optional minimum and maximum of the position columns
+        :param memory_budget: float, MB
+        :return: Lookup table
+        :rtype: IGRFLookupTable
+        """
+        if position_bounds is None:
+            lon = np.asarray(lon, dtype=float)
+            values = (lat, (lon + 180) % 360 - 180, lon % 360, altitude)
+            position_bounds = CalculateIGRF.longitude_bounds(*(np.array([function(value) for value in values]) for function in (np.nanmin, np.nanmax)))
+
+        lows, highs = position_bounds
+        if len(lows) == 2:
+            lows, highs = np.append(lows, altitude), np.append(highs, altitude)
+
+        return IGRFLookupTable(magnetopyIGRFHelper, igrf, provider, np.nanmedian(date), (lows[0], highs[0]), (lows[1], highs[1]), (lows[2], highs[2]), tolerance, memory_budget=memory_budget)
+
+    @staticmethod
+    def igrf_columns(magnetopyIGRFHelper, igrf, provider, date, altitude, lat, lon, n_stations, memory_budget=256, lookup_table=None) -> dict:
+        """
+        Computes the IGRF output columns of ``n_stations`` stations. ``date``, ``altitude``,
+        ``lat`` and ``lon`` are scalars shared by every station or arrays with one value per
+        station. Per-station values are synthesized in chunks that fit in the memory budget, or
+        interpolated from ``lookup_table`` when it covers them.
+
+        :param magnetopyIGRFHelper: MagnetoPyIGRFHelper
+        :param igrf: IGRF
+        :param provider: IGRFCoefficientProvider
+        :param date: float or numpy.ndarray, decimal dates
+        :param altitude: float or numpy.ndarray, km
+        :param lat: float or numpy.ndarray, geodetic latitude in degrees
+        :param lon: float or numpy.ndarray, longitude in degrees
+        :param n_stations: int
+        :param memory_budget: float, MB
+        :param lookup_table: IGRFLookupTable, optional
+        :return: Column name and values of the IGRF date and components
+        :rtype: dict
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='CalculateIGRF: igrf_columns')
+
+        if np.ndim(date) == 0 and np.ndim(lat) == 0 and np.ndim(altitude) == 0:
+            components = CalculateIGRF.__synthesize_igrf(magnetopyIGRFHelper, igrf, provider, date, altitude, lat, lon)
+        else:
+            lat = np.broadcast_to(lat, (n_stations,))
+            lon = np.broadcast_to(lon, (n_stations,))
+            dates = np.broadcast_to(date, (n_stations,))
+            altitude = np.broadcast_to(altitude, (n_stations,))
+
+            if lookup_table is None:
+                components = CalculateIGRF.__synthesize_igrf_chunks(magnetopyIGRFHelper, igrf, provider, dates, altitude, lat, lon, memory_budget)
+            else:
+                components, covered = lookup_table.components(lat, lon, altitude, dates)
+                missing = np.flatnonzero(~covered)
+                magnetopy_logging.info(f'IGRF of {n_stations - missing.size} stations interpolated from the lookup table')
+
+                # Stations outside the table or its epoch are synthesized
+                if missing.size:
+                    exact = CalculateIGRF.__synthesize_igrf_chunks(magnetopyIGRFHelper, igrf, provider, dates[missing], altitude[missing], lat[missing], lon[missing], memory_budget)
+                    for key in components:
+                        components[key][missing] = exact[key]
+
+        # Column names of the output
         degree_sign= u'\N{DEGREE SIGN}'
         results = {
             'igrf_date': date,
-            f'D({degree_sign})': dec,
-            f'I({degree_sign})': inc,
-            'H(nT)': hoz,
-            'F(nT)': eff,
-            'X(nT)': X,
-            'Y(nT)': Y,
-            'Z(nT)': Z,
-            'SV_D(min/yr)': decs,
-            'SV_I(min/yr)': incs,
-            'SV_H(nT/yr)': hozs,
-            'SV_F(nT/yr)': effs,
-            'SV_X(nT/yr)': dX,
-            'SV_Y(nT/yr)': dY,
-            'SV_Z(nT/yr)': dZ
+            f'D({degree_sign})': components['dec'],
+            f'I({degree_sign})': components['inc'],
+            'H(nT)': components['hoz'],
+            'F(nT)': components['eff'],
+            'X(nT)': components['X'],
+            'Y(nT)': components['Y'],
+            'Z(nT)': components['Z'],
+            'SV_D(min/yr)': components['decs'],
+            'SV_I(min/yr)': components['incs'],
+            'SV_H(nT/yr)': components['hozs'],
+            'SV_F(nT/yr)': components['effs'],
+            'SV_X(nT/yr)': components['dX'],
+            'SV_Y(nT/yr)': components['dY'],
+            'SV_Z(nT/yr)': components['dZ']
         }
 
-        output_df = MagnetoPyFilesHelper.write_igrf_components_to_dataframe(stations_df, results)
+        return results
+
+    @staticmethod
+    def __synthesize_igrf_chunks(magnetopyIGRFHelper, igrf, provider, dates, altitude, lat, lon, memory_budget) -> dict:
+        """
+        Synthesizes the components of per-station arrays in chunks that fit in the memory budget.
 
-        MagnetoPyFilesHelper.save_data(output_df, _project_name)
+        :return: Main field and secular variation components
+        :rtype: dict
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='CalculateIGRF: synthesize_igrf_chunks')
 
-        self.__magnetopy_logging.info('IGRF correction completed')
+        n_stations = len(lat)
+        nmax = igrf.parameters['nmax']
+        chunk_size = magnetopyIGRFHelper.chunk_size(nmax, memory_budget)
+        magnetopy_logging.info(f'Computing the IGRF for {n_stations} stations in chunks of {chunk_size}')
+
+        # The Legendre functions of every full chunk are computed in the same buffer, only a
+        # shorter last chunk allocates its own
+        legendre_out = np.empty((2, (nmax+1)*(nmax+2)//2, min(chunk_size, n_stations)))
+
+        chunks = []
+        for chunk_start in range(0, n_stations, chunk_size):
+            chunk = slice(chunk_start, chunk_start + chunk_size)
+            buffer = legendre_out if len(lat[chunk]) == legendre_out.shape[-1] else None
+            chunks.append(CalculateIGRF.__synthesize_igrf(magnetopyIGRFHelper, igrf, provider, dates[chunk], altitude[chunk], lat[chunk], lon[chunk], buffer))
+
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+    @staticmethod
+    def __synthesize_igrf(magnetopyIGRFHelper, igrf, provider, dates, altitude, lat, lon, legendre_out=None) -> dict:
+        """
+        Computes the main field and secular variation components at the given geodetic positions
+        and decimal dates. ``dates``, ``altitude``, ``lat`` and ``lon`` can be scalars or arrays,
+        every component is evaluated in one batched call.
+
+        The coefficients are interpolated once per distinct date and the secular variation ones
+        once per distinct five year epoch. A single distinct value is broadcast to every station.
+        ``legendre_out`` is an optional buffer for the Legendre functions of array positions.
+
+        :return: Main field and secular variation components
+        :rtype: dict
+        """
+        unique_dates = np.unique(dates)
+        coeffs = provider.coefficients(unique_dates[0] if unique_dates.size == 1 else dates)
+
+        epoch_dates = 1900 + ((np.asarray(dates) - 1900) // 5) * 5
+        unique_epochs = np.unique(epoch_dates)
+        coeffs_sv, coeffsm = provider.epoch_coefficients(unique_epochs[0] if unique_epochs.size == 1 else epoch_dates)
 
-        return None
\ No newline at end of file
+        return magnetopyIGRFHelper.igrf_components(coeffs, coeffs_sv, coeffsm, altitude, lat, lon, igrf.parameters['nmax'], legendre_out=legendre_out)
@@ -1,26 +1,123 @@
 from argparse import Namespace
 from logging import getLogger
+import os
+import numpy as np
 import pandas as pd
 
 from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
-from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper, MagnetoPyChunkWriter
+from src.magnetopy.magnetopy_utils.magnetopy_base_station_helper import MagnetoPyBaseStationHelper
+from src.magnetopy.magnetopy_utils.magnetopy_profiler import MagnetoPyProfiler
 
 class DiurnalVariation:
-    def __init__(self, arguments: Namespace):
+    def __init__(self, arguments: Namespace, base_stations_df: pd.DataFrame = None):
         self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='DiurnalVariation')
 
         self.project_name: str = arguments.project_name
         self.stations_file: str = arguments.stations_file
         self.stations_cols: str = arguments.stations_cols
-        self.base_station_file: str = arguments.base_station_file
+        self.base_station_file = arguments.base_station_file
         self.base_station_cols: str = arguments.base_station_cols
+        self.base_interpolation: str = getattr(arguments, 'base_interpolation', 'nearest')
+        self.max_base_gap: float = getattr(arguments, 'max_base_gap', None)
+        self.base_index_dir: str = getattr(arguments, 'base_index_dir', None)
+        self.output_format: str = getattr(arguments, 'output_format', 'csv')
+        self.output_compression: str = getattr(arguments, 'output_compression', None)
+        self.output_cols: list = getattr(arguments, 'output_cols', None)
+        if isinstance(self.output_cols, str):
+            self.output_cols = self.output_cols.split(',')
+        self.chunk_size: int = getattr(arguments, 'chunk_size', None)
+        self.invalid_dates: str = getattr(arguments, 'invalid_dates', 'drop')
+        self.output_suffix: str = getattr(arguments, 'output_suffix', '')
 
-        self.__diurnal_variation()
+        self.rows: int = 0
+        self.output_file: str = None
+        self.profiler: MagnetoPyProfiler = MagnetoPyProfiler(getattr(arguments, 'profile', False), getattr(arguments, 'profile_cprofile', False))
 
-    def __diurnal_variation(self) -> None:
+        self.__diurnal_variation(base_stations_df)
+
+        self.profiler.report(self.project_name, 'diurnal-variation', arguments, self.output_suffix)
+
+    @staticmethod
+    def load_base_station(base_station_file, base_station_cols, profiler=None, index_dir=None, invalid_dates='drop'):
+        """
+        Reads the base station file, parses its dates and times and adds the daily mean of the
+        magnetic field. The result can be shared by several DiurnalVariation runs.
+
+        Several base station files are read into one table with a station_id (file name) and a
+        station_index column. Their columns must include the latitude and longitude of the
+        base, and the daily mean is computed for every base.
+
+        With ``index_dir``, the parsed readings of every file are sorted by time and kept in a
+        memory-mapped index keyed by the hash of the file, so later runs skip the parsing. A
+        single file opened from its index is returned as a MagnetoPyBaseIndex, whose columns stay
+        memory-mapped.
+
+        :param base_station_file: str or list of str
+        :param base_station_cols: list, date, time and magnetic field columns, then latitude and longitude (required with several files)
+        :param profiler: MagnetoPyProfiler, optional
+        :param index_dir: str, optional folder of the base station indexes
+        :param invalid_dates: str, 'drop' logs and drops the readings with an invalid date or time, 'raise' stops (default: 'drop')
+        :return: Base station readings
+        :rtype: pd.DataFrame or MagnetoPyBaseIndex
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='DiurnalVariation: load_base_station')
+        profiler = profiler or MagnetoPyProfiler()
+
+        base_station_files = [base_station_file] if isinstance(base_station_file, str) else list(base_station_file)
+
+        if len(base_station_files) > 1 and len(base_station_cols) < 5:
+            magnetopy_logging.error('Error: Several base station files require the latitude and longitude in --base_station_cols: date,time,magnetic_field,latitude,longitude')
+            raise ValueError('Several base station files require the latitude and longitude columns')
+
+        base_stations_dfs = []
+        for station_index, file in enumerate(base_station_files):
+            base_stations_df = None
+            index_folder = None
+            if index_dir is not None and os.path.isfile(file):
+                with profiler.stage('open_base_index') as stage:
+                    index_folder = os.path.join(index_dir, MagnetoPyBaseStationHelper.base_index_key(file, base_station_cols))
+                    base_stations_df = MagnetoPyBaseStationHelper.read_base_index(index_folder)
+                    stage['rows'] = 0 if base_stations_df is None else len(base_stations_df)
+
+            if base_stations_df is None:
+                with profiler.stage('read_base_station') as stage:
+                    base_stations_df = MagnetoPyFilesHelper.read_and_verify_columns(file, base_station_cols, MagnetoPyFilesHelper.column_dtypes(base_station_cols))
+                    stage['rows'] = 0 if base_stations_df is None else len(base_stations_df)
+
+                with profiler.stage('parse_base_dates', rows=stage['rows']):
+                    base_stations_df, failed_rows = MagnetoPyFilesHelper.parse_date_time_columns(base_stations_df, base_station_cols[0], base_station_cols[1])
+                    MagnetoPyFilesHelper.check_failed_rows(failed_rows, file, invalid_dates)
+                    base_stations_df['magfield_mean'] = base_stations_df.groupby(base_stations_df[base_station_cols[0]])[base_station_cols[2]].transform('mean')
+
+                if index_folder is not None:
+                    with profiler.stage('write_base_index', rows=len(base_stations_df)):
+                        # The index and the run that builds it use the same time-sorted readings
+                        base_stations_df = base_stations_df.sort_values('datetime', kind='stable', ignore_index=True)
+                        MagnetoPyBaseStationHelper.write_base_index(base_stations_df, index_folder)
+                    magnetopy_logging.info(f'Base station index written: "{index_folder}"')
+
+            if len(base_station_files) > 1:
+                if not isinstance(base_stations_df, pd.DataFrame):
+                    # The readings of several base stations are concatenated in memory
+                    base_stations_df = base_stations_df.to_frame()
+                base_stations_df['station_id'] = os.path.splitext(os.path.basename(file))[0]
+                base_stations_df['station_index'] = station_index
+            base_stations_dfs.append(base_stations_df)
+
+        if len(base_stations_dfs) == 1:
+            return base_stations_dfs[0]
+
+        magnetopy_logging.info(f'{len(base_stations_dfs)} base stations loaded')
+
+        return pd.concat(base_stations_dfs, ignore_index=True)
+
+    def __diurnal_variation(self, base_stations_df=None) -> None:
         """
         Performs the correction for diurnal variation in the entered data set.
 
+        :param base_stations_df: pd.DataFrame or MagnetoPyBaseIndex, optional base station readings already loaded with load_base_station
+
         :return: Nothing to return
         :rtype: None
         """
@@ -32,44 +129,140 @@ class DiurnalVariation:
         _base_station_file_path = self.base_station_file
         _base_station_cols = self.base_station_cols.split(',')
 
-        stations_df = MagnetoPyFilesHelper.read_and_verify_columns(_stations_file_path, _stations_cols)
-        base_stations_df = MagnetoPyFilesHelper.read_and_verify_columns(_base_station_file_path, _base_station_cols)
+        if base_stations_df is None:
+            base_stations_df = self.load_base_station(_base_station_file_path, _base_station_cols, self.profiler, self.base_index_dir, self.invalid_dates)
+        else:
+            # The shared readings are renamed below, a shallow copy keeps the original columns
+            base_stations_df = base_stations_df.copy(deep=False)
+
+        with self.profiler.stage('read_stations'):
+            if self.chunk_size is None:
+                stations_chunks = MagnetoPyFilesHelper.read_and_verify_columns(_stations_file_path, _stations_cols, MagnetoPyFilesHelper.column_dtypes(_stations_cols))
+                stations_chunks = None if stations_chunks is None else [stations_chunks]
+            else:
+                # The base station is kept in memory and the stations file is streamed chunk by chunk
+                stations_chunks = MagnetoPyFilesHelper.read_columns(_stations_file_path, _stations_cols, MagnetoPyFilesHelper.column_dtypes(_stations_cols), chunksize=self.chunk_size)
+
+        if stations_chunks is None:
+            self.__magnetopy_logging.error(f'Error: Could not read the stations file: "{_stations_file_path}"')
+            raise ValueError(f'Could not read the stations file: {_stations_file_path}')
+
+        writer = MagnetoPyChunkWriter(_project_name, self.output_format, self.output_compression, self.output_cols, self.output_suffix)
 
-        stations_df[_stations_cols[0]] = stations_df[_stations_cols[0]].apply(lambda x: MagnetoPyFilesHelper.validate_date(x))
-        stations_df[_stations_cols[1]] = stations_df[_stations_cols[1]].apply(lambda x: MagnetoPyFilesHelper.validate_time(x))
-        stations_df['datetime'] = pd.to_datetime(stations_df[_stations_cols[0]] + ' ' + stations_df[_stations_cols[1]])
-        
-        base_stations_df[_base_station_cols[0]] = base_stations_df[_base_station_cols[0]].apply(lambda x: MagnetoPyFilesHelper.validate_date(x))
-        base_stations_df[_base_station_cols[1]] = base_stations_df[_base_station_cols[1]].apply(lambda x: MagnetoPyFilesHelper.validate_time(x))
-        base_stations_df['datetime'] = pd.to_datetime(base_stations_df[_base_station_cols[0]] + ' ' + base_stations_df[_base_station_cols[1]])
-        base_stations_df['magfield_mean'] = base_stations_df.groupby(base_stations_df[_base_station_cols[0]])[_base_station_cols[2]].transform('mean')
+        stations_chunks = iter(stations_chunks)
+        first_chunk = True
+        while True:
+            # Chunks are read lazily, the read time of every chunk is part of the read_stations stage
+            with self.profiler.stage('read_stations') as stage:
+                stations_df = next(stations_chunks, None)
+                stage['rows'] = 0 if stations_df is None else len(stations_df)
+            if stations_df is None:
+                break
 
-        stations_df, base_stations_df = MagnetoPyFilesHelper.rename_columns(stations_df, base_stations_df)
-        
-        self.__magnetopy_logging.info('Performing the diurnal variation correction')
+            with self.profiler.stage('parse_dates', rows=len(stations_df)):
+                stations_df, failed_rows = MagnetoPyFilesHelper.parse_date_time_columns(stations_df, _stations_cols[0], _stations_cols[1])
+                MagnetoPyFilesHelper.check_failed_rows(failed_rows, _stations_file_path, self.invalid_dates)
 
-        records = []
+            # The base station columns are renamed once, even if the first chunk produces no rows
+            if first_chunk:
+                stations_df, base_stations_df = MagnetoPyFilesHelper.rename_columns(stations_df, base_stations_df)
+                self.__magnetopy_logging.info('Performing the diurnal variation correction')
+                first_chunk = False
+            else:
+                stations_df = stations_df.add_prefix('sta_')
 
-        for index, row in stations_df.iterrows():
-            stations_datetime = row['sta_datetime']
+            result_df = self.correct_chunk(stations_df, base_stations_df, _stations_cols, _base_station_cols, self.base_interpolation, self.max_base_gap, self.profiler)
 
-            base_stations_df['time_diff'] = abs(base_stations_df['base_datetime'] - stations_datetime)
+            with self.profiler.stage('save', rows=len(result_df)):
+                writer.write(result_df)
+
+        self.__magnetopy_logging.info(f'Total records: {writer.rows}')
+
+        self.rows = writer.rows
+        with self.profiler.stage('save'):
+            self.output_file = writer.close()
+
+        self.__magnetopy_logging.info('Diurnal variation correction completed')
+
+    @staticmethod
+    def correct_chunk(stations_df, base_stations_df, stations_cols, base_station_cols, base_interpolation='nearest', max_base_gap=None, profiler=None) -> pd.DataFrame:
+        """
+        Matches a chunk of stations with the base station readings and applies the diurnal
+        variation correction.
+
+        :param stations_df: pd.DataFrame, stations with the sta_ prefix
+        :param base_stations_df: pd.DataFrame or MagnetoPyBaseIndex, base station readings with the base_ prefix, with a base_station_index column when several bases are used
+        :param stations_cols: list
+        :param base_station_cols: list
+        :param base_interpolation: str, one of 'nearest', 'linear' or 'cubic'
+        :param max_base_gap: float, optional maximum gap in seconds between base station readings
+        :param profiler: MagnetoPyProfiler, optional
+        :return: Stations, matched base station readings and the correction
+        :rtype: pd.DataFrame
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='DiurnalVariation: correct_chunk')
+        profiler = profiler or MagnetoPyProfiler()
 
-            closest_index = base_stations_df['time_diff'].idxmin()
-            closest_record = base_stations_df.loc[closest_index]
+        # Chunks keep the row labels of the file, the matched base readings are aligned by position
+        stations_df = stations_df.reset_index(drop=True)
+        multiple_bases = 'base_station_index' in base_stations_df.columns
 
-            records.append(closest_record)
+        with profiler.stage('base_matching', rows=len(stations_df)):
+            if multiple_bases:
+                closest_indices, base_distances, base_valid = MagnetoPyBaseStationHelper.nearest_base_readings(
+                    base_stations_df['base_station_index'],
+                    base_stations_df['base_' + base_station_cols[3]],
+                    base_stations_df['base_' + base_station_cols[4]],
+                    base_stations_df['base_datetime'],
+                    stations_df['sta_' + stations_cols[2]],
+                    stations_df['sta_' + stations_cols[3]],
+                    stations_df['sta_datetime'],
+                    max_base_gap
+                )
+            else:
+                closest_indices = MagnetoPyBaseStationHelper.nearest_reading_indices(base_stations_df['base_datetime'], stations_df['sta_datetime'])
 
-        result_df = pd.DataFrame(records)
-        result_df = result_df.reset_index(drop=True)
+            # Only the matched readings are copied from a memory-mapped base station index
+            result_df = base_stations_df.take(closest_indices).reset_index(drop=True)
+            result_df['time_diff'] = abs(result_df['base_datetime'] - stations_df['sta_datetime'].reset_index(drop=True))
+            if multiple_bases:
+                result_df['base_distance_km'] = base_distances
 
-        result_df = pd.concat([stations_df, result_df], axis=1)
+        with profiler.stage('diurnal_correction', rows=len(stations_df)):
+            result_df = pd.concat([stations_df, result_df], axis=1)
 
-        result_df['diurnal_var'] = result_df['base_' + _base_station_cols[2]] - result_df['base_magfield_mean']
-        result_df['diurnal_var_corr'] = result_df['sta_' + _stations_cols[4]] - result_df['diurnal_var']
+            if base_interpolation == 'nearest':
+                result_df['diurnal_var'] = result_df['base_' + base_station_cols[2]] - result_df['base_magfield_mean']
+            else:
+                if multiple_bases:
+                    # Every station is interpolated in the record of its selected base
+                    interpolated = np.empty(len(result_df))
+                    base_indices = np.asarray(base_stations_df['base_station_index'])
+                    for station_index, rows in result_df.groupby('base_station_index').indices.items():
+                        base_readings = base_indices == station_index
+                        interpolated[rows] = MagnetoPyBaseStationHelper.interpolate_readings(
+                            np.asarray(base_stations_df['base_datetime'])[base_readings],
+                            np.asarray(base_stations_df['base_' + base_station_cols[2]])[base_readings],
+                            result_df['sta_datetime'].to_numpy()[rows],
+                            method=base_interpolation
+                        )
+                else:
+                    interpolated = MagnetoPyBaseStationHelper.interpolate_readings(
+                        base_stations_df['base_datetime'],
+                        base_stations_df['base_' + base_station_cols[2]],
+                        result_df['sta_datetime'],
+                        method=base_interpolation
+                    )
+                result_df['base_interp_' + base_station_cols[2]] = interpolated
+                result_df['diurnal_var'] = result_df['base_interp_' + base_station_cols[2]] - result_df['base_magfield_mean']
 
-        self.__magnetopy_logging.info(f'Total records: {len(result_df)}')
+            result_df['diurnal_var_corr'] = result_df['sta_' + stations_cols[4]] - result_df['diurnal_var']
 
-        MagnetoPyFilesHelper.save_data(result_df, _project_name)
+            if max_base_gap is not None:
+                if multiple_bases:
+                    result_df['base_gap_flag'] = ~base_valid
+                else:
+                    result_df['base_gap_flag'] = MagnetoPyBaseStationHelper.flag_base_gaps(base_stations_df['base_datetime'], result_df['sta_datetime'], max_base_gap)
+                magnetopy_logging.warning(f'Records inside base station outages: {result_df["base_gap_flag"].sum()}')
 
-        self.__magnetopy_logging.info('Diurnal variation correction completed')
\ No newline at end of file
+        return result_df
@@ -0,0 +1,126 @@
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+import numpy as np
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+from src.magnetopy.magnetopy_utils.magnetopy_conversions_helper import MagnetoPyConversionsHelper
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper, IGRFCoefficientProvider
+from src.magnetopy.magnetopy_utils.magnetopy_profiler import MagnetoPyProfiler
+
+# Output variable name and units of every IGRF component
+GRID_COMPONENTS = {
+    'dec': ('D', 'deg'),
+    'inc': ('I', 'deg'),
+    'hoz': ('H', 'nT'),
+    'eff': ('F', 'nT'),
+    'X': ('X', 'nT'),
+    'Y': ('Y', 'nT'),
+    'Z': ('Z', 'nT'),
+    'decs': ('SV_D', 'min/yr'),
+    'incs': ('SV_I', 'min/yr'),
+    'hozs': ('SV_H', 'nT/yr'),
+    'effs': ('SV_F', 'nT/yr'),
+    'dX': ('SV_X', 'nT/yr'),
+    'dY': ('SV_Y', 'nT/yr'),
+    'dZ': ('SV_Z', 'nT/yr')
+}
+
+
+def synthesize_tile(tile) -> dict:
+    """
+    Computes the IGRF components of one tile of the grid. Defined at module level so it can be
+    sent to the worker processes.
+
+    :param tile: tuple (lat, lon, altitude, coeffs, coeffs_sv, coeffsm, nmax)
+    :return: Main field and secular variation components of the tile
+    :rtype: dict
+    """
+    lat, lon, altitude, coeffs, coeffs_sv, coeffsm, nmax = tile
+
+    return MagnetoPyIGRFHelper().igrf_components(coeffs, coeffs_sv, coeffsm, altitude, lat, lon, nmax, grid=True)
+
+
+class IGRFGrid:
+    def __init__(self, arguments: Namespace):
+        self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='IGRFGrid')
+
+        self.project_name: str = arguments.project_name
+        self.bbox: str = arguments.bbox
+        self.resolution: float = arguments.resolution
+        self.altitude: float = arguments.altitude
+        self.date: str = arguments.date
+        self.workers: int = getattr(arguments, 'workers', 1)
+        self.memory_budget: float = getattr(arguments, 'memory_budget', 256)
+        self.output_format: str = getattr(arguments, 'output_format', 'npz')
+        self.profiler: MagnetoPyProfiler = MagnetoPyProfiler(getattr(arguments, 'profile', False), getattr(arguments, 'profile_cprofile', False))
+
+        self.__igrf_grid()
+
+        self.profiler.report(self.project_name, 'igrf-grid', arguments)
+
+    def __igrf_grid(self) -> None:
+        """
+        Evaluates the IGRF main field and secular variation components over a latitude/longitude
+        bounding box and saves them as a gridded array file.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        self.__magnetopy_logging.info('Computing the IGRF grid')
+
+        _project_name = self.project_name
+        _lat_min, _lat_max, _lon_min, _lon_max = [float(value) for value in self.bbox.split(',')]
+        _resolution = self.resolution
+        _altitude = self.altitude
+        _date = self.date
+
+        if not (-90 <= _lat_min < _lat_max <= 90 and -180 <= _lon_min < _lon_max <= 180):
+            self.__magnetopy_logging.error(f'Error: Invalid bounding box: "{self.bbox}"')
+            raise ValueError(f'Invalid bounding box: {self.bbox}')
+
+        if _resolution <= 0:
+            self.__magnetopy_logging.error(f'Error: The resolution must be positive: "{_resolution}"')
+            raise ValueError(f'The resolution must be positive: {_resolution}')
+
+        with self.profiler.stage('load_igrf_coefficients'):
+            magnetopyIGRFHelper = MagnetoPyIGRFHelper()
+            igrf = magnetopyIGRFHelper.load_igrf_coefficients()
+            nmax = igrf.parameters['nmax']
+
+            date = MagnetoPyConversionsHelper.convert_date_to_decimal_date(_date)
+            provider = IGRFCoefficientProvider(igrf)
+            coeffs = provider.coefficients(date)
+            coeffs_sv, coeffsm = provider.epoch_coefficients(date)
+
+        lat = np.arange(_lat_min, _lat_max + _resolution / 2, _resolution)
+        lon = np.arange(_lon_min, _lon_max + _resolution / 2, _resolution)
+
+        # Tiles are blocks of whole grid rows that fit in the memory budget
+        rows_per_tile = max(1, magnetopyIGRFHelper.chunk_size(nmax, self.memory_budget) // lon.size)
+        tiles = [
+            (lat[start:start + rows_per_tile], lon, _altitude, coeffs, coeffs_sv, coeffsm, nmax)
+            for start in range(0, lat.size, rows_per_tile)
+        ]
+
+        self.__magnetopy_logging.info(f'Grid of {lat.size} x {lon.size} points split in {len(tiles)} tiles of {rows_per_tile} rows')
+
+        # With several workers the memory peak of the stage only covers the results sent back
+        with self.profiler.stage('igrf_synthesis', rows=lat.size * lon.size):
+            if self.workers > 1 and len(tiles) > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    results = list(executor.map(synthesize_tile, tiles))
+            else:
+                results = [synthesize_tile(tile) for tile in tiles]
+
+        with self.profiler.stage('save', rows=lat.size * lon.size):
+            grid_data = {'lat': lat, 'lon': lon}
+            attributes = {'date': _date, 'decimal_date': date, 'altitude_km': _altitude, 'resolution_deg': _resolution}
+            for key, (name, units) in GRID_COMPONENTS.items():
+                grid_data[name] = np.concatenate([result[key] for result in results], axis=0)
+                attributes[f'{name}_units'] = units
+
+            MagnetoPyFilesHelper.save_grid_data(grid_data, attributes, _project_name, self.output_format)
+
+        self.__magnetopy_logging.info('IGRF grid completed')
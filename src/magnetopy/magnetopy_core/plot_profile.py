@@ -1,10 +1,16 @@
 from argparse import Namespace
 from logging import getLogger
+import os
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
 from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
 from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+from src.magnetopy.magnetopy_utils.magnetopy_plot_helper import MagnetoPyPlotHelper
+from src.magnetopy.magnetopy_utils.magnetopy_profiler import MagnetoPyProfiler
+
+PLOT_OUTPUT_FORMATS = ['png', 'svg', 'pdf']
 
 
 class PlotProfile:
@@ -13,12 +19,22 @@ class PlotProfile:
 
         self.project_file: str = arguments.project_file
         self.col_to_plot: str = arguments.col_to_plot
+        self.output: str = getattr(arguments, 'output', None)
+        self.downsample: str = getattr(arguments, 'downsample', 'minmax')
+        self.width: int = getattr(arguments, 'width', 1600)
+        self.height: int = getattr(arguments, 'height', 900)
+        self.profiler: MagnetoPyProfiler = MagnetoPyProfiler(getattr(arguments, 'profile', False), getattr(arguments, 'profile_cprofile', False))
 
         self.__plot_profile()
 
+        # The project files are saved in resources/<project_name>, the report is written next to them
+        self.profiler.report(os.path.basename(os.path.dirname(os.path.abspath(self.project_file))), 'plot-profile', arguments)
+
     def __plot_profile(self) -> None:
         """
-        Reads the project file and plots the profile of the selected column.
+        Reads the project file and plots the profile of the selected columns, one panel per
+        column. The profiles are downsampled to the plot width before drawing. With an output
+        file the figure is rendered without a display, otherwise it is shown in a window.
 
         :return: Nothing to return
         :rtype: None
@@ -26,21 +42,54 @@ class PlotProfile:
         self.__magnetopy_logging.info('Reading the project file and plotting the profile')
 
         _project_file_path = self.project_file
-        _col_to_plot = self.col_to_plot
+        _cols_to_plot = self.col_to_plot.split(',')
+        _output = self.output
 
-        project_df = MagnetoPyFilesHelper.read_and_verify_columns(_project_file_path, [_col_to_plot])
+        if _output is not None and os.path.splitext(_output)[1].lstrip('.').lower() not in PLOT_OUTPUT_FORMATS:
+            self.__magnetopy_logging.error(f'Error: Plot output format not supported: "{_output}", use one of {PLOT_OUTPUT_FORMATS}')
+            raise ValueError(f'Plot output format not supported: {_output}')
+
+        with self.profiler.stage('read_project_file') as stage:
+            project_df = MagnetoPyFilesHelper.read_data(_project_file_path, _cols_to_plot)
+            stage['rows'] = 0 if project_df is None else len(project_df)
 
         if project_df is None:
             self.__magnetopy_logging.error('Error reading the project file')
             return
-        
-        plt.plot(project_df[_col_to_plot])
 
-        plt.xlabel('Index')
-        plt.ylabel(_col_to_plot)
-        plt.title(f'Profile of the column: {_col_to_plot}')
-        plt.grid(alpha=0.5)
+        with self.profiler.stage('downsample', rows=len(project_df) * len(_cols_to_plot)):
+            index = np.arange(len(project_df))
+            profiles = {
+                col: MagnetoPyPlotHelper.downsample(index, pd.to_numeric(project_df[col], errors='coerce').to_numpy(), self.width, self.downsample)
+                for col in _cols_to_plot
+            }
+
+        self.__magnetopy_logging.info(f'{len(project_df)} rows drawn with {max(len(x) for x, _ in profiles.values())} points per column')
+
+        if _output is None:
+            # pyplot picks an interactive backend, it is only imported when a window is shown
+            import matplotlib.pyplot as plt
+            figure = plt.figure(figsize=(self.width / 100, self.height / 100), dpi=100)
+        else:
+            # A bare Figure is rendered by the non-interactive backend of the file format
+            figure = Figure(figsize=(self.width / 100, self.height / 100), dpi=100)
+
+        with self.profiler.stage('plot', rows=sum(len(x) for x, _ in profiles.values())):
+            axes = figure.subplots(len(_cols_to_plot), 1, sharex=True, squeeze=False)[:, 0]
+            for ax, (col, (x, y)) in zip(axes, profiles.items()):
+                ax.plot(x, y, linewidth=0.8)
+                ax.set_ylabel(col)
+                ax.grid(alpha=0.5)
+
+            axes[-1].set_xlabel('Index')
+            axes[0].set_title(f'Profile of the column: {_cols_to_plot[0]}' if len(_cols_to_plot) == 1 else f'Profile of the columns: {", ".join(_cols_to_plot)}')
 
-        plt.show(block=True)
+        if _output is None:
+            plt.show(block=True)
+        else:
+            with self.profiler.stage('save'):
+                os.makedirs(os.path.dirname(os.path.abspath(_output)), exist_ok=True)
+                figure.savefig(_output)
+            self.__magnetopy_logging.info(f'Profile saved on: {os.path.abspath(_output)}')
 
-        self.__magnetopy_logging.info('Profile plotted successfully')
\ No newline at end of file
+        self.__magnetopy_logging.info('Profile plotted successfully')
@@ -0,0 +1,146 @@
+from argparse import Namespace
+from logging import getLogger
+import numpy as np
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper, MagnetoPyChunkWriter
+from src.magnetopy.magnetopy_utils.magnetopy_conversions_helper import MagnetoPyConversionsHelper
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper, IGRFCoefficientProvider
+from src.magnetopy.magnetopy_utils.magnetopy_profiler import MagnetoPyProfiler
+from src.magnetopy.magnetopy_core.diurnal_variation import DiurnalVariation
+from src.magnetopy.magnetopy_core.calculate_igrf import CalculateIGRF
+
+
+class Reduce:
+    def __init__(self, arguments: Namespace):
+        self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='Reduce')
+
+        self.project_name: str = arguments.project_name
+        self.stations_file: str = arguments.stations_file
+        self.stations_cols: str = arguments.stations_cols
+        self.base_station_file = arguments.base_station_file
+        self.base_station_cols: str = arguments.base_station_cols
+        self.altitude: float = getattr(arguments, 'altitude', None)
+        self.date: str = getattr(arguments, 'date', None)
+        self.base_interpolation: str = getattr(arguments, 'base_interpolation', 'nearest')
+        self.max_base_gap: float = getattr(arguments, 'max_base_gap', None)
+        self.base_index_dir: str = getattr(arguments, 'base_index_dir', None)
+        self.igrf_mode: str = getattr(arguments, 'igrf_mode', 'station')
+        self.memory_budget: float = getattr(arguments, 'memory_budget', 256)
+        self.igrf_lookup_tolerance: float = getattr(arguments, 'igrf_lookup_tolerance', None)
+        self.output_format: str = getattr(arguments, 'output_format', 'csv')
+        self.output_compression: str = getattr(arguments, 'output_compression', None)
+        self.output_cols: list = getattr(arguments, 'output_cols', None)
+        if isinstance(self.output_cols, str):
+            self.output_cols = self.output_cols.split(',')
+        self.chunk_size: int = getattr(arguments, 'chunk_size', None)
+        self.invalid_dates: str = getattr(arguments, 'invalid_dates', 'drop')
+
+        self.rows: int = 0
+        self.output_file: str = None
+        self.profiler: MagnetoPyProfiler = MagnetoPyProfiler(getattr(arguments, 'profile', False), getattr(arguments, 'profile_cprofile', False))
+
+        self.__reduce()
+
+        self.profiler.report(self.project_name, 'reduce', arguments)
+
+    def __reduce(self) -> None:
+        """
+        Performs the diurnal variation correction, the IGRF synthesis and the residual anomaly of a
+        data set in one pass. The dates and times are parsed once and only the final output is written.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        self.__magnetopy_logging.info('Performing the diurnal variation, IGRF and residual anomaly reduction')
+
+        _project_name = self.project_name
+        _stations_file_path = self.stations_file
+        _stations_cols = self.stations_cols.split(',')
+        _base_station_cols = self.base_station_cols.split(',')
+        _altitude = self.altitude
+        _date = self.date
+
+        if _altitude is None and len(_stations_cols) < 6:
+            self.__magnetopy_logging.error('Error: The altitude is required, use --altitude or add an altitude column to --stations_cols')
+            raise ValueError('The altitude is required, use --altitude or add an altitude column to --stations_cols')
+
+        base_stations_df = DiurnalVariation.load_base_station(self.base_station_file, _base_station_cols, self.profiler, self.base_index_dir, self.invalid_dates)
+        base_stations_df.columns = ['base_' + col for col in base_stations_df.columns]
+
+        with self.profiler.stage('load_igrf_coefficients'):
+            magnetopyIGRFHelper = MagnetoPyIGRFHelper()
+            igrf = magnetopyIGRFHelper.load_igrf_coefficients()
+            provider = IGRFCoefficientProvider(igrf)
+
+        with self.profiler.stage('read_stations'):
+            if self.chunk_size is None:
+                stations_chunks = MagnetoPyFilesHelper.read_and_verify_columns(_stations_file_path, _stations_cols, MagnetoPyFilesHelper.column_dtypes(_stations_cols))
+                stations_chunks = None if stations_chunks is None else [stations_chunks]
+            else:
+                stations_chunks = MagnetoPyFilesHelper.read_columns(_stations_file_path, _stations_cols, MagnetoPyFilesHelper.column_dtypes(_stations_cols), chunksize=self.chunk_size)
+
+        if stations_chunks is None:
+            self.__magnetopy_logging.error(f'Error: Could not read the stations file: "{_stations_file_path}"')
+            raise ValueError(f'Could not read the stations file: {_stations_file_path}')
+
+        mean_position = None
+        if self.igrf_mode == 'average' and self.chunk_size is not None:
+            with self.profiler.stage('mean_position'):
+                mean_position = CalculateIGRF.mean_position(_stations_file_path, CalculateIGRF.position_cols(_stations_cols), self.chunk_size)
+
+        position_bounds = None
+        if self.igrf_mode == 'station' and self.chunk_size is not None and self.igrf_lookup_tolerance is not None:
+            with self.profiler.stage('position_bounds'):
+                position_bounds = CalculateIGRF.position_bounds(_stations_file_path, CalculateIGRF.position_cols(_stations_cols), self.chunk_size)
+
+        if _date is not None:
+            self.__magnetopy_logging.info(f'Using the date {_date} for every station')
+
+        writer = MagnetoPyChunkWriter(_project_name, self.output_format, self.output_compression, self.output_cols)
+
+        lookup_table = None
+
+        stations_chunks = iter(stations_chunks)
+        while True:
+            with self.profiler.stage('read_stations') as stage:
+                stations_df = next(stations_chunks, None)
+                stage['rows'] = 0 if stations_df is None else len(stations_df)
+            if stations_df is None:
+                break
+
+            with self.profiler.stage('parse_dates', rows=len(stations_df)):
+                stations_df, failed_rows = MagnetoPyFilesHelper.parse_date_time_columns(stations_df, _stations_cols[0], _stations_cols[1])
+                MagnetoPyFilesHelper.check_failed_rows(failed_rows, _stations_file_path, self.invalid_dates)
+                stations_df = stations_df.add_prefix('sta_')
+
+            result_df = DiurnalVariation.correct_chunk(stations_df, base_stations_df, _stations_cols, _base_station_cols, self.base_interpolation, self.max_base_gap, self.profiler)
+
+            with self.profiler.stage('decimal_dates', rows=len(result_df)):
+                if _date is not None:
+                    date = MagnetoPyConversionsHelper.convert_date_to_decimal_date(_date)
+                else:
+                    date = MagnetoPyConversionsHelper.convert_datetime64_to_decimal_dates(result_df['sta_datetime'])
+
+            lat, lon, altitude = CalculateIGRF.station_positions(result_df, _stations_cols, self.igrf_mode, _altitude, mean_position, 'sta_')
+
+            if self.igrf_mode == 'station' and self.igrf_lookup_tolerance is not None and lookup_table is None:
+                with self.profiler.stage('igrf_lookup_table'):
+                    lookup_table = CalculateIGRF.igrf_lookup_table(magnetopyIGRFHelper, igrf, provider, date, altitude, lat, lon, self.igrf_lookup_tolerance, position_bounds, self.memory_budget)
+
+            with self.profiler.stage('igrf_synthesis', rows=len(result_df)):
+                results = CalculateIGRF.igrf_columns(magnetopyIGRFHelper, igrf, provider, date, altitude, lat, lon, len(result_df), self.memory_budget, lookup_table)
+                result_df = MagnetoPyFilesHelper.write_igrf_components_to_dataframe(result_df, results)
+
+                result_df['residual_anomaly'] = result_df['diurnal_var_corr'] - result_df['F(nT)']
+
+            with self.profiler.stage('save', rows=len(result_df)):
+                writer.write(result_df)
+
+        self.__magnetopy_logging.info(f'Total records: {writer.rows}')
+
+        self.rows = writer.rows
+        with self.profiler.stage('save'):
+            self.output_file = writer.close()
+
+        self.__magnetopy_logging.info('Reduction completed')
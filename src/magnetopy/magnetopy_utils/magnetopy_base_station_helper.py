@@ -0,0 +1,400 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from logging import getLogger
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+
+# Layout version of the base station index files, indexes of other versions are rebuilt
+BASE_INDEX_VERSION = 1
+
+_LOGGER: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyBaseStationHelper')
+
+
+class MagnetoPyBaseIndex:
+    def __init__(self, arrays, uniques=None):
+        """
+        Base station readings opened from an index folder by read_base_index. Every column is a
+        read-only memory map shared by the processes that open the index: numeric and datetime
+        columns hold their values, text columns hold integer codes decoded with their distinct
+        values, whose last slot is the missing value of the code -1.
+
+        Only the readings matched by a chunk of stations are copied, as a DataFrame, by take().
+
+        :param arrays: dict, column name and numpy.memmap
+        :param uniques: dict, optional distinct values of the text columns
+        """
+        self.__arrays: dict = dict(arrays)
+        self.__uniques: dict = dict(uniques or {})
+
+    @property
+    def columns(self) -> list:
+        return list(self.__arrays)
+
+    @columns.setter
+    def columns(self, names) -> None:
+        names = list(names)
+        renamed = dict(zip(self.__arrays, names))
+        self.__arrays = {renamed[name]: values for name, values in self.__arrays.items()}
+        self.__uniques = {renamed[name]: values for name, values in self.__uniques.items()}
+
+    def __len__(self) -> int:
+        return len(next(iter(self.__arrays.values()))) if self.__arrays else 0
+
+    def __getitem__(self, name):
+        """
+        :param name: str
+        :return: Memory-mapped values of a numeric or datetime column, decoded values of a text column
+        :rtype: numpy.ndarray
+        """
+        if name in self.__uniques:
+            return self.__uniques[name].take(self.__arrays[name])
+
+        return self.__arrays[name]
+
+    def memmap(self, name) -> np.memmap:
+        """
+        :param name: str
+        :return: Memory-mapped values or codes of a column
+        :rtype: numpy.memmap
+        """
+        return self.__arrays[name]
+
+    def copy(self, deep=False):
+        """
+        :param deep: bool, ignored, the memory maps are read-only and always shared
+        :return: Index sharing the same memory maps, whose columns can be renamed independently
+        :rtype: MagnetoPyBaseIndex
+        """
+        return MagnetoPyBaseIndex(self.__arrays, self.__uniques)
+
+    def take(self, indices) -> pd.DataFrame:
+        """
+        :param indices: numpy.ndarray of int, positional indices of the readings
+        :return: Copy of the selected readings
+        :rtype: pd.DataFrame
+        """
+        indices = np.asarray(indices)
+        data = {}
+        for name, values in self.__arrays.items():
+            values = values.take(indices)
+            data[name] = pd.Series(self.__uniques[name].take(values), dtype=object) if name in self.__uniques else values
+
+        return pd.DataFrame(data)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: In-memory copy of every reading
+        :rtype: pd.DataFrame
+        """
+        return self.take(np.arange(len(self)))
+
+
+class MagnetoPyBaseStationHelper:
+    @staticmethod
+    def nearest_reading_indices(base_datetimes, stations_datetimes):
+        """
+        This function returns, for every station timestamp, the positional index of the
+        closest base station reading in time.
+
+        The base timestamps are sorted once and every station timestamp is located with a
+        binary search, so the cost is O((N + M) log M) instead of scanning the whole base
+        series for each station. Ties are resolved as ``idxmin`` does: the reading with the
+        lowest position in the base series wins.
+
+        :param base_datetimes: pd.Series or numpy.ndarray of datetime64
+        :param stations_datetimes: pd.Series or numpy.ndarray of datetime64
+        :return: numpy.ndarray of int
+        """
+        base_values = np.asarray(base_datetimes, dtype='datetime64[ns]').view('int64')
+        stations_values = np.asarray(stations_datetimes, dtype='datetime64[ns]').view('int64')
+
+        if base_values.size == 0:
+            _LOGGER.error('Error: The base station series is empty.')
+            raise ValueError('The base station series is empty.')
+
+        # A stable sort keeps equal timestamps in their original order, so the first
+        # position of a run of equal timestamps is also the lowest original index.
+        order = np.argsort(base_values, kind='stable')
+        sorted_values = base_values[order]
+
+        right = np.searchsorted(sorted_values, stations_values, side='left')
+        right = np.clip(right, 0, sorted_values.size - 1)
+        left = np.clip(right - 1, 0, sorted_values.size - 1)
+        # Move the left candidate to the first reading that shares its timestamp
+        left = np.searchsorted(sorted_values, sorted_values[left], side='left')
+
+        left_diff = np.abs(stations_values - sorted_values[left])
+        right_diff = np.abs(stations_values - sorted_values[right])
+
+        left_index = order[left]
+        right_index = order[right]
+
+        use_left = (left_diff < right_diff) | ((left_diff == right_diff) & (left_index < right_index))
+
+        return np.where(use_left, left_index, right_index)
+
+    @staticmethod
+    def interpolate_readings(base_datetimes, base_values, stations_datetimes, method='linear'):
+        """
+        This function interpolates the base station readings at every station timestamp in a
+        single vectorized pass.
+
+        Readings that share a timestamp are averaged before interpolating and stations outside
+        the base record take the value of the closest end of the record.
+
+        :param base_datetimes: pd.Series or numpy.ndarray of datetime64
+        :param base_values: pd.Series or numpy.ndarray of float
+        :param stations_datetimes: pd.Series or numpy.ndarray of datetime64
+        :param method: str, one of 'nearest', 'linear' or 'cubic'
+        :return: numpy.ndarray of float
+        """
+        base_values = np.asarray(base_values, dtype=float)
+
+        if method == 'nearest':
+            return base_values[MagnetoPyBaseStationHelper.nearest_reading_indices(base_datetimes, stations_datetimes)]
+
+        if method not in ('linear', 'cubic'):
+            _LOGGER.error(f'Error: Interpolation method not supported: "{method}"')
+            raise ValueError(f'Interpolation method not supported: {method}')
+
+        base_ns = np.asarray(base_datetimes, dtype='datetime64[ns]').view('int64')
+        stations_ns = np.asarray(stations_datetimes, dtype='datetime64[ns]').view('int64')
+
+        if base_ns.size == 0:
+            _LOGGER.error('Error: The base station series is empty.')
+            raise ValueError('The base station series is empty.')
+
+        unique_ns, inverse = np.unique(base_ns, return_inverse=True)
+        unique_values = np.bincount(inverse, weights=base_values) / np.bincount(inverse)
+
+        # Seconds from the first reading keep the float64 abscissa well conditioned
+        base_seconds = (unique_ns - unique_ns[0]) / 1e9
+        stations_seconds = np.clip((stations_ns - unique_ns[0]) / 1e9, base_seconds[0], base_seconds[-1])
+
+        if method == 'linear' or unique_ns.size < 3:
+            return np.interp(stations_seconds, base_seconds, unique_values)
+
+        from scipy.interpolate import CubicSpline
+        return CubicSpline(base_seconds, unique_values)(stations_seconds)
+
+    @staticmethod
+    def flag_base_gaps(base_datetimes, stations_datetimes, max_gap):
+        """
+        This function flags the station timestamps that fall inside a base station outage.
+
+        A station is flagged when the base readings that bracket it are more than ``max_gap``
+        seconds apart, or when it lies more than ``max_gap`` seconds outside the base record.
+
+        :param base_datetimes: pd.Series or numpy.ndarray of datetime64
+        :param stations_datetimes: pd.Series or numpy.ndarray of datetime64
+        :param max_gap: float, seconds
+        :return: numpy.ndarray of bool
+        """
+        base_ns = np.unique(np.asarray(base_datetimes, dtype='datetime64[ns]').view('int64'))
+        stations_ns = np.asarray(stations_datetimes, dtype='datetime64[ns]').view('int64')
+        max_gap_ns = max_gap * 1e9
+
+        if base_ns.size == 0:
+            _LOGGER.error('Error: The base station series is empty.')
+            raise ValueError('The base station series is empty.')
+
+        right = np.searchsorted(base_ns, stations_ns, side='left')
+        exact = (right < base_ns.size) & (base_ns[np.clip(right, 0, base_ns.size - 1)] == stations_ns)
+
+        before = right == 0
+        after = right == base_ns.size
+        inside = ~(before | after)
+
+        gaps = np.zeros(stations_ns.shape, dtype=bool)
+        gaps[before] = (base_ns[0] - stations_ns[before]) > max_gap_ns
+        gaps[after] = (stations_ns[after] - base_ns[-1]) > max_gap_ns
+        gaps[inside] = (base_ns[right[inside]] - base_ns[right[inside] - 1]) > max_gap_ns
+
+        return gaps & ~exact
+
+    @staticmethod
+    def unit_vectors(lat, lon):
+        """
+        This function converts geodetic latitudes and longitudes to unit vectors, so the
+        straight-line distance between two vectors grows with the great-circle distance.
+
+        :param lat: numpy.ndarray, degrees
+        :param lon: numpy.ndarray, degrees
+        :return: numpy.ndarray of shape (N, 3)
+        """
+        lat = np.radians(np.asarray(lat, dtype=float))
+        lon = np.radians(np.asarray(lon, dtype=float))
+
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    @staticmethod
+    def nearest_base_readings(base_ids, base_lats, base_lons, base_datetimes, stations_lats, stations_lons, stations_datetimes, max_gap=None, candidates=8):
+        """
+        This function selects, for every station, a reading of the nearest valid base station
+        in space and time when several base stations are recorded together.
+
+        The base positions are indexed in a KD-tree and the ``candidates`` nearest bases of every
+        station are queried in one call. The readings of each base are then matched in time
+        with nearest_reading_indices, once per base for all the stations that have it as a
+        candidate. A base is valid for a station when the station lies inside its record or,
+        with ``max_gap``, when flag_base_gaps does not flag it. The nearest valid candidate is
+        chosen; stations without one use the candidate with the closest reading in time.
+
+        :param base_ids: numpy.ndarray of int, base station index 0..B-1 of every reading
+        :param base_lats: numpy.ndarray, latitude of every reading in degrees
+        :param base_lons: numpy.ndarray, longitude of every reading in degrees
+        :param base_datetimes: pd.Series or numpy.ndarray of datetime64
+        :param stations_lats: numpy.ndarray, degrees
+        :param stations_lons: numpy.ndarray, degrees
+        :param stations_datetimes: pd.Series or numpy.ndarray of datetime64
+        :param max_gap: float, optional seconds
+        :param candidates: int, number of nearest bases considered for every station
+        :return: Positional index of the selected readings, distance in km to their base and validity
+        :rtype: tuple
+        """
+        from scipy.spatial import cKDTree
+
+        base_ids = np.asarray(base_ids, dtype=int)
+        base_ns = np.asarray(base_datetimes, dtype='datetime64[ns]')
+        stations_ns = np.asarray(stations_datetimes, dtype='datetime64[ns]')
+
+        if base_ids.size == 0:
+            _LOGGER.error('Error: The base station series is empty.')
+            raise ValueError('The base station series is empty.')
+
+        # Base positions are the normalized mean of the unit vectors of their readings
+        counts = np.bincount(base_ids)
+        base_vectors = MagnetoPyBaseStationHelper.unit_vectors(base_lats, base_lons)
+        positions = np.column_stack([np.bincount(base_ids, weights=base_vectors[:, axis], minlength=counts.size) for axis in range(3)])
+        positions /= np.linalg.norm(positions, axis=1, keepdims=True)
+
+        k = min(candidates, counts.size)
+        chords, nearest_bases = cKDTree(positions).query(MagnetoPyBaseStationHelper.unit_vectors(stations_lats, stations_lons), k=k, workers=-1)
+        chords = np.asarray(chords).reshape(stations_ns.size, k)
+        nearest_bases = np.asarray(nearest_bases).reshape(stations_ns.size, k)
+
+        readings = np.empty(nearest_bases.shape, dtype=int)
+        time_diffs = np.empty(nearest_bases.shape, dtype='int64')
+        valid = np.empty(nearest_bases.shape, dtype=bool)
+
+        # Readings and (station, candidate) pairs are grouped by base, so each base is searched once
+        base_order = np.argsort(base_ids, kind='stable')
+        base_starts = np.concatenate([[0], np.cumsum(counts)])
+        pair_order = np.argsort(nearest_bases, axis=None, kind='stable')
+        pair_starts = np.concatenate([[0], np.cumsum(np.bincount(nearest_bases.ravel(), minlength=counts.size))])
+
+        for base in np.unique(nearest_bases):
+            base_readings = base_order[base_starts[base]:base_starts[base + 1]]
+            pairs = pair_order[pair_starts[base]:pair_starts[base + 1]]
+            rows, cols = np.divmod(pairs, k)
+
+            matched = base_readings[MagnetoPyBaseStationHelper.nearest_reading_indices(base_ns[base_readings], stations_ns[rows])]
+            readings[rows, cols] = matched
+            time_diffs[rows, cols] = np.abs((base_ns[matched] - stations_ns[rows]).view('int64'))
+
+            if max_gap is None:
+                valid[rows, cols] = (stations_ns[rows] >= base_ns[base_readings].min()) & (stations_ns[rows] <= base_ns[base_readings].max())
+            else:
+                valid[rows, cols] = ~MagnetoPyBaseStationHelper.flag_base_gaps(base_ns[base_readings], stations_ns[rows], max_gap)
+
+        # Candidates are sorted by distance, argmax returns the nearest valid one
+        has_valid = valid.any(axis=1)
+        selected = np.where(has_valid, valid.argmax(axis=1), time_diffs.argmin(axis=1))
+        rows = np.arange(stations_ns.size)
+
+        distances = 2 * 6371.2 * np.arcsin(np.clip(chords[rows, selected] / 2, 0, 1))
+
+        return readings[rows, selected], distances, valid[rows, selected]
+
+    @staticmethod
+    def base_index_key(base_station_file, base_station_cols):
+        """
+        This function returns the key of the base station index of a file: the SHA-256 of its
+        content, of the selected columns and of the index layout version.
+
+        :param base_station_file: str
+        :param base_station_cols: list
+        :return: str
+        """
+        file_hash = hashlib.sha256(f'{BASE_INDEX_VERSION}:{",".join(base_station_cols)}:'.encode())
+        with open(base_station_file, 'rb') as f:
+            for block in iter(lambda: f.read(2 ** 20), b''):
+                file_hash.update(block)
+
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def write_base_index(base_stations_df, index_folder):
+        """
+        This function stores parsed base station readings as an index folder: one .npy file per
+        column, which can be memory-mapped, and a meta.json file. Text columns are stored as
+        integer codes with their distinct values in meta.json, missing values get the code -1.
+        The folder is written in a
+        temporary folder and renamed, so concurrent runs never read a partial index.
+
+        :param base_stations_df: pd.DataFrame
+        :param index_folder: str
+        :return: Nothing to return
+        :rtype: None
+        """
+        parent_folder = os.path.dirname(os.path.abspath(index_folder))
+        os.makedirs(parent_folder, exist_ok=True)
+        temporary_folder = tempfile.mkdtemp(dir=parent_folder, prefix='.base_index_')
+
+        meta = {'version': BASE_INDEX_VERSION, 'rows': len(base_stations_df), 'columns': []}
+        for position, col in enumerate(base_stations_df.columns):
+            values = base_stations_df[col]
+            column = {'name': col, 'file': f'column_{position}.npy'}
+            if values.dtype.kind in 'biufM':
+                np.save(os.path.join(temporary_folder, column['file']), values.to_numpy())
+            else:
+                codes, uniques = pd.factorize(values)
+                np.save(os.path.join(temporary_folder, column['file']), codes.astype(np.int32))
+                column['uniques'] = [str(value) for value in uniques]
+            meta['columns'].append(column)
+
+        with open(os.path.join(temporary_folder, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        try:
+            os.rename(temporary_folder, index_folder)
+        except OSError:
+            # Another run wrote the same index first
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+
+    @staticmethod
+    def read_base_index(index_folder):
+        """
+        This function opens a base station index written by write_base_index. Every column is
+        kept as a read-only memory map shared by every process that opens it.
+
+        :param index_folder: str
+        :return: MagnetoPyBaseIndex or None if there is no valid index in the folder
+        """
+        try:
+            with open(os.path.join(index_folder, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('version') != BASE_INDEX_VERSION:
+            _LOGGER.warning(f'Base station index with another version ignored: "{index_folder}"')
+            return None
+
+        arrays = {}
+        uniques = {}
+        for column in meta['columns']:
+            arrays[column['name']] = np.load(os.path.join(index_folder, column['file']), mmap_mode='r')
+            if 'uniques' in column:
+                # Text columns keep the object dtype of parse_date_time_columns, the missing
+                # value slot after the distinct values is taken by the code -1
+                uniques[column['name']] = np.array(column['uniques'] + [None], dtype=object)
+
+        _LOGGER.info(f'Base station index opened: "{index_folder}"')
+
+        return MagnetoPyBaseIndex(arrays, uniques)
@@ -1,8 +1,6 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from logging import getLogger
-
-from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
 
 
 class MagnetoPyConversionsHelper:
@@ -13,7 +11,6 @@ class MagnetoPyConversionsHelper:
 
         :param date_str: str
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyConversionsHelper: convert_date_to_decimal_date')
         date_formats = [
             "%d/%m/%Y",
             "%d-%m-%Y",
@@ -41,4 +38,39 @@ class MagnetoPyConversionsHelper:
         
         decimal_date = year + (day_of_year - 1) / days_in_year
         
-        return decimal_date
\ No newline at end of file
+        return decimal_date
+
+    @staticmethod
+    def convert_datetime64_to_decimal_dates(datetimes):
+        """
+        This function converts datetime64 values to decimal years in one vectorized operation,
+        including the time of day. Every year is divided by its own length, 365 or 366 days,
+        and NaT values give NaN.
+
+        Whole days are divided separately from the rest of the day, so dates at midnight give
+        exactly the values of convert_date_to_decimal_date.
+
+        :param datetimes: numpy.ndarray, pd.Series or pd.DatetimeIndex of datetime64
+        :return: numpy.ndarray of float64
+        """
+        values = np.asarray(datetimes, dtype='datetime64[ns]')
+        years = values.astype('datetime64[Y]')
+        start_of_year = years.astype('datetime64[D]')
+        days_in_year = ((years + 1).astype('datetime64[D]') - start_of_year).astype(np.int64)
+
+        nanoseconds = (values - start_of_year).astype(np.int64)
+        whole_days, day_nanoseconds = np.divmod(nanoseconds, 86_400_000_000_000)
+
+        decimal_dates = years.astype(np.int64) + 1970 + (whole_days + day_nanoseconds / 86_400_000_000_000) / days_in_year
+
+        return np.where(np.isnat(values), np.nan, decimal_dates)
+
+    @staticmethod
+    def convert_datetimes_to_decimal_dates(datetimes):
+        """
+        This function converts a datetime column to decimal dates, including the time of day.
+
+        :param datetimes: pd.Series of datetime64
+        :return: pd.Series of float
+        """
+        return pd.Series(MagnetoPyConversionsHelper.convert_datetime64_to_decimal_dates(datetimes), index=datetimes.index)
@@ -1,49 +1,160 @@
 import os
 import re
+import shutil
+import zipfile
+import tempfile
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from logging import getLogger
 
 from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
 
+OUTPUT_FORMATS = ['csv', 'parquet', 'feather', 'npz']
+OUTPUT_COMPRESSIONS = {
+    'csv': ['gzip', 'bz2', 'xz'],
+    'parquet': ['snappy', 'gzip', 'zstd', 'brotli', 'lz4'],
+    'feather': ['zstd', 'lz4'],
+    'npz': ['zip']
+}
+DATE_FORMATS = ['%d-%m-%Y', '%d/%m/%Y', '%d%m%Y', '%Y-%m-%d', '%Y/%m/%d', '%m-%d-%Y', '%m/%d/%Y', '%Y.%m.%d']
+TIME_FORMATS = ['%H:%M:%S', '%I:%M:%S %p', '%H%M%S', '%I:%M %p', '%I:%M:%S']
+
+_LOGGER: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyFilesHelper')
 
 class MagnetoPyFilesHelper:
     @staticmethod
-    def validate_date(date_str):
+    def detect_format(column, formats, sample_size=100):
         """
-        This function validates the date string and returns the date object.
+        This function detects the first format of the list that parses a sample of the column.
 
-        :param date_str: str
-        :return: datetime.date
+        :param column: pd.Series of str
+        :param formats: list
+        :param sample_size: int
+        :return: str or None
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyFilesHelper: validate_date')
-        formats = ['%d-%m-%Y', '%d/%m/%Y', '%d%m%Y', '%Y-%m-%d', '%Y/%m/%d', '%m-%d-%Y', '%m/%d/%Y', '%Y.%m.%d']
+        sample = column.dropna().head(sample_size)
+        best_format, best_count = None, 0
         for fmt in formats:
-            try:
-                new_date = datetime.strptime(date_str, fmt).date()
-                return new_date.strftime('%Y-%m-%d')
-            except ValueError:
-                continue
-        raise ValueError("Invalid date format: {}".format(date_str))
+            count = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+            if count == len(sample):
+                return fmt
+            if count > best_count:
+                best_format, best_count = fmt, count
+
+        return best_format
 
     @staticmethod
-    def validate_time(time_str):
+    def parse_column(column, formats, sample_size=100):
         """
-        This function validates the time string and returns the time object.
+        This function converts a date or time column to datetime64 in vectorized calls.
 
-        :param time_str: str
-        :return: datetime.time
+        The format is detected once from a sample of the column. Rows that do not match it are
+        retried with the remaining formats, so columns that mix formats are still accepted.
+
+        :param column: pd.Series
+        :param formats: list
+        :param sample_size: int
+        :return: pd.Series of datetime64, pd.Series with the values of the rows that failed
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyFilesHelper: validate_time')
-        formats = ['%H:%M:%S', '%I:%M:%S %p', '%H%M%S', '%I:%M %p', '%I:%M:%S']
+        column = column.astype(str)
+        detected_format = MagnetoPyFilesHelper.detect_format(column, formats, sample_size)
+
+        if detected_format is None:
+            return pd.Series(pd.NaT, index=column.index, dtype='datetime64[ns]'), column
+
+        parsed = pd.to_datetime(column, format=detected_format, errors='coerce')
         for fmt in formats:
-            try:
-                new_time = datetime.strptime(str(time_str), fmt).time()
-                return new_time.strftime('%H:%M:%S')
-            except ValueError:
-                continue
-        raise ValueError("Invalid time format: {}".format(time_str))
-    
+            failed = parsed.isna()
+            if not failed.any():
+                break
+            if fmt != detected_format:
+                parsed[failed] = pd.to_datetime(column[failed], format=fmt, errors='coerce')
+
+        return parsed, column[parsed.isna()]
+
+    @staticmethod
+    def format_column(column, fmt):
+        """
+        This function formats a datetime64 column as strings, formatting each distinct value once.
+
+        :param column: pd.Series of datetime64
+        :param fmt: str
+        :return: pd.Series of str
+        """
+        codes, uniques = pd.factorize(column)
+        labels = pd.Index(uniques.strftime(fmt), dtype=object)
+        return pd.Series(labels.take(codes), index=column.index)
+
+    @staticmethod
+    def parse_date_time_columns(df, date_col, time_col, datetime_col='datetime'):
+        """
+        This function validates the date and time columns of the dataframe column by column, writes
+        them back as YYYY-MM-DD and HH:MM:SS strings and adds the combined datetime64 column.
+
+        Rows whose date or time cannot be parsed are dropped and returned in a report: their row
+        label in ``df``, their raw date and time values and the columns that failed.
+
+        :param df: pd.DataFrame
+        :param date_col: str
+        :param time_col: str
+        :param datetime_col: str
+        :return: Parsed dataframe and the report of the rows that failed (row, date_col, time_col and invalid columns)
+        :rtype: tuple
+        """
+        dates, failed_dates = MagnetoPyFilesHelper.parse_column(df[date_col], DATE_FORMATS)
+        times, failed_times = MagnetoPyFilesHelper.parse_column(df[time_col], TIME_FORMATS)
+
+        for col, failed in [(date_col, failed_dates), (time_col, failed_times)]:
+            if len(failed):
+                _LOGGER.warning(f'{len(failed)} rows with an invalid "{col}" value will be dropped: {failed.head(10).to_dict()}')
+
+        valid = dates.notna() & times.notna()
+        invalid_dates, invalid_times = dates[~valid].isna(), times[~valid].isna()
+        failed_rows = pd.DataFrame({
+            'row': df.index[~valid],
+            date_col: df[date_col][~valid].to_numpy(),
+            time_col: df[time_col][~valid].to_numpy(),
+            'invalid': np.select([invalid_dates & invalid_times, invalid_dates], [f'{date_col},{time_col}', date_col], time_col)
+        })
+
+        if not valid.all():
+            df = df[valid].reset_index(drop=True)
+            dates, times = dates[valid].reset_index(drop=True), times[valid].reset_index(drop=True)
+
+        dates = dates.dt.normalize()
+        datetimes = dates + (times - times.dt.normalize())
+
+        df[date_col] = MagnetoPyFilesHelper.format_column(dates, '%Y-%m-%d')
+        df[time_col] = MagnetoPyFilesHelper.format_column(datetimes, '%H:%M:%S')
+        df[datetime_col] = datetimes
+
+        return df, failed_rows
+
+    @staticmethod
+    def check_failed_rows(failed_rows, file_path, invalid_dates='drop') -> None:
+        """
+        This function logs the rows of a file dropped by parse_date_time_columns, or raises an
+        error when ``invalid_dates`` is 'raise'. Rows are numbered from 0 after the header.
+
+        :param failed_rows: pd.DataFrame, report returned by parse_date_time_columns
+        :param file_path: str
+        :param invalid_dates: str, 'drop' or 'raise'
+        :return: Nothing to return
+        :rtype: None
+        """
+        if failed_rows.empty:
+            return
+
+        rows = failed_rows['row'].tolist()
+        rows_text = ', '.join(str(row) for row in rows[:100]) + (', ...' if len(rows) > 100 else '')
+
+        if invalid_dates == 'raise':
+            _LOGGER.error(f'Error: {len(rows)} rows of "{file_path}" have an invalid date or time, rows: {rows_text}')
+            raise ValueError(f'{len(rows)} rows of {file_path} have an invalid date or time')
+
+        _LOGGER.warning(f'{len(rows)} rows of "{file_path}" with an invalid date or time were dropped, rows: {rows_text}')
+
     @staticmethod
     def check_lat_bounds(lat):
         """
@@ -69,70 +180,197 @@ class MagnetoPyFilesHelper:
         raise ValueError("Longitude out of bounds: {}".format(lon))
     
     @staticmethod
-    def read_and_verify_columns(file_path, columns):
+    def read_columns(file_path, columns, dtypes=None, chunksize=None):
         """
-        This function reads the file from the given path and verifies the columns in the dataset.
+        This function verifies the requested columns against the file header and reads only those
+        columns, with explicit dtypes when given. With ``chunksize`` it returns an iterator of
+        dataframes of at most ``chunksize`` rows instead of a single dataframe.
 
         :param file_path: str
         :param columns: list
-        :return: pd.DataFrame
+        :param dtypes: dict, optional column name to dtype mapping
+        :param chunksize: int, optional number of rows per chunk
+        :return: pd.DataFrame, iterator of pd.DataFrame or None if the file or columns are invalid
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyFilesHelper: read_and_verify_columns')
         try:
-            df = pd.read_csv(file_path)
+            header = pd.read_csv(file_path, nrows=0).columns
         except FileNotFoundError:
-            print("Error: File not found at path:", file_path)
-            magnetopy_logging.error(f'Error: File not found at path: "{file_path}"')
+            _LOGGER.error(f'Error: File not found at path: "{file_path}"')
             return None
         except Exception as e:
-            magnetopy_logging.error(f'Error: "{e}"')
+            _LOGGER.error(f'Error: "{e}"')
             return None
 
-        missing_columns = [col for col in columns if col not in df.columns]
+        missing_columns = [col for col in columns if col not in header]
         if missing_columns:
-            magnetopy_logging.error(f'Error: Columns not found in the dataset: "{missing_columns}"')
+            _LOGGER.error(f'Error: Columns not found in the dataset: "{missing_columns}"')
             return None
 
-        return df[columns]
-    
+        dtypes = {col: dtype for col, dtype in (dtypes or {}).items() if col in columns}
+
+        try:
+            data = pd.read_csv(file_path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+        except Exception as e:
+            _LOGGER.error(f'Error: "{e}"')
+            return None
+
+        if chunksize is None:
+            return data[columns]
+
+        return (chunk[columns] for chunk in data)
+
+    @staticmethod
+    def read_and_verify_columns(file_path, columns, dtypes=None):
+        """
+        This function reads the file from the given path and verifies the columns in the dataset.
+
+        :param file_path: str
+        :param columns: list
+        :param dtypes: dict, optional column name to dtype mapping
+        :return: pd.DataFrame
+        """
+        return MagnetoPyFilesHelper.read_columns(file_path, columns, dtypes=dtypes)
+
+    @staticmethod
+    def column_dtypes(columns, text_columns=2):
+        """
+        This function returns the explicit dtypes of a stations or base station file: the date and
+        time columns are read as text and every other column as float64.
+
+        :param columns: list, date and time first
+        :param text_columns: int, number of leading text columns
+        :return: dict
+        """
+        return {col: (str if i < text_columns else 'float64') for i, col in enumerate(columns)}
+
     @staticmethod
     def rename_columns(stations_df, base_station_df):
         """
         This function renames the columns in the given dataframes adding sta_ and base_ prefixes.
         
         :param stations_df: pd.DataFrame
-        :param base_station_df: pd.DataFrame
-        :return: pd.DataFrame, pd.DataFrame
+        :param base_station_df: pd.DataFrame or MagnetoPyBaseIndex
+        :return: pd.DataFrame, pd.DataFrame or MagnetoPyBaseIndex
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyFilesHelper: rename_columns')
         stations_df.columns = ['sta_' + col for col in stations_df.columns]
         base_station_df.columns = ['base_' + col for col in base_station_df.columns]
-        magnetopy_logging.info(f'New station columns: {stations_df.columns}')
-        magnetopy_logging.info(f'New base station columns: {base_station_df.columns}')
+        _LOGGER.info(f'New station columns: {stations_df.columns}')
+        _LOGGER.info(f'New base station columns: {base_station_df.columns}')
 
         return stations_df, base_station_df
     
     @staticmethod
-    def save_data(result_df, project_name) -> None:
+    def output_file_path(project_name, extension, suffix='') -> str:
         """
-        Save the resulting dataframe with the calculations performed.
+        Returns a new timestamped output file path in the resources/<project_name> folder.
 
-        :param result_df: DataFrame
         :param project_name: str
-        :return: Nothing to return
-        :rtype: None
+        :param extension: str, file extension without the dot
+        :param suffix: str, optional text added after the project name
+        :return: str
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyFilesHelper: save_data')
         resources_full_path = os.path.abspath('resources')
         new_folder_path = os.path.join(resources_full_path, project_name)
         os.makedirs(new_folder_path, exist_ok=True)
-        magnetopy_logging.info(f'Writing output data on path: {new_folder_path}')
-        
+        _LOGGER.info(f'Writing output data on path: {new_folder_path}')
+
         time: str = str(datetime.now()).split('.')[0].replace(' ', '_').replace(':', '')
-        file = f'{project_name}_{time}.csv'
-        full_path = os.path.abspath(str(os.path.join(new_folder_path, file)))
+        file = f'{project_name}{suffix}_{time}.{extension}'
+
+        return os.path.abspath(str(os.path.join(new_folder_path, file)))
+
+    @staticmethod
+    def save_data(result_df, project_name, output_format='csv', compression=None, columns=None, suffix='') -> str:
+        """
+        Save the resulting dataframe with the calculations performed.
+
+        :param result_df: DataFrame
+        :param project_name: str
+        :param output_format: str, one of OUTPUT_FORMATS (default 'csv')
+        :param compression: str, optional compression codec of the output format
+        :param columns: list, optional subset of columns to write
+        :param suffix: str, optional text added after the project name in the file name
+        :return: str, output file path
+        """
+        writer = MagnetoPyChunkWriter(project_name, output_format, compression, columns, suffix)
+        writer.write(result_df)
+
+        return writer.close()
+
+    @staticmethod
+    def read_data(file_path, columns):
+        """
+        This function reads the given columns of a MagnetoPy output file in any of the output
+        formats, chosen from the file extension.
+
+        :param file_path: str
+        :param columns: list
+        :return: pd.DataFrame or None if the file or columns are invalid
+        """
+        if '.csv' in os.path.basename(file_path):
+            return MagnetoPyFilesHelper.read_columns(file_path, columns)
+
+        try:
+            if file_path.endswith('.parquet'):
+                return pd.read_parquet(file_path, columns=columns)
+            if file_path.endswith('.feather'):
+                return pd.read_feather(file_path, columns=columns)
+            if file_path.endswith('.npz'):
+                with np.load(file_path) as data:
+                    output = {}
+                    for col in columns:
+                        output[col] = data[col]
+                        if f'{col}__missing' in data.files:
+                            output[col] = np.where(data[f'{col}__missing'], None, output[col].astype(object))
+                    return pd.DataFrame(output)
+        except FileNotFoundError:
+            _LOGGER.error(f'Error: File not found at path: "{file_path}"')
+            return None
+        except Exception as e:
+            _LOGGER.error(f'Error: "{e}"')
+            return None
+
+        _LOGGER.error(f'Error: File format not supported: "{file_path}"')
+        return None
+
+    @staticmethod
+    def save_grid_data(grid_data, attributes, project_name, output_format='npz') -> str:
+        """
+        Save gridded arrays, with their 1-D latitude and longitude axes, as a compressed npz file
+        or as a NetCDF (classic format) file.
+
+        :param grid_data: dict of numpy.ndarray, must contain the 'lat' and 'lon' axes
+        :param attributes: dict, global attributes and '<variable>_units' entries
+        :param project_name: str
+        :param output_format: str, 'npz' or 'netcdf'
+        :return: str, output file path
+        """
+        if output_format == 'npz':
+            full_path = MagnetoPyFilesHelper.output_file_path(project_name, 'npz', suffix='_grid')
+            np.savez_compressed(full_path, **grid_data, **{key: np.asarray(value) for key, value in attributes.items()})
+        elif output_format == 'netcdf':
+            from scipy.io import netcdf_file
+
+            full_path = MagnetoPyFilesHelper.output_file_path(project_name, 'nc', suffix='_grid')
+            with netcdf_file(full_path, 'w') as nc:
+                for key, value in attributes.items():
+                    if not key.endswith('_units'):
+                        setattr(nc, key, value)
+                for axis in ('lat', 'lon'):
+                    nc.createDimension(axis, grid_data[axis].size)
+                for key, value in grid_data.items():
+                    dimensions = (key,) if key in ('lat', 'lon') else ('lat', 'lon')
+                    variable = nc.createVariable(key, 'f8', dimensions)
+                    variable[:] = value
+                    if f'{key}_units' in attributes:
+                        variable.units = attributes[f'{key}_units']
+        else:
+            _LOGGER.error(f'Error: Output format not supported: "{output_format}"')
+            raise ValueError(f'Output format not supported: {output_format}')
+
+        _LOGGER.info(f'Grid saved on: {full_path}')
 
-        result_df.to_csv(full_path)
+        return full_path
 
     @staticmethod
     def most_recent_file(folder_path):
@@ -142,7 +380,6 @@ class MagnetoPyFilesHelper:
         :param folder_path: str
         :return: str
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyFilesHelper: most_recent_file')
         pattern = re.compile(r'.*_(\d{4}-\d{2}-\d{2})_(\d{6})\.csv')
         
         most_recent = None
@@ -178,4 +415,235 @@ class MagnetoPyFilesHelper:
         for col_name, value in igrf_components.items():
             stations_df[col_name] = value
 
-        return stations_df
\ No newline at end of file
+        return stations_df
+
+
+class MagnetoPyChunkWriter:
+    def __init__(self, project_name, output_format='csv', compression=None, columns=None, suffix=''):
+        """
+        Writes a result dataframe to a new output file chunk by chunk, so streamed runs never hold
+        the whole result in memory. Rows are numbered continuously across chunks.
+
+        CSV and NPZ files are written with their index column, parquet and feather without it.
+        Parquet, feather and NPZ chunks are staged in temporary files and written when the writer
+        is closed, with the types that hold every chunk (e.g. float64 once an integer column gets a
+        NaN, text once a column that was empty gets strings, the longest string of a text column).
+
+        NPZ text columns with missing values store them as empty strings and list them in a
+        boolean ``<column>__missing`` array, which read_data turns back into None.
+
+        :param project_name: str
+        :param output_format: str, one of OUTPUT_FORMATS
+        :param compression: str, optional compression codec of OUTPUT_COMPRESSIONS
+        :param columns: list, optional subset of columns to write
+        :param suffix: str, optional text added after the project name in the file name
+        """
+        self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyChunkWriter')
+
+        if output_format not in OUTPUT_FORMATS:
+            self.__magnetopy_logging.error(f'Error: Output format not supported: "{output_format}"')
+            raise ValueError(f'Output format not supported: {output_format}')
+
+        if compression is not None and compression not in OUTPUT_COMPRESSIONS[output_format]:
+            self.__magnetopy_logging.error(f'Error: Compression "{compression}" not supported for {output_format}, use one of {OUTPUT_COMPRESSIONS[output_format]}')
+            raise ValueError(f'Compression {compression} not supported for {output_format}')
+
+        self.output_format = output_format
+        self.compression = compression
+        self.columns = columns
+        self.rows = 0
+
+        extension = output_format
+        if output_format == 'csv' and compression is not None:
+            extension = f'csv.{ {"gzip": "gz", "bz2": "bz2", "xz": "xz"}[compression] }'
+        self.file_path = MagnetoPyFilesHelper.output_file_path(project_name, extension, suffix)
+
+        self.__staged = {}
+        self.__staged_tables = []
+        self.__staging_folder = None
+
+    def write(self, chunk_df) -> None:
+        """
+        Appends a chunk of rows to the output file.
+
+        :param chunk_df: pd.DataFrame
+        :return: Nothing to return
+        :rtype: None
+        """
+        if self.columns is not None:
+            missing_columns = [col for col in self.columns if col not in chunk_df.columns]
+            if missing_columns:
+                self.__magnetopy_logging.error(f'Error: Output columns not found in the result: "{missing_columns}"')
+                raise ValueError(f'Output columns not found in the result: {missing_columns}')
+            chunk_df = chunk_df[self.columns]
+
+        chunk_df = chunk_df.set_axis(pd.RangeIndex(self.rows, self.rows + len(chunk_df)))
+
+        if self.output_format == 'csv':
+            chunk_df.to_csv(self.file_path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, compression=self.compression)
+        elif self.output_format in ('parquet', 'feather'):
+            self.__stage_table(chunk_df.reset_index(drop=True))
+        else:
+            self.__stage_arrays(chunk_df)
+
+        self.rows += len(chunk_df)
+
+    def close(self) -> str:
+        """
+        Finishes the output file.
+
+        :return: str, output file path
+        """
+        if self.output_format in ('parquet', 'feather') and self.__staged_tables:
+            self.__write_arrow()
+        elif self.output_format == 'npz':
+            self.__pack_arrays()
+        elif self.output_format == 'csv' and self.rows == 0:
+            pd.DataFrame(columns=self.columns).to_csv(self.file_path, compression=self.compression)
+
+        self.__magnetopy_logging.info(f'{self.rows} rows saved on: {self.file_path}')
+
+        return self.file_path
+
+    def __pyarrow(self):
+        """
+        :return: The pyarrow module
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            self.__magnetopy_logging.error(f'Error: The {self.output_format} output format requires the pyarrow package.')
+            raise
+
+        return pa
+
+    def __stage_table(self, chunk_df) -> None:
+        """
+        Writes the chunk, with its own schema, to a temporary arrow file.
+
+        :param chunk_df: pd.DataFrame
+        :return: Nothing to return
+        :rtype: None
+        """
+        pa = self.__pyarrow()
+
+        table = pa.Table.from_pandas(chunk_df, preserve_index=False)
+
+        if self.__staging_folder is None:
+            self.__staging_folder = tempfile.mkdtemp(prefix='.magnetopy_chunks_', dir=os.path.dirname(self.file_path))
+        staged_path = os.path.join(self.__staging_folder, f'chunk_{len(self.__staged_tables)}.arrow')
+        with pa.ipc.new_file(staged_path, table.schema) as writer:
+            writer.write_table(table)
+        self.__staged_tables.append((staged_path, table.schema))
+
+    def __write_arrow(self) -> None:
+        """
+        Writes the staged chunks as parquet row groups or feather record batches, cast to the
+        schema that holds every chunk.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        pa = self.__pyarrow()
+
+        try:
+            try:
+                schema = pa.unify_schemas([schema for _, schema in self.__staged_tables], promote_options='permissive')
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                self.__magnetopy_logging.error(f'Error: The output chunks have incompatible column types: "{e}"')
+                raise ValueError(f'The output chunks have incompatible column types: {e}')
+
+            if self.output_format == 'parquet':
+                import pyarrow.parquet as pq
+                writer = pq.ParquetWriter(self.file_path, schema, compression=self.compression or 'snappy')
+            else:
+                writer = pa.ipc.new_file(self.file_path, schema, options=pa.ipc.IpcWriteOptions(compression=self.compression))
+
+            with writer:
+                for staged_path, _ in self.__staged_tables:
+                    with pa.memory_map(staged_path) as source:
+                        writer.write_table(pa.ipc.open_file(source).read_all().cast(schema))
+        finally:
+            shutil.rmtree(self.__staging_folder, ignore_errors=True)
+
+    def __stage_arrays(self, chunk_df) -> None:
+        """
+        Appends the values of every column, and of the index, to a temporary file as one .npy part
+        per chunk, so every chunk keeps its own dtype until the columns are packed. Object columns
+        are staged as numbers or text with the mask of their missing values.
+
+        :param chunk_df: pd.DataFrame
+        :return: Nothing to return
+        :rtype: None
+        """
+        arrays = {'index': (chunk_df.index.to_numpy(), np.zeros(0, dtype=bool))}
+        for col in chunk_df.columns:
+            values = chunk_df[col].to_numpy()
+            missing = np.zeros(0, dtype=bool)
+            if values.dtype == object:
+                missing = pd.isna(values)
+                if missing.all():
+                    # Takes the dtype of the other chunks when the column is packed
+                    values = np.full(len(values), np.nan)
+                elif pd.api.types.infer_dtype(values[~missing]) in ('integer', 'floating', 'mixed-integer-float'):
+                    values = np.where(missing, np.nan, values).astype(float)
+                else:
+                    values = np.where(missing, '', values).astype(str)
+            arrays[col] = (values, missing)
+
+        for col, (values, missing) in arrays.items():
+            staged = self.__staged.setdefault(col, {'file': tempfile.TemporaryFile(), 'parts': 0})
+            np.save(staged['file'], values)
+            np.save(staged['file'], missing)
+            staged['parts'] += 1
+
+    def __pack_arrays(self) -> None:
+        """
+        Packs the staged columns into the npz file, one column in memory at a time. The chunks of a
+        column are concatenated with their common dtype, or as text if they have none.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        compression = zipfile.ZIP_DEFLATED if self.compression else zipfile.ZIP_STORED
+
+        with zipfile.ZipFile(self.file_path, mode='w', compression=compression, allowZip64=True) as npz:
+            for col, staged in self.__staged.items():
+                staged['file'].seek(0)
+                parts = [(np.load(staged['file']), np.load(staged['file'])) for _ in range(staged['parts'])]
+                staged['file'].close()
+
+                values, missing = self.__pack_column(parts)
+
+                with npz.open(f'{col}.npy', mode='w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, values)
+                if values.dtype.kind == 'U' and missing.any():
+                    with npz.open(f'{col}__missing.npy', mode='w', force_zip64=True) as f:
+                        np.lib.format.write_array(f, missing)
+
+    @staticmethod
+    def __pack_column(parts) -> tuple:
+        """
+        Concatenates the staged chunks of a column. Chunks with only missing values take the
+        missing value of the dtype of the others: NaN, NaT or an empty string.
+
+        :param parts: list of tuple, values and missing mask (empty when nothing is missing) of every chunk
+        :return: Values and missing mask of the column
+        :rtype: tuple
+        """
+        missing = np.concatenate([mask if mask.size else np.zeros(len(values), dtype=bool) for values, mask in parts])
+        only_missing = [mask.size > 0 and mask.all() for _, mask in parts]
+        typed = [values for (values, _), empty in zip(parts, only_missing) if not empty] or [parts[0][0]]
+
+        try:
+            dtype = np.result_type(*typed)
+        except TypeError:
+            dtype = np.result_type(*(values.astype(str) for values in typed))
+        if dtype.kind in 'biu' and missing.any():
+            dtype = np.dtype(float)
+
+        fill = {'f': np.nan, 'c': np.nan, 'M': np.datetime64('NaT'), 'm': np.timedelta64('NaT'), 'U': ''}.get(dtype.kind)
+        values = np.concatenate([np.full(len(values), fill, dtype=dtype) if empty else values.astype(str).astype(dtype) if dtype.kind == 'U' else values.astype(dtype)
+                                 for (values, _), empty in zip(parts, only_missing)])
+
+        return values, missing
@@ -3,10 +3,16 @@ Based on code from : chaosmagpy, Clemens Kloss (DTU Space) and pyIGRF, Ciaran Be
 """
 
 import os
+import json
+import hashlib
 import pandas as pd
 import numpy as np
+from scipy import interpolate
 from math import pi
 from datetime import datetime
+from functools import lru_cache
+from collections import OrderedDict
+from time import perf_counter
 from logging import getLogger
 
 from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
@@ -15,6 +21,42 @@ from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
 r2d = np.rad2deg
 d2r = np.deg2rad
 
+_LOGGER: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyIGRFHelper')
+
+@lru_cache(maxsize=None)
+def legendre_recursion_coefficients(nmax):
+    """
+    Precomputes, once per ``nmax``, the factors of the Legendre recursion used by
+    ``MagnetoPyIGRFHelper.legendre_poly_packed``. Factors are stored per degree ``n``
+    and indexed by order ``m``.
+
+    Recursion relations after Langel "The Main Field" (1987), eq. (27) and Table 2 (p. 256)
+
+    :param nmax: int, maximum degree of the spherical expansion
+    :return: dict with the lists 'a', 'b' (P(n,m), m <= n-2), 'sub', 'diag'
+        (P(n,n-1) and P(n,n)) and 'dA', 'dB' (dP(n,m)) of numpy.ndarray
+    """
+    a, b, sub, diag, dA, dB = [], [], [], [], [], []
+    for n in range(nmax+1):
+        m = np.arange(max(n-1, 0))
+        a.append((2*n - 1) / np.sqrt(n*n - m*m))
+        b.append(np.sqrt((n-1)**2 - m*m) / np.sqrt(n*n - m*m))
+        sub.append(np.sqrt(2*n - 1) if n > 0 else 0.)
+        diag.append(np.sqrt(2*n - 1) / np.sqrt(2*n) if n > 1 else 1.)
+
+        m = np.arange(n+1)
+        A = np.sqrt((n + m) * (n - m + 1.))
+        B = np.sqrt((n + m + 1.) * (n - m))
+        A[0] = 0.
+        if n > 0:
+            A[1] = np.sqrt(2. * (n*n + n))
+            B[0] = np.sqrt(2. * (n*n + n))
+        dA.append(A)
+        dB.append(B)
+
+    return {'a': a, 'b': b, 'sub': sub, 'diag': diag, 'dA': dA, 'dB': dB}
+
+
 class IGRF:
     def __init__(self, time, coeffs, parameters):
         self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='IGRF')
@@ -22,15 +64,306 @@ class IGRF:
         self.coeffs = coeffs
         self.parameters = parameters
 
+class IGRFCoefficientProvider:
+    def __init__(self, igrf, cache_size=256):
+        """
+        Interpolates the IGRF coefficients at any decimal date. The time interpolant is built
+        once and the coefficient vectors of the last ``cache_size`` dates are kept in a LRU
+        cache, so the same provider can be shared across calls and stations.
+
+        :param igrf: IGRF object
+        :param cache_size: int, maximum number of dates kept in the cache
+        """
+        self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='IGRFCoefficientProvider')
+        self.igrf = igrf
+        self.cache_size = cache_size
+        self.__interpolant = interpolate.interp1d(igrf.time, igrf.coeffs, fill_value='extrapolate')
+        self.__cache = OrderedDict()
+
+    def coefficients(self, dates):
+        """
+        Returns the coefficients at the given decimal dates. Dates missing from the cache are
+        evaluated together in a single vectorized call.
+
+        :param dates: float or numpy.ndarray, shape (D,)
+        :return: numpy.ndarray, shape (N,) for a scalar date or (D, N)
+        """
+        dates = np.asarray(dates, dtype=float)
+        unique_dates, inverse = np.unique(dates.ravel(), return_inverse=True)
+
+        if unique_dates.size > self.cache_size:
+            # Too many distinct dates to cache, evaluate them all at once
+            result = self.__interpolant(unique_dates).T[inverse]
+            return result.reshape(dates.shape + result.shape[-1:])
+
+        missing = [date for date in unique_dates.tolist() if date not in self.__cache]
+        if missing:
+            for date, coeffs in zip(missing, self.__interpolant(missing).T):
+                self.__cache[date] = coeffs
+
+        rows = []
+        for date in unique_dates.tolist():
+            self.__cache.move_to_end(date)
+            rows.append(self.__cache[date])
+
+        while len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last=False)
+
+        result = np.array(rows)[inverse]
+
+        return result.reshape(dates.shape + result.shape[-1:])
+
+    def epoch_coefficients(self, dates):
+        """
+        Returns the secular variation coefficients and the main field coefficients at the start
+        of the five year epoch of each date. The IGRF SV coefficients are relative to the main
+        field components at the start of each epoch e. g. 2010, 2015, 2020.
+
+        :param dates: float or numpy.ndarray, shape (D,)
+        :return: numpy.ndarray, numpy.ndarray
+        """
+        epoch_start = 1900 + ((np.asarray(dates, dtype=float) - 1900) // 5) * 5
+
+        coeffsm = self.coefficients(epoch_start)
+        coeffs_sv = self.coefficients(epoch_start + 1) - coeffsm
+
+        return coeffs_sv, coeffsm
+
+    def cache_info(self) -> dict:
+        """
+        Returns the number of cached dates and the cache size.
+
+        :return: Cache information
+        :rtype: dict
+        """
+        return {'dates': len(self.__cache), 'cache_size': self.cache_size}
+
+
+class IGRFLookupTable:
+    # Components interpolated from the nodes, the others are derived from them
+    COMPONENTS = ['X', 'Y', 'Z', 'dX', 'dY', 'dZ']
+
+    def __init__(self, magnetopyIGRFHelper, igrf, provider, date, lat_range, lon_range, altitude_range,
+                 tolerance=0.1, validation_points=1000, spacing=100.0, max_nodes=1_000_000, memory_budget=256, seed=0):
+        """
+        Regular latitude, longitude and altitude table of the IGRF components at the decimal
+        date ``date`` over a survey bounding box, interpolated trilinearly at every query point.
+
+        The node spacing starts at ``spacing`` km and is halved until the largest error of the
+        X, Y, Z, H and F components at ``validation_points`` random points of the box, against
+        the exact synthesis, is within ``tolerance`` nT.
+
+        The main field coefficients are linear in time within a five year IGRF epoch, so points
+        observed at other dates of the same epoch are moved in time with the secular variation.
+
+        :param magnetopyIGRFHelper: MagnetoPyIGRFHelper
+        :param igrf: IGRF
+        :param provider: IGRFCoefficientProvider
+        :param date: float, decimal date of the table
+        :param lat_range: tuple, minimum and maximum geodetic latitude in degrees
+        :param lon_range: tuple, minimum and maximum longitude in degrees, the maximum can go past 180 degrees for boxes across the antimeridian
+        :param altitude_range: tuple, minimum and maximum altitude in km
+        :param tolerance: float, maximum interpolation error in nT
+        :param validation_points: int, random points checked against the exact synthesis
+        :param spacing: float, initial node spacing in km
+        :param max_nodes: int, the table is not refined beyond this number of nodes
+        :param memory_budget: float, memory budget in MB of the synthesis of the nodes
+        :param seed: int, seed of the validation points
+        """
+        self.__magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='IGRFLookupTable')
+        self.helper = magnetopyIGRFHelper
+        self.date = float(date)
+        self.epoch = 1900 + ((self.date - 1900) // 5) * 5
+        self.tolerance = tolerance
+
+        if not tolerance > 0:
+            self.__magnetopy_logging.error(f'Error: The lookup table tolerance must be positive: "{tolerance}"')
+            raise ValueError(f'The lookup table tolerance must be positive: {tolerance}')
+
+        nmax = igrf.parameters['nmax']
+        self.__coeffs = (provider.coefficients(self.date),) + provider.epoch_coefficients(self.date) + (nmax,)
+        self.__chunk_size = magnetopyIGRFHelper.chunk_size(nmax, memory_budget)
+
+        ranges = [tuple(map(float, lat_range)), tuple(map(float, lon_range)), tuple(map(float, altitude_range))]
+        if not all(np.isfinite(ranges).ravel()):
+            self.__magnetopy_logging.error(f'Error: The lookup table bounds are not finite: {ranges}')
+            raise ValueError(f'The lookup table bounds are not finite: {ranges}')
+        self.bounds = ranges
+        self.max_error = np.inf
+
+        rng = np.random.default_rng(seed)
+        validation = [rng.uniform(low, high, validation_points) for low, high in ranges]
+        exact = self.__exact(*validation)
+
+        # Degrees of latitude and longitude are converted to km at the widest parallel of the box
+        km_per_degree = 111.195
+        lon_km_per_degree = km_per_degree * max(np.cos(np.radians(ranges[0])).max(), 0.01)
+        start = perf_counter()
+
+        while True:
+            steps = [spacing / km_per_degree, spacing / lon_km_per_degree, spacing]
+            # A flat axis gets a second node so every axis can be interpolated
+            self.axes = [np.linspace(low, high, max(2, int(np.ceil((high - low) / step)) + 1)) if high > low else np.array([low, low + step])
+                         for (low, high), step in zip(ranges, steps)]
+            self.shape = tuple(axis.size for axis in self.axes)
+
+            if np.prod(self.shape) > max_nodes:
+                self.__magnetopy_logging.error(f'Error: The lookup table needs more than {max_nodes} nodes for a tolerance of {tolerance} nT, '
+                                               f'the largest error is {self.max_error:.4f} nT')
+                raise ValueError(f'The lookup table needs more than {max_nodes} nodes for a tolerance of {tolerance} nT')
+
+            lat, lon, alt = np.meshgrid(*self.axes, indexing='ij')
+            nodes = self.__exact(lat.ravel(), lon.ravel(), alt.ravel())
+            self.values = np.stack([nodes[key] for key in self.COMPONENTS]).reshape((len(self.COMPONENTS),) + self.shape)
+
+            interpolated = self.interpolate(*validation, self.date)
+            self.max_error = max(np.nanmax(np.abs(interpolated[key] - exact[key])) for key in ['X', 'Y', 'Z', 'hoz', 'eff'])
+
+            if self.max_error <= tolerance:
+                break
+            spacing /= 2
+
+        self.spacing = spacing
+        self.__magnetopy_logging.info(f'IGRF lookup table of {self.shape} nodes at {self.date:.4f}, spacing {spacing:.3f} km, '
+                                      f'largest error {self.max_error:.4f} nT, built in {perf_counter() - start:.2f} s')
+
+    def __exact(self, lat, lon, altitude) -> dict:
+        """
+        :return: Exact components at the date of the table, synthesized in chunks within the memory budget
+        :rtype: dict
+        """
+        coeffs, coeffs_sv, coeffsm, nmax = self.__coeffs
+
+        # The Legendre functions of every full chunk are computed in the same buffer
+        legendre_out = np.empty((2, (nmax+1)*(nmax+2)//2, min(self.__chunk_size, lat.size)))
+
+        chunks = []
+        for start in range(0, lat.size, self.__chunk_size):
+            chunk = slice(start, start + self.__chunk_size)
+            buffer = legendre_out if lat[chunk].size == legendre_out.shape[-1] else None
+            chunks.append(self.helper.igrf_components(coeffs, coeffs_sv, coeffsm, altitude[chunk], lat[chunk], lon[chunk], nmax, legendre_out=buffer))
+
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+    def wrap_longitude(self, lon):
+        """
+        Moves the longitudes more than 180 degrees away from the center of the box by whole turns,
+        e.g. -179 to 181 for a box from 170 to 190 degrees.
+
+        :param lon: numpy.ndarray, longitude in degrees
+        :return: numpy.ndarray, longitude in the range of the box
+        """
+        center = sum(self.bounds[1]) / 2
+
+        return np.where(np.abs(lon - center) > 180, (lon - center + 180) % 360 - 180 + center, lon)
+
+    def interpolate(self, lat, lon, altitude, dates, block_size=8192) -> dict:
+        """
+        Interpolates the components at the given positions and decimal dates of the epoch of the
+        table. Points outside the box take the values of the nearest cell, extrapolated linearly.
+
+        X, Y, Z and their secular variation are interpolated, the main field is moved to the date
+        of every point with the secular variation and the other components are derived as in
+        ``igrf_components``.
+
+        :param lat: numpy.ndarray, geodetic latitude in degrees
+        :param lon: numpy.ndarray, longitude in degrees
+        :param altitude: numpy.ndarray, altitude in km
+        :param dates: float or numpy.ndarray, decimal dates
+        :param block_size: int, points interpolated at a time, small enough to stay in cache
+        :return: Main field and secular variation components, as ``igrf_components``
+        :rtype: dict
+        """
+        lat, lon, altitude, dates = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (lat, lon, altitude, dates)))
+        points = [lat.ravel(), self.wrap_longitude(lon.ravel()), altitude.ravel()]
+        dates = dates.ravel()
+
+        nodes = self.values.reshape(len(self.COMPONENTS), -1)
+        strides = [self.shape[1] * self.shape[2], self.shape[2], 1]
+        s_lat, s_lon, _ = strides
+        offsets = (0, 1, s_lon, s_lon + 1, s_lat, s_lat + 1, s_lat + s_lon, s_lat + s_lon + 1)
+
+        keys = ['dec', 'inc', 'hoz', 'eff', 'X', 'Y', 'Z', 'decs', 'incs', 'hozs', 'effs', 'dX', 'dY', 'dZ']
+        out = {key: np.empty(lat.size) for key in keys}
+
+        # Every block is interpolated and converted while it is in cache
+        for start in range(0, lat.size, block_size):
+            block = slice(start, start + block_size)
+            flat = 0
+            fractions = []
+            for axis, point, stride in zip(self.axes, points, strides):
+                position = (point[block] - axis[0]) / (axis[1] - axis[0])
+                cell = np.clip(np.floor(position), 0, axis.size - 2).astype(np.intp)
+                fractions.append(position - cell)
+                flat = flat + cell * stride
+
+            # Interpolate along the altitude, then the longitude and the latitude
+            f_lat, f_lon, f_alt = fractions
+            corners = [flat + offset for offset in offsets]
+            interpolated = []
+            for k in range(len(self.COMPONENTS)):
+                values = [nodes[k].take(corner) for corner in corners]
+                edges = [low + (high - low) * f_alt for low, high in zip(values[0::2], values[1::2])]
+                faces = [low + (high - low) * f_lon for low, high in zip(edges[0::2], edges[1::2])]
+                interpolated.append(faces[0] + (faces[1] - faces[0]) * f_lat)
+
+            X, Y, Z, dX, dY, dZ = interpolated
+
+            # The main field is linear in time within the epoch
+            elapsed = dates[block] - self.date
+            X, Y, Z = X + dX * elapsed, Y + dY * elapsed, Z + dZ * elapsed
+            since_epoch = dates[block] - self.epoch
+            Xm, Ym, Zm = X - dX * since_epoch, Y - dY * since_epoch, Z - dZ * since_epoch
+
+            dec, hoz, inc, eff = self.helper.xyz2dhif(X, Y, Z)
+            decs, hozs, incs, effs = self.helper.xyz2dhif_sv(Xm, Ym, Zm, dX, dY, dZ)
+
+            for key, value in zip(keys, (dec, inc, hoz, eff, X, Y, Z, decs, incs, hozs, effs, dX, dY, dZ)):
+                out[key][block] = value
+
+        return {key: value.reshape(lat.shape) for key, value in out.items()}
+
+    def components(self, lat, lon, altitude, dates) -> tuple:
+        """
+        Interpolates the components at the given positions and decimal dates. The points inside
+        the box and in the five year epoch of the table are covered, the others are left as NaN
+        so they can be synthesized exactly.
+
+        :param lat: numpy.ndarray, geodetic latitude in degrees
+        :param lon: numpy.ndarray, longitude in degrees
+        :param altitude: numpy.ndarray, altitude in km
+        :param dates: float or numpy.ndarray, decimal dates
+        :return: Main field and secular variation components, and the mask of covered points
+        :rtype: tuple
+        """
+        lat, lon, altitude, dates = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (lat, lon, altitude, dates)))
+
+        covered = (1900 + ((dates - 1900) // 5) * 5) == self.epoch
+        for (low, high), point in zip(self.bounds, (lat, self.wrap_longitude(lon), altitude)):
+            covered &= (point >= low) & (point <= high)
+
+        components = self.interpolate(lat, lon, altitude, dates)
+
+        if not covered.all():
+            for key in components:
+                components[key] = np.where(covered, components[key], np.nan)
+
+        return components, covered
+
+
 class MagnetoPyIGRFHelper:
-    def load_igrf_coefficients(self):
+    def load_igrf_coefficients(self, use_cache=True):
         """
         This function loads the shc-file with the IGRF-13 coefficients and return a IGRF object.
 
+        The parsed coefficients are cached next to the shc-file as a memory-mappable ``.npy``
+        file with a ``.json`` sidecar. The cache is reused while the shc-file keeps its size and
+        modification time, or its content hash when the modification time changed.
+
+        :param use_cache: bool, read and write the binary cache (default True)
         :return: IGRF object
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyIGRFHelper: load_igrf_coefficients')
-        magnetopy_logging.info('Loading the IGRF coefficients')
+        _LOGGER.info('Loading the IGRF coefficients')
         resources_path = os.path.abspath('resources')
         igrf13_full_path = os.path.join(resources_path, 'igrf13')
         igrf13_file = os.path.join(igrf13_full_path, 'IGRF13.shc')
@@ -38,19 +371,44 @@ class MagnetoPyIGRFHelper:
         if not os.path.exists(igrf13_file):
             raise FileNotFoundError(f"IGRF coefficients file not found: {igrf13_file}")
 
-        with open(igrf13_file, 'r') as f:
+        start = perf_counter()
+
+        igrf = self.read_igrf_cache(igrf13_file) if use_cache else None
+        if igrf is not None:
+            _LOGGER.info(f'IGRF coefficients loaded from cache in {(perf_counter() - start) * 1000:.2f} ms (warm load).')
+            return igrf
 
-            data = np.array([])
+        time, coeffs, parameters = self.parse_shc_file(igrf13_file)
+
+        _LOGGER.info(f'IGRF coefficients from file: {igrf13_file} loaded successfully in {(perf_counter() - start) * 1000:.2f} ms (cold load).')
+
+        if use_cache:
+            self.write_igrf_cache(igrf13_file, time, coeffs, parameters)
+
+        return IGRF(time, coeffs, parameters)
+
+    def parse_shc_file(self, shc_file):
+        """
+        This function parses a shc-file and returns its time vector, coefficients and parameters.
+
+        :param shc_file: str
+        :return: numpy.ndarray, numpy.ndarray, dict
+        """
+        with open(shc_file, 'r') as f:
+
+            lines = []
             for line in f.readlines():
                 if line.startswith('#'):
                     continue
 
-                read_line = np.fromstring(line, sep=' ')
-                if read_line.size == 7:
-                    name = os.path.split(igrf13_file)[1]
-                    values = [name] + read_line.astype(int).tolist()
+                read_line = line.split()
+                if len(read_line) == 7:
+                    name = os.path.split(shc_file)[1]
+                    values = [name] + np.array(read_line, dtype=float).astype(int).tolist()
                 else:
-                    data = np.append(data, read_line)
+                    lines.append(line)
+
+        data = np.array(' '.join(lines).split(), dtype=float)
 
         keys = ['SHC', 'nmin', 'nmax', 'N', 'order', 'step', 'start_year', 'end_year']
         parameters = dict(zip(keys, values))
@@ -59,10 +417,119 @@ class MagnetoPyIGRFHelper:
         coeffs = data[parameters['N']:].reshape((-1, parameters['N']+2))
         coeffs = np.squeeze(coeffs[:, 2:])
 
-        magnetopy_logging.info(f'IGRF coefficients from file: {igrf13_file} loaded successfully.')
+        return time, coeffs, parameters
 
-        return IGRF(time, coeffs, parameters)
+    def read_igrf_cache(self, shc_file):
+        """
+        This function returns the IGRF object stored in the binary cache of the shc-file, or None
+        when there is no cache or it is stale.
+
+        :param shc_file: str
+        :return: IGRF object or None
+        """
+        data_file, meta_file = shc_file + '.npy', shc_file + '.json'
 
+        if not (os.path.exists(data_file) and os.path.exists(meta_file)):
+            return None
+
+        try:
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+
+            stat = os.stat(shc_file)
+            if (meta['source_mtime_ns'], meta['source_size']) != (stat.st_mtime_ns, stat.st_size):
+                if meta['source_sha256'] != self.file_sha256(shc_file):
+                    _LOGGER.info('The IGRF coefficients cache is stale, parsing the shc-file again.')
+                    return None
+
+                meta['source_mtime_ns'], meta['source_size'] = stat.st_mtime_ns, stat.st_size
+                self.write_json_atomic(meta_file, meta)
+
+            data = np.load(data_file, mmap_mode='r')
+        except (OSError, ValueError, KeyError) as e:
+            _LOGGER.warning(f'The IGRF coefficients cache could not be read: "{e}"')
+            return None
+
+        parameters = meta['parameters']
+
+        return IGRF(data[0], np.squeeze(data[1:]), parameters)
+
+    def write_igrf_cache(self, shc_file, time, coeffs, parameters) -> None:
+        """
+        This function writes the parsed coefficients of the shc-file to its binary cache.
+
+        :param shc_file: str
+        :param time: numpy.ndarray
+        :param coeffs: numpy.ndarray
+        :param parameters: dict
+        :return: Nothing to return
+        :rtype: None
+        """
+        data_file, meta_file = shc_file + '.npy', shc_file + '.json'
+
+        stat = os.stat(shc_file)
+        meta = {
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_size': stat.st_size,
+            'source_sha256': self.file_sha256(shc_file),
+            'parameters': parameters
+        }
+
+        try:
+            tmp_file = data_file + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                np.save(f, np.vstack([time, np.atleast_2d(coeffs)]))
+            os.replace(tmp_file, data_file)
+            self.write_json_atomic(meta_file, meta)
+        except OSError as e:
+            _LOGGER.warning(f'The IGRF coefficients cache could not be written: "{e}"')
+
+    @staticmethod
+    def file_sha256(file_path):
+        """
+        This function returns the SHA-256 hex digest of the file content.
+
+        :param file_path: str
+        :return: str
+        """
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024**2), b''):
+                sha256.update(block)
+
+        return sha256.hexdigest()
+
+    @staticmethod
+    def write_json_atomic(file_path, content) -> None:
+        """
+        This function writes the content as JSON through a temporary file, so readers never see
+        a partially written file.
+
+        :param file_path: str
+        :param content: dict
+        :return: Nothing to return
+        :rtype: None
+        """
+        tmp_file = file_path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(content, f)
+        os.replace(tmp_file, file_path)
+
+    def chunk_size(self, nmax, memory_budget):
+        """
+        Returns the number of stations that can be synthesized at once within the memory budget.
+
+        The estimate counts the Legendre table, the cos/sin(m*phi) tables, the per-station
+        coefficient vectors of the main field, secular variation and epoch start, and the working
+        arrays of ``synth_values``, ``gg_to_geo`` and ``xyz2dhif`` for every station.
+
+        :param nmax: int, maximum degree of the expansion
+        :param memory_budget: float, memory budget in megabytes
+        :return: int
+        """
+        bytes_per_station = 8 * ((nmax + 1) * (nmax + 2) + 2 * (nmax + 1) + 3 * nmax * (nmax + 2) + 64)
+
+        return max(1, int(memory_budget * 1024**2 // bytes_per_station))
 
     def gg_to_geo(self, h, gdcolat):
         """
@@ -200,7 +667,7 @@ class MagnetoPyIGRFHelper:
 
         return height, beta
     
-    def synth_values(self, coeffs, radius, theta, phi, nmax=None, nmin=None, grid=None):
+    def synth_values(self, coeffs, radius, theta, phi, nmax=None, nmin=None, grid=None, kernel=None, legendre_out=None):
         """
         Based on code from : chaosmagpy, Clemens Kloss (DTU Space) and pyIGRF, Ciaran Beggan (British Geological Survey)
         Computes radial, colatitude and azimuthal field components from the
@@ -229,13 +696,21 @@ class MagnetoPyIGRFHelper:
             ``theta`` and ``phi`` must have one dimension less than the output grid
             since the grid will be created as their outer product (defaults to
             False).
+        :param kernel: str, optional
+            ``'loop'`` (default) accumulates the expansion degree by degree and is the
+            reference implementation. ``'matrix'`` builds dense design matrices and
+            evaluates the components with matrix products. With the matrix kernel the
+            leading dimensions of ``coeffs`` are independent coefficient sets (e.g.
+            epochs) which are all evaluated at every grid point, and the output has
+            shape ``coeffs.shape[:-1] + grid shape``.
+        :param legendre_out: numpy.ndarray, optional
+            Buffer reused for the Legendre functions of the loop kernel, see
+            ``legendre_poly_packed``.
 
         :return: numpy.ndarray, shape (...)
             B_radius, B_theta, B_phi field components.
             Radial, colatitude and azimuthal field components.
         """
-        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyIGRFHelper: synth_values')
-
         coeffs = np.array(coeffs, dtype=float)
         radius = np.array(radius, dtype=float) / 6371.2
         theta = np.array(theta, dtype=float)
@@ -243,7 +718,7 @@ class MagnetoPyIGRFHelper:
 
         if np.amin(theta) <= 0.0 or np.amax(theta) >= 180.0:
             if np.amin(theta) == 0.0 or np.amax(theta) == 180.0:
-                magnetopy_logging.warning('The geographic poles are included.')
+                _LOGGER.warning('The geographic poles are included.')
             else:
                 raise ValueError('Colatitude outside bounds [0, 180].')
             
@@ -271,46 +746,135 @@ class MagnetoPyIGRFHelper:
             theta = theta[..., None]
             phi = phi[None, ...]
 
+        kernel = 'loop' if kernel is None else kernel
+
+        if kernel == 'matrix':
+            return self.synth_values_matrix(coeffs, radius, theta, phi, nmax, nmin)
+        elif kernel != 'loop':
+            raise ValueError(f'Unknown synthesis kernel: {kernel}')
+
+        B_radius, B_theta, B_phi = self.synth_values_loop([coeffs], radius, theta, phi, nmax, nmin, legendre_out)
+
+        return B_radius[0], B_theta[0], B_phi[0]
+
+    def synth_values_stack(self, coeffs, radius, theta, phi, nmax=None, nmin=None, grid=None, legendre_out=None):
+        """
+        Evaluates a stack of coefficient sets at the same points, e.g. the main field, secular
+        variation and epoch start coefficients of ``igrf_components``. The Legendre functions,
+        the cos/sin(m*phi) terms and the radial powers are computed once and shared by every set.
+
+        :param coeffs: sequence of numpy.ndarray, each of shape (..., N)
+            Coefficient sets, each one broadcastable with the points as in ``synth_values``.
+        :param radius: float or numpy.ndarray, shape (...,), radius in kilometers
+        :param theta: float or numpy.ndarray, shape (...,), colatitude in degrees
+        :param phi: float or numpy.ndarray, shape (...,), longitude in degrees
+        :param nmax: int, positive, optional, see ``synth_values``
+        :param nmin: int, positive, optional, see ``synth_values``
+        :param grid: bool, optional, see ``synth_values``
+        :param legendre_out: numpy.ndarray, optional, see ``synth_values``
+
+        :return: numpy.ndarray, shape (K, ...)
+            B_radius, B_theta, B_phi field components of the K coefficient sets.
+        """
+        coeffs = [np.asarray(coeffs_set, dtype=float) for coeffs_set in coeffs]
+        if len({coeffs_set.shape[-1] for coeffs_set in coeffs}) != 1:
+            _LOGGER.error(f'Error: The coefficient sets have different lengths: {[coeffs_set.shape for coeffs_set in coeffs]}')
+            raise ValueError(f'The coefficient sets have different lengths: {[coeffs_set.shape for coeffs_set in coeffs]}')
+
+        radius = np.array(radius, dtype=float) / 6371.2
+        theta = np.array(theta, dtype=float)
+        phi = np.array(phi, dtype=float)
+
+        if np.amin(theta) <= 0.0 or np.amax(theta) >= 180.0:
+            if np.amin(theta) == 0.0 or np.amax(theta) == 180.0:
+                _LOGGER.warning('The geographic poles are included.')
+            else:
+                raise ValueError('Colatitude outside bounds [0, 180].')
+
+        nmin = 1 if nmin is None else nmin
+        nmax_coeffs = int(np.sqrt(coeffs[0].shape[-1] + 1) - 1)
+        nmax = nmax_coeffs if nmax is None else nmax
+
+        if nmax > nmax_coeffs:
+            raise ValueError(f'Supplied nmax = {nmax} is incompatible with number of model coefficients ({nmax_coeffs}).')
+        if nmax < nmin:
+            raise ValueError(f'Nothing to compute: nmax < nmin ({nmax} < {nmin}.)')
+
+        if grid:
+            theta = theta[..., None]
+            phi = phi[None, ...]
+
+        return self.synth_values_loop(coeffs, radius, theta, phi, nmax, nmin, legendre_out)
+
+    def synth_values_loop(self, coeffs, radius, theta, phi, nmax, nmin=1, legendre_out=None):
+        """
+        Loop kernel of ``synth_values`` and ``synth_values_stack``. The expansion is accumulated
+        degree by degree for every coefficient set of the stack. The terms that only depend on
+        the points are evaluated once per degree and order and shared by the sets.
+
+        ``radius``, ``theta`` and ``phi`` are expected already scaled and broadcastable as in
+        ``synth_values``.
+
+        :param coeffs: sequence of K numpy.ndarray, each of shape (..., N)
+        :param legendre_out: numpy.ndarray, optional
+            Buffer reused for the Legendre functions, see ``legendre_poly_packed``.
+        :return: numpy.ndarray, shape (K, ...)
+            B_radius, B_theta, B_phi field components.
+        """
         try:
-            b = np.broadcast(radius, theta, phi, np.broadcast_to(0, coeffs.shape[:-1]))
+            grid_shape = np.broadcast_shapes(radius.shape, theta.shape, phi.shape, *(coeffs_set.shape[:-1] for coeffs_set in coeffs))
         except ValueError:
-            magnetopy_logging.error('Cannot broadcast grid shapes (excl. last dimension of coeffs):')
-            magnetopy_logging.error(f'radius: {radius.shape}\n theta: {theta.shape}\n phi: {phi.shape}\n coeffs: {coeffs.shape[:-1]}')
+            _LOGGER.error('Cannot broadcast grid shapes (excl. last dimension of coeffs):')
+            _LOGGER.error(f'radius: {radius.shape}\n theta: {theta.shape}\n phi: {phi.shape}\n coeffs: {[coeffs_set.shape[:-1] for coeffs_set in coeffs]}')
             raise
 
-        grid_shape = b.shape
-
         r_n = radius**(-(nmin+2))
 
-        Pnm = self.legendre_poly(nmax, theta)
+        P, dP = self.legendre_poly_packed(nmax, theta, out=legendre_out)
 
-        sinth = Pnm[1, 1]
+        sinth = P[2]
+        north_pole = theta == 0.
+        south_pole = theta == np.degrees(pi)
+        poles = np.any(north_pole) or np.any(south_pole)
 
         phi = np.radians(phi)
         cmp = np.cos(np.multiply.outer(np.arange(nmax+1), phi))
         smp = np.sin(np.multiply.outer(np.arange(nmax+1), phi))
 
-        B_radius = np.zeros(grid_shape)
-        B_theta = np.zeros(grid_shape)
-        B_phi = np.zeros(grid_shape)
+        B_radius = np.zeros((len(coeffs),) + grid_shape)
+        B_theta = np.zeros((len(coeffs),) + grid_shape)
+        B_phi = np.zeros((len(coeffs),) + grid_shape)
 
         num = nmin**2 - 1
         for n in range(nmin, nmax+1):
-            B_radius += (n+1) * Pnm[n, 0] * r_n * coeffs[..., num]
-            B_theta += -Pnm[0, n+1] * r_n * coeffs[..., num]
+            row = n*(n+1)//2
+            radial = (n+1) * P[row] * r_n
+            colatitude = dP[row] * r_n
+            for k, coeffs_set in enumerate(coeffs):
+                B_radius[k] += radial * coeffs_set[..., num]
+                B_theta[k] -= colatitude * coeffs_set[..., num]
             num += 1
 
             for m in range(1, n+1):
-                B_radius += ((n+1) * Pnm[n, m] * r_n * (coeffs[..., num] * cmp[m] + coeffs[..., num+1] * smp[m]))
-                
-                B_theta += (-Pnm[m, n+1] * r_n * (coeffs[..., num] * cmp[m] + coeffs[..., num+1] * smp[m]))
-
                 with np.errstate(divide='ignore', invalid='ignore'):
+                    div_Pnm = P[row+m] / sinth
+                if poles:
                     # handle poles using L'Hopital's rule
-                    div_Pnm = np.where(theta == 0., Pnm[m, n+1], Pnm[n, m] / sinth)
-                    div_Pnm = np.where(theta == np.degrees(pi), -Pnm[m, n+1], div_Pnm)
-
-                B_phi += (m * div_Pnm * r_n * (coeffs[..., num] * smp[m] - coeffs[..., num+1] * cmp[m]))
+                    div_Pnm = np.where(north_pole, dP[row+m], div_Pnm)
+                    div_Pnm = np.where(south_pole, -dP[row+m], div_Pnm)
+
+                # Terms of the points, shared by every coefficient set
+                radial = (n+1) * P[row+m] * r_n
+                colatitude = dP[row+m] * r_n
+                azimuthal = m * div_Pnm * r_n
+
+                for k, coeffs_set in enumerate(coeffs):
+                    g = coeffs_set[..., num]
+                    h = coeffs_set[..., num+1]
+                    cos_term = g * cmp[m] + h * smp[m]
+                    B_radius[k] += radial * cos_term
+                    B_theta[k] -= colatitude * cos_term
+                    B_phi[k] += azimuthal * (g * smp[m] - h * cmp[m])
 
                 num += 2
 
@@ -318,6 +882,139 @@ class MagnetoPyIGRFHelper:
 
         return B_radius, B_theta, B_phi
 
+    def coefficient_indices(self, nmax):
+        """
+        Returns the degree, order and sine flag of every coefficient in the
+        g10, g11, h11, g20, ... order used by the SHC files.
+
+        :param nmax: int, maximum degree of the expansion
+        :return: numpy.ndarray, numpy.ndarray, numpy.ndarray
+        """
+        degrees, orders, is_sin = [], [], []
+        for n in range(1, nmax+1):
+            degrees.append(n)
+            orders.append(0)
+            is_sin.append(0)
+            for m in range(1, n+1):
+                degrees += [n, n]
+                orders += [m, m]
+                is_sin += [0, 1]
+
+        return np.array(degrees), np.array(orders), np.array(is_sin)
+
+    def design_factors(self, nmax):
+        """
+        Returns the per-coefficient factors (n+1), -1 and m of the radial, colatitude and
+        azimuthal design matrices.
+
+        :param nmax: int, maximum degree of the expansion
+        :return: numpy.ndarray, numpy.ndarray, numpy.ndarray
+        """
+        degrees, orders, _ = self.coefficient_indices(nmax)
+
+        return (degrees + 1.), -np.ones(degrees.size), orders.astype(float)
+
+    def design_matrices(self, radius, theta, phi, nmax, nmin=1, legendre_out=None):
+        """
+        Builds the design matrices that map the spherical harmonic coefficients to the radial,
+        colatitude and azimuthal field components at every point.
+
+        :param radius: numpy.ndarray, shape (P,)
+            Radius normalized by the reference radius of 6371.2 km.
+        :param theta: numpy.ndarray, shape (P,)
+            Colatitude in degrees.
+        :param phi: numpy.ndarray, shape (P,)
+            Longitude in degrees.
+        :param nmax: int, maximum degree of the expansion
+        :param nmin: int, minimum degree of the expansion
+        :param legendre_out: numpy.ndarray, optional
+            Buffer reused for the Legendre functions, see ``legendre_poly_packed``.
+
+        :return: numpy.ndarray, shape (nmax*(nmax+2), P)
+            G_radius, G_theta, G_phi design matrices, one row per coefficient,
+            without the (n+1), -1 and m factors returned by ``design_factors``.
+        """
+        degrees, orders, is_sin = self.coefficient_indices(nmax)
+
+        Pnm = self.legendre_poly_packed(nmax, theta, out=legendre_out)
+        sinth = Pnm[0, 2]
+
+        # Radial terms are evaluated once per degree and folded into the Legendre rows
+        r_n = np.power(radius, -(np.arange(nmax+1)+2.)[:, None])
+        r_n[:nmin] = 0.
+        r_n = r_n[degrees]
+
+        packed = degrees*(degrees+1)//2 + orders
+        P = Pnm[0, packed]
+        P *= r_n
+        dP = Pnm[1, packed]
+        dP *= r_n
+
+        # Trigonometric terms are evaluated once per order and gathered into the
+        # coefficient rows, 1/sin(theta) of the azimuthal component is folded in here
+        phi = np.radians(phi)
+        cmp = np.cos(np.multiply.outer(np.arange(nmax+1), phi))
+        smp = np.sin(np.multiply.outer(np.arange(nmax+1), phi))
+        rows = orders + is_sin*(nmax+1)
+
+        trig = np.concatenate([cmp, smp])[rows]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_sinth = 1 / sinth
+            trig_phi = np.concatenate([smp * inv_sinth, -cmp * inv_sinth])[rows]
+
+            # The scalar factors (n+1), -1 and m are applied to the coefficients
+            G_radius = P * trig
+            G_theta = dP * trig
+            G_phi = P * trig_phi
+
+        # handle poles using L'Hopital's rule
+        for pole, sign in ((theta == 0., 1.), (theta == 180., -1.)):
+            if np.any(pole):
+                G_phi[:, pole] = sign * dP[:, pole] * np.concatenate([smp, -cmp])[rows][:, pole]
+
+        return G_radius, G_theta, G_phi
+
+    def synth_values_matrix(self, coeffs, radius, theta, phi, nmax=None, nmin=None, block_size=1024):
+        """
+        Matrix form of ``synth_values``. The Legendre functions and cos/sin(m*phi) terms are
+        packed into dense design matrices and the three field components are obtained with
+        matrix products, optionally for several coefficient sets at once.
+
+        ``radius``, ``theta`` and ``phi`` are expected already scaled and broadcastable as in
+        ``synth_values``, which validates the arguments and calls this method for
+        ``kernel='matrix'``.
+
+        :return: numpy.ndarray, shape coeffs.shape[:-1] + grid shape
+            B_radius, B_theta, B_phi field components.
+        """
+        nmax_coeffs = int(np.sqrt(coeffs.shape[-1] + 1) - 1)
+        nmax = nmax_coeffs if nmax is None else nmax
+        nmin = 1 if nmin is None else nmin
+
+        radius, theta, phi = np.broadcast_arrays(radius, theta, phi)
+        grid_shape = radius.shape
+
+        radius, theta, phi = radius.ravel(), theta.ravel(), phi.ravel()
+
+        sets_shape = coeffs.shape[:-1]
+        coeffs = coeffs.reshape(-1, coeffs.shape[-1])[:, :nmax*(nmax+2)]
+        scaled_coeffs = [coeffs * factor for factor in self.design_factors(nmax)]
+
+        B = np.empty((3, coeffs.shape[0], radius.size))
+
+        # The design matrices are built in blocks of points small enough to stay in cache,
+        # every full block reuses the same Legendre buffer
+        legendre_out = np.empty((2, (nmax+1)*(nmax+2)//2, min(block_size, radius.size)))
+        for start in range(0, radius.size, block_size):
+            block = slice(start, start + block_size)
+            buffer = legendre_out if radius[block].size == legendre_out.shape[-1] else None
+            G = self.design_matrices(radius[block], theta[block], phi[block], nmax, nmin, legendre_out=buffer)
+            for k in range(3):
+                B[k, :, block] = scaled_coeffs[k] @ G[k]
+
+        return tuple(B[k].reshape(sets_shape + grid_shape) for k in range(3))
+
     def legendre_poly(self, nmax, theta):
         """
         Returns associated Legendre polynomials `P(n,m)` (Schmidt quasi-normalized)
@@ -379,6 +1076,141 @@ class MagnetoPyIGRFHelper:
 
         return Pnm
 
+    def legendre_poly_packed(self, nmax, theta, out=None):
+        """
+        Returns associated Legendre polynomials `P(n,m)` (Schmidt quasi-normalized)
+        and the derivative :math:`dP(n,m)/d\\theta` in a packed triangular layout.
+
+        The recursion factors are cached per ``nmax`` and every degree is filled
+        with whole-row array operations. Passing ``out`` reuses its memory, so
+        repeated calls on station chunks of the same size do not allocate.
+
+        Parameters
+        ----------
+        nmax : int, positive
+            Maximum degree of the spherical expansion.
+        theta : ndarray, shape (...)
+            Colatitude in degrees :math:`[0^\\circ, 180^\\circ]`
+            of arbitrary shape.
+        out : ndarray, shape (2, (nmax+1)*(nmax+2)/2, ...), optional
+            Preallocated output buffer.
+
+        Returns
+        -------
+        Pnm : ndarray, shape (2, (nmax+1)*(nmax+2)/2, ...)
+            `P(n,m)` := ``Pnm[0, n*(n+1)/2 + m, ...]`` and `dP(n,m)` :=
+            ``Pnm[1, n*(n+1)/2 + m, ...]``
+        """
+        costh = np.cos(np.radians(theta))
+        sinth = np.sqrt(1-costh**2)
+
+        shape = (2, (nmax+1)*(nmax+2)//2) + costh.shape
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape:
+            raise ValueError(f'Output buffer shape {out.shape} does not match {shape}.')
+
+        factors = legendre_recursion_coefficients(nmax)
+        column = (-1,) + (1,)*costh.ndim
+
+        P, dP = out[0], out[1]
+        P[0] = 1
+        dP[0] = 0
+        if nmax > 0:
+            P[1] = costh
+            P[2] = sinth
+
+        for n in range(2, nmax+1):
+            row, prev, prev2 = n*(n+1)//2, (n-1)*n//2, (n-2)*(n-1)//2
+            # dP of degree n is filled below, its memory is used as scratch space
+            scratch = dP[row:row+n-1]
+
+            np.multiply(P[prev:prev+n-1], costh, out=P[row:row+n-1])
+            P[row:row+n-1] *= factors['a'][n].reshape(column)
+            np.multiply(P[prev2:prev2+n-1], factors['b'][n].reshape(column), out=scratch)
+            P[row:row+n-1] -= scratch
+
+            np.multiply(P[prev+n-1:prev+n], costh, out=P[row+n-1:row+n])
+            P[row+n-1:row+n] *= factors['sub'][n]
+            np.multiply(P[prev+n-1:prev+n], sinth, out=P[row+n:row+n+1])
+            P[row+n:row+n+1] *= factors['diag'][n]
+
+        for n in range(1, nmax+1):
+            row = n*(n+1)//2
+            Prow, dProw = P[row:row+n+1], dP[row:row+n+1]
+
+            np.multiply(Prow[:n], factors['dA'][n][1:].reshape(column), out=dProw[1:])
+            dProw[0] = 0
+            dProw[:n] -= factors['dB'][n][:n].reshape(column) * Prow[1:]
+            dProw *= 0.5
+
+        return out
+
+    def igrf_components(self, coeffs, coeffs_sv, coeffsm, altitude, lat, lon, nmax, grid=False, legendre_out=None):
+        """
+        Computes the main field and secular variation components at geodetic positions.
+
+        :param coeffs: numpy.ndarray, shape (..., N), main field coefficients
+        :param coeffs_sv: numpy.ndarray, shape (..., N), secular variation coefficients
+        :param coeffsm: numpy.ndarray, shape (..., N), main field coefficients at the epoch start
+        :param altitude: float or numpy.ndarray, altitude in km
+        :param lat: float or numpy.ndarray, geodetic latitude in degrees
+        :param lon: float or numpy.ndarray, longitude in degrees
+        :param nmax: int, maximum degree of the expansion
+        :param grid: bool, evaluate on the outer product of ``lat`` and ``lon`` (default False)
+        :param legendre_out: numpy.ndarray, optional
+            Buffer of shape (2, (nmax+1)*(nmax+2)/2) + lat.shape reused for the Legendre
+            functions, so chunks of the same size do not allocate them again.
+
+        :return: Main field and secular variation components
+        :rtype: dict
+        """
+        colat = 90 - lat
+
+        alt, colat, sd, cd = self.gg_to_geo(altitude, colat)
+
+        if grid:
+            # The geocentric radius and rotation only depend on the latitude (grid rows)
+            alt, sd, cd = np.asarray(alt)[..., None], sd[..., None], cd[..., None]
+
+        # The three coefficient sets share the Legendre and cos/sin(m*phi) terms
+        (B_radius, Brs, Brm), (B_theta, Bts, Btm), (B_phi, Bps, Bpm) = self.synth_values_stack([coeffs, coeffs_sv, coeffsm], alt, colat, lon, nmax, grid=grid, legendre_out=legendre_out)
+
+        X = -B_theta
+        Y = B_phi
+        Z = -B_radius
+
+        dX = -Bts
+        dY = Bps
+        dZ = -Brs
+
+        Xm = -Btm
+        Ym = Bpm
+        Zm = -Brm
+
+        # Rotate back to geodetic coordinates if necessary
+        t = X
+        X = X * cd + Z * sd
+        Z = Z * cd - t * sd
+
+        t = dX
+        dX = dX * cd + dZ * sd
+        dZ = dZ * cd - t * sd
+
+        t = Xm
+        Xm = Xm * cd + Zm * sd
+        Zm = Zm * cd - t * sd
+
+        # Compute the four non-linear components
+        dec, hoz, inc, eff = self.xyz2dhif(X, Y, Z)
+
+        decs, hozs, incs, effs = self.xyz2dhif_sv(Xm, Ym, Zm, dX, dY, dZ)
+
+        return {
+            'dec': dec, 'inc': inc, 'hoz': hoz, 'eff': eff, 'X': X, 'Y': Y, 'Z': Z,
+            'decs': decs, 'incs': incs, 'hozs': hozs, 'effs': effs, 'dX': dX, 'dY': dY, 'dZ': dZ
+        }
+
     def xyz2dhif(self, x, y, z):
         """Calculate D, H, I and F from (X, Y, Z)
         
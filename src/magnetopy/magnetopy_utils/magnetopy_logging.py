@@ -3,23 +3,33 @@ import logging
 
 
 class MagnetopyLogging(logging.Formatter):
+    __green: str = "\x1b[32m"
+    __white: str = "\x1b[97m"
+    __yellow: str = "\x1b[33m"
+    __red: str = "\x1b[31m"
+    __bold_red: str = "\x1b[31;1m"
+    __reset: str = "\x1b[0m"
+    __format: str = "%(asctime)s - %(name)s (%(filename)s:%(lineno)d) - %(levelname)s: %(message)s"
+
+    FORMATS: dict = {
+        logging.DEBUG: __green + __format + __reset,
+        logging.INFO: __white + __format + __reset,
+        logging.WARNING: __yellow + __format + __reset,
+        logging.ERROR: __red + __format + __reset,
+        logging.CRITICAL: __bold_red + __format + __reset
+    }
+
+    # The formatters are built once per level and shared by every handler
+    FORMATTERS: dict = {level: logging.Formatter(log_fmt) for level, log_fmt in FORMATS.items()}
+
+    # Level of every MagnetoPy logger, changed with set_level
+    LEVEL: int = logging.DEBUG
+
+    # Loggers already configured, looked up before going through the logging manager
+    LOGGERS: dict = {}
+
     def __init__(self):
         super().__init__()
-        self.__green: str = "\x1b[32m"
-        self.__white: str = "\x1b[97m"
-        self.__yellow: str = "\x1b[33m"
-        self.__red: str = "\x1b[31m"
-        self.__bold_red: str = "\x1b[31;1m"
-        self.__reset: str = "\x1b[0m"
-        self.__format: str = "%(asctime)s - %(name)s (%(filename)s:%(lineno)d) - %(levelname)s: %(message)s"
-
-        self.FORMATS: dict = {
-            logging.DEBUG: self.__green + self.__format + self.__reset,
-            logging.INFO: self.__white + self.__format + self.__reset,
-            logging.WARNING: self.__yellow + self.__format + self.__reset,
-            logging.ERROR: self.__red + self.__format + self.__reset,
-            logging.CRITICAL: self.__bold_red + self.__format + self.__reset
-        }
 
         self.magnetopy_logging = None
 
@@ -32,10 +42,11 @@ class MagnetopyLogging(logging.Formatter):
         :return: String format
         :rtype: str
         """
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
+        formatter = self.FORMATTERS.get(record.levelno)
+        if formatter is None:
+            formatter = logging.Formatter(self.FORMATS.get(record.levelno))
         return formatter.format(record)
-        
+
     @staticmethod
     def create_magnetopy_logging(logger: str) -> logging.getLogger:
         """
@@ -46,13 +57,15 @@ class MagnetopyLogging(logging.Formatter):
         :return: Logger
         :rtype: logging.getLogger
         """
+        magnetopy_logging = MagnetopyLogging.LOGGERS.get(logger)
+        if magnetopy_logging is not None:
+            return magnetopy_logging
+
+        magnetopy_logging = logging.getLogger(logger)
 
-        if logger in logging.root.manager.loggerDict:
-            return logging.getLogger(logger)
-        else:
-            magnetopy_logging = logging.getLogger(logger)
+        if not magnetopy_logging.handlers:
             magnetopy_logging.propagate = False
-            magnetopy_logging.setLevel(logging.DEBUG)
+            magnetopy_logging.setLevel(MagnetopyLogging.LEVEL)
 
             ch = logging.StreamHandler()
             ch.setLevel(logging.DEBUG)
@@ -60,4 +73,27 @@ class MagnetopyLogging(logging.Formatter):
             ch.setFormatter(MagnetopyLogging())
 
             magnetopy_logging.addHandler(ch)
-            return magnetopy_logging
\ No newline at end of file
+
+        MagnetopyLogging.LOGGERS[logger] = magnetopy_logging
+        return magnetopy_logging
+
+    @staticmethod
+    def set_level(level) -> None:
+        """
+        Set the level of every MagnetoPy logger, the ones already created and the ones to come.
+        Records below the level are discarded before they are formatted.
+
+        :param level: Level name (DEBUG, INFO, WARNING, ERROR, CRITICAL) or number
+        :type level: str or int
+        :return: Nothing to return
+        :rtype: None
+        """
+        if isinstance(level, str):
+            level_name = level
+            level = logging.getLevelName(level_name.upper())
+            if not isinstance(level, int):
+                raise ValueError(f'Unknown logging level: {level_name}')
+
+        MagnetopyLogging.LEVEL = level
+        for magnetopy_logging in MagnetopyLogging.LOGGERS.values():
+            magnetopy_logging.setLevel(level)
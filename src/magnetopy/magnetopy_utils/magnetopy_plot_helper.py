@@ -0,0 +1,124 @@
+import numpy as np
+from logging import getLogger
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+
+DOWNSAMPLING_METHODS = ['minmax', 'lttb', 'none']
+
+_LOGGER: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyPlotHelper')
+
+
+class MagnetoPyPlotHelper:
+    @staticmethod
+    def minmax_downsample(x, y, buckets):
+        """
+        This function keeps the minimum and the maximum of ``y`` in each of ``buckets`` equal
+        slices of the profile, in their original order. With one bucket per pixel column the
+        drawn line covers the same pixels as the full profile, spikes included.
+
+        :param x: numpy.ndarray
+        :param y: numpy.ndarray, without NaN values
+        :param buckets: int
+        :return: Downsampled x and y
+        :rtype: tuple
+        """
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=float)
+
+        if y.size <= 2 * buckets:
+            return x, y
+
+        bucket_size = -(-y.size // buckets)
+        rows = -(-y.size // bucket_size)
+        padding = rows * bucket_size - y.size
+
+        # The last bucket is padded with values that are never selected
+        low = np.concatenate([y, np.full(padding, np.inf)]).reshape(rows, bucket_size)
+        high = np.concatenate([y, np.full(padding, -np.inf)]).reshape(rows, bucket_size)
+
+        offsets = np.arange(rows)[:, None] * bucket_size
+        indices = np.sort(np.stack([low.argmin(axis=1), high.argmax(axis=1)], axis=1) + offsets, axis=1).ravel()
+        # Flat buckets give the same index twice
+        indices = indices[np.concatenate([[True], np.diff(indices) > 0])]
+
+        return x[indices], y[indices]
+
+    @staticmethod
+    def lttb_downsample(x, y, threshold):
+        """
+        This function selects ``threshold`` points of the profile with the Largest-Triangle-
+        Three-Buckets algorithm: the first and last points are kept and, in each bucket, the
+        point that makes the largest triangle with the previous selected point and the average
+        of the next bucket.
+
+        :param x: numpy.ndarray
+        :param y: numpy.ndarray, without NaN values
+        :param threshold: int, number of points to keep, at least 3
+        :return: Downsampled x and y
+        :rtype: tuple
+        """
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=float)
+
+        if threshold < 3:
+            _LOGGER.error(f'Error: The LTTB threshold must be at least 3: "{threshold}"')
+            raise ValueError(f'The LTTB threshold must be at least 3: {threshold}')
+
+        if y.size <= threshold:
+            return x, y
+
+        x_values = x.astype(float)
+        # Bucket edges of the points between the first and the last one
+        edges = np.linspace(1, y.size - 1, threshold - 1).astype(int)
+
+        # Averages of every bucket, the last point is the average after the last bucket
+        sums_x = np.add.reduceat(x_values[1:-1], edges[:-1] - 1)
+        sums_y = np.add.reduceat(y[1:-1], edges[:-1] - 1)
+        counts = np.diff(edges)
+        average_x = np.append(sums_x / counts, x_values[-1])
+        average_y = np.append(sums_y / counts, y[-1])
+
+        indices = np.empty(threshold, dtype=int)
+        indices[0] = 0
+        indices[-1] = y.size - 1
+        selected = 0
+        for bucket in range(threshold - 2):
+            start, stop = edges[bucket], edges[bucket + 1]
+            area = np.abs(
+                (x_values[selected] - average_x[bucket + 1]) * (y[start:stop] - y[selected])
+                - (x_values[selected] - x_values[start:stop]) * (average_y[bucket + 1] - y[selected])
+            )
+            selected = start + int(area.argmax())
+            indices[bucket + 1] = selected
+
+        return x[indices], y[indices]
+
+    @staticmethod
+    def downsample(x, y, width, method='minmax'):
+        """
+        This function reduces a profile to about two points per pixel column of a plot
+        ``width`` pixels wide, so the rendering time depends on the image and not on the number
+        of rows. NaN values are dropped first.
+
+        :param x: numpy.ndarray
+        :param y: numpy.ndarray
+        :param width: int, plot width in pixels
+        :param method: str, one of DOWNSAMPLING_METHODS (default 'minmax')
+        :return: Downsampled x and y
+        :rtype: tuple
+        """
+        if method not in DOWNSAMPLING_METHODS:
+            _LOGGER.error(f'Error: Downsampling method not supported: "{method}"')
+            raise ValueError(f'Downsampling method not supported: {method}')
+
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=float)
+        valid = ~np.isnan(y)
+        x, y = x[valid], y[valid]
+
+        if method == 'minmax':
+            return MagnetoPyPlotHelper.minmax_downsample(x, y, max(1, width))
+        if method == 'lttb':
+            return MagnetoPyPlotHelper.lttb_downsample(x, y, max(3, 2 * width))
+
+        return x, y
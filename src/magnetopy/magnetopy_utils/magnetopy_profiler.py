@@ -0,0 +1,169 @@
+import os
+import json
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter, process_time
+from datetime import datetime
+from logging import getLogger
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+
+
+class MagnetoPyProfiler:
+    # Memory start and peak of the stages running in this process, of every profiler
+    ACTIVE_STAGES: list = []
+
+    def __init__(self, enabled=False, cprofile=False):
+        """
+        Records the wall time, CPU time, processed rows and peak traced memory of named stages.
+        A stage that runs several times, once per chunk for example, accumulates its times and
+        rows and keeps its highest memory peak. A disabled profiler does nothing.
+
+        Stages can be nested, also across profilers: the traced peak is reset when a stage starts,
+        after it has been added to the peaks of the stages that enclose it.
+
+        :param enabled: bool
+        :param cprofile: bool, also run cProfile on every stage and keep the slowest one
+        """
+        self.enabled: bool = enabled
+        self.cprofile: bool = enabled and cprofile
+        self.stages: dict = {}
+
+        self.__profiles: dict = {}
+        self.__started_tracing: bool = False
+
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracing = True
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Measures the block as the stage ``name``. The yielded dict accepts the processed rows when
+        they are only known at the end of the block: ``stage['rows'] = n``.
+
+        :param name: str
+        :param rows: int, optional rows processed by the stage
+        :return: Stage counters
+        :rtype: dict
+        """
+        counters = {'rows': rows}
+
+        if not self.enabled:
+            yield counters
+            return
+
+        profile = None
+        if self.cprofile:
+            profile = self.__profiles.setdefault(name, cProfile.Profile())
+
+        self.__update_active_peaks()
+        tracemalloc.reset_peak()
+        memory = {'start': tracemalloc.get_traced_memory()[0], 'peak': 0}
+        MagnetoPyProfiler.ACTIVE_STAGES.append(memory)
+        wall_start = perf_counter()
+        cpu_start = process_time()
+        if profile is not None:
+            profile.enable()
+
+        try:
+            yield counters
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall = perf_counter() - wall_start
+            cpu = process_time() - cpu_start
+            self.__update_active_peaks()
+            MagnetoPyProfiler.ACTIVE_STAGES.remove(memory)
+            peak = memory['peak']
+
+            stage = self.stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': None, 'peak_memory_mb': 0.0})
+            stage['calls'] += 1
+            stage['wall_seconds'] += wall
+            stage['cpu_seconds'] += cpu
+            stage['peak_memory_mb'] = max(stage['peak_memory_mb'], peak / 2 ** 20)
+            if counters['rows'] is not None:
+                stage['rows'] = (stage['rows'] or 0) + int(counters['rows'])
+
+    def report(self, project_name, command, arguments=None, suffix=''):
+        """
+        Writes the stages as a JSON report in the project output folder, next to the output
+        data, and logs a summary. With cProfile enabled, the statistics of the slowest stage are
+        written next to the report as a .prof file.
+
+        :param project_name: str
+        :param command: str, MagnetoPy command
+        :param arguments: Namespace, optional command arguments saved in the report
+        :param suffix: str, optional text added after the project name in the file name
+        :return: Report path, or None when the profiler is disabled
+        :rtype: str
+        """
+        if not self.enabled:
+            return None
+
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='MagnetoPyProfiler')
+
+        for stage in self.stages.values():
+            stage['rows_per_second'] = stage['rows'] / stage['wall_seconds'] if stage['rows'] and stage['wall_seconds'] > 0 else None
+
+        report = {
+            'command': command,
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'arguments': {key: value for key, value in vars(arguments).items() if isinstance(value, (str, int, float, bool, type(None)))} if arguments is not None else None,
+            'total_wall_seconds': sum(stage['wall_seconds'] for stage in self.stages.values()),
+            'process_peak_rss_mb': self.__peak_rss_mb(),
+            'stages': self.stages
+        }
+
+        report_path = MagnetoPyFilesHelper.output_file_path(project_name, 'json', f'{suffix}_profile')
+
+        if self.cprofile and self.stages:
+            hottest_stage = max(self.stages, key=lambda name: self.stages[name]['wall_seconds'])
+            cprofile_path = os.path.splitext(report_path)[0] + '.prof'
+            self.__profiles[hottest_stage].dump_stats(cprofile_path)
+            report['cprofile'] = {'stage': hottest_stage, 'path': cprofile_path}
+            magnetopy_logging.info(f'cProfile statistics of the stage "{hottest_stage}" saved on: {cprofile_path}')
+
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for name, stage in self.stages.items():
+            rows_per_second = f'{stage["rows_per_second"]:.0f} rows/s' if stage['rows_per_second'] else '-'
+            magnetopy_logging.info(f'{name}: {stage["wall_seconds"]:.3f} s wall, {stage["cpu_seconds"]:.3f} s CPU, '
+                                   f'{rows_per_second}, {stage["peak_memory_mb"]:.1f} MB peak')
+        magnetopy_logging.info(f'Profile report saved on: {report_path}')
+
+        if self.__started_tracing:
+            tracemalloc.stop()
+            self.__started_tracing = False
+
+        return report_path
+
+    @staticmethod
+    def __update_active_peaks():
+        """
+        Adds the traced peak since the last reset to the memory peak of every running stage.
+
+        :return: Nothing to return
+        :rtype: None
+        """
+        peak = tracemalloc.get_traced_memory()[1]
+        for memory in MagnetoPyProfiler.ACTIVE_STAGES:
+            memory['peak'] = max(memory['peak'], peak - memory['start'])
+
+    @staticmethod
+    def __peak_rss_mb():
+        """
+        :return: Peak resident memory of the process in MB, None where it is not available
+        :rtype: float
+        """
+        try:
+            import resource
+        except ImportError:
+            return None
+
+        # ru_maxrss is in kB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if os.uname().sysname == 'Darwin' else peak / 2 ** 10
@@ -0,0 +1,64 @@
+from argparse import Namespace
+from logging import getLogger
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_core.batch import Batch
+
+
+class TestBatch(unittest.TestCase):
+    def test_batch_diurnal_variation(self):
+        """
+        Test that a batch from a manifest gives the single file output for every file and reports failed files without stopping.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestBatch')
+
+        stations_file = os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv')
+        output_folder = os.path.abspath('resources/cerritos_multi')
+
+        with tempfile.TemporaryDirectory() as temp_folder:
+            for name in ['day1', 'day2']:
+                shutil.copy(stations_file, os.path.join(temp_folder, f'{name}.csv'))
+            pd.read_csv(stations_file).drop(columns=['magfield']).to_csv(os.path.join(temp_folder, 'broken.csv'), index=False)
+
+            manifest = os.path.join(temp_folder, 'manifest.txt')
+            with open(manifest, 'w') as f:
+                f.write('# rover files\nday1.csv\n\nbroken.csv\nday2.csv\n')
+
+            arguments = Namespace(
+                operation='diurnal-variation',
+                project_name='cerritos_multi',
+                manifest=manifest,
+                stations_cols='date,time,gpslat,gpslon,magfield',
+                base_station_file=os.path.abspath('resources/data_examples/cerritos_estaciones_base.csv'),
+                base_station_cols='date,time,nT',
+                workers=2
+            )
+
+            try:
+                batch = Batch(arguments=arguments)
+
+                report_df = pd.DataFrame(batch.reports)
+                self.assertEqual([os.path.basename(path) for path in report_df['stations_file']], ['day1.csv', 'broken.csv', 'day2.csv'])
+                self.assertEqual(report_df['status'].tolist(), ['ok', 'failed', 'ok'])
+                self.assertEqual(report_df['rows'].tolist(), [170, 0, 170])
+
+                expected_output_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_output.csv'))
+                for output_file in report_df['output_file'].dropna():
+                    self.assertTrue(pd.read_csv(output_file).equals(expected_output_df))
+
+                self.assertEqual(len([name for name in os.listdir(output_folder) if name.startswith('cerritos_multi_batch_')]), 1)
+            finally:
+                shutil.rmtree(output_folder, ignore_errors=True)
+
+        magnetopy_logging.info('TestBatch: test_batch_diurnal_variation passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()
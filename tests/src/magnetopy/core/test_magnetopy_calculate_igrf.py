@@ -0,0 +1,199 @@
+from argparse import Namespace
+from logging import getLogger
+
+import os
+import unittest
+import numpy as np
+import pandas as pd
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper, IGRFCoefficientProvider
+from src.magnetopy.magnetopy_core.calculate_igrf import CalculateIGRF
+
+
+class TestCalculateIGRF(unittest.TestCase):
+    def run_calculate_igrf(self, **kwargs) -> pd.DataFrame:
+        """
+        Run the CalculateIGRF class on the cerritos example, read its output and delete it.
+
+        :return: Output dataframe
+        """
+        arguments = Namespace(**{
+            'project_name': 'cerritos_igrf',
+            'stations_file': os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv'),
+            'stations_cols': 'date,time,gpslat,gpslon,magfield',
+            'altitude': 2.0,
+            'date': '2019-03-26',
+            **kwargs
+        })
+
+        CalculateIGRF(arguments=arguments)
+
+        output_folder = os.path.abspath('resources/cerritos_igrf')
+        output_file_path = os.path.join(output_folder, MagnetoPyFilesHelper.most_recent_file(folder_path=output_folder))
+        output_df = pd.read_csv(output_file_path)
+        os.remove(output_file_path)
+
+        return output_df
+
+    def test_calculate_igrf_baseline_output(self):
+        """
+        Test that the default output matches the output of the original implementation, saved in
+        cerritos_igrf_output.csv, to within 2e-11 nT.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestCalculateIGRF')
+
+        output_df = self.run_calculate_igrf()
+        expected_output_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_igrf_output.csv'))
+
+        self.assertEqual(list(output_df.columns), list(expected_output_df.columns))
+        for col in expected_output_df.columns:
+            if pd.api.types.is_numeric_dtype(expected_output_df[col]):
+                np.testing.assert_allclose(output_df[col], expected_output_df[col], rtol=0, atol=2e-11)
+            else:
+                self.assertEqual(output_df[col].tolist(), expected_output_df[col].tolist())
+
+        magnetopy_logging.info('TestCalculateIGRF: test_calculate_igrf_baseline_output passed successfully.')
+
+    def test_calculate_igrf_station_mode(self):
+        """
+        Test that the per-station IGRF does not depend on the chunk size and agrees with the average mode.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestCalculateIGRF')
+
+        average_df = self.run_calculate_igrf(igrf_mode='average')
+        station_df = self.run_calculate_igrf(igrf_mode='station', memory_budget=256)
+        chunked_df = self.run_calculate_igrf(igrf_mode='station', memory_budget=0.05)
+
+        np.testing.assert_allclose(station_df['F(nT)'], chunked_df['F(nT)'], rtol=0, atol=1e-9)
+        self.assertGreater(station_df['F(nT)'].nunique(), 1)
+        self.assertAlmostEqual(station_df['F(nT)'].mean(), average_df['F(nT)'].iloc[0], delta=1.0)
+
+        magnetopy_logging.info('TestCalculateIGRF: test_calculate_igrf_station_mode passed successfully.')
+
+    def test_calculate_igrf_observation_dates(self):
+        """
+        Test that without --date every station is evaluated at its own observation date and time.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestCalculateIGRF')
+
+        fixed_df = self.run_calculate_igrf(igrf_mode='station')
+        observed_df = self.run_calculate_igrf(igrf_mode='station', date=None)
+
+        datetimes = pd.to_datetime(observed_df['datetime'])
+        expected_dates = 2019 + (datetimes - pd.Timestamp('2019-01-01')) / pd.Timedelta(days=365)
+
+        np.testing.assert_allclose(observed_df['igrf_date'], expected_dates, rtol=0, atol=1e-9)
+        self.assertGreater(observed_df['igrf_date'].nunique(), 1)
+        same_day = observed_df['date'] == '2019-03-26'
+        self.assertTrue(same_day.any())
+        np.testing.assert_allclose(observed_df['F(nT)'][same_day], fixed_df['F(nT)'][same_day], rtol=0, atol=0.5)
+        np.testing.assert_allclose(observed_df['SV_F(nT/yr)'], fixed_df['SV_F(nT/yr)'], rtol=0, atol=1e-6)
+
+        magnetopy_logging.info('TestCalculateIGRF: test_calculate_igrf_observation_dates passed successfully.')
+
+    def test_calculate_igrf_altitude_column(self):
+        """
+        Test that an altitude column in the stations columns gives the IGRF of every station at its own altitude.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestCalculateIGRF')
+
+        stations_df = pd.read_csv('resources/data_examples/cerritos_datos_estaciones.csv')
+        stations_df['alt_km'] = np.linspace(0.0, 4.0, len(stations_df))
+        os.makedirs('resources/cerritos_igrf', exist_ok=True)
+        stations_file_path = os.path.abspath('resources/cerritos_igrf/stations_altitude.csv')
+        stations_df.to_csv(stations_file_path, index=False)
+
+        try:
+            altitude_df = self.run_calculate_igrf(igrf_mode='station', stations_file=stations_file_path, stations_cols='date,time,gpslat,gpslon,magfield,alt_km', altitude=None, memory_budget=0.05)
+            low_df = self.run_calculate_igrf(igrf_mode='station', altitude=0.0)
+            high_df = self.run_calculate_igrf(igrf_mode='station', altitude=4.0)
+            chunked_df = self.run_calculate_igrf(igrf_mode='average', stations_file=stations_file_path, stations_cols='date,time,gpslat,gpslon,magfield,alt_km', altitude=None, chunk_size=7)
+        finally:
+            os.remove(stations_file_path)
+
+        # The first and last stations are at the lowest and highest altitudes
+        for row, scalar_df in [(0, low_df), (len(altitude_df) - 1, high_df)]:
+            for col in ['F(nT)', 'X(nT)', 'Z(nT)', 'SV_F(nT/yr)']:
+                self.assertAlmostEqual(altitude_df[col].iloc[row], scalar_df[col].iloc[row], delta=1e-9)
+        self.assertGreater(low_df['F(nT)'].iloc[0] - altitude_df['F(nT)'].iloc[-1], 50)
+
+        # The average mode is evaluated at the average altitude of the file
+        average_df = self.run_calculate_igrf(igrf_mode='average', altitude=2.0)
+        self.assertAlmostEqual(chunked_df['F(nT)'].iloc[0], average_df['F(nT)'].iloc[0], delta=1e-6)
+
+        with self.assertRaises(ValueError):
+            self.run_calculate_igrf(altitude=None)
+
+        magnetopy_logging.info('TestCalculateIGRF: test_calculate_igrf_altitude_column passed successfully.')
+
+    def test_calculate_igrf_lookup_table(self):
+        """
+        Test that the IGRF interpolated from the lookup table is within its tolerance of the synthesized one.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestCalculateIGRF')
+
+        exact_df = self.run_calculate_igrf(igrf_mode='station', date=None)
+        lookup_df = self.run_calculate_igrf(igrf_mode='station', date=None, igrf_lookup_tolerance=0.01)
+        chunked_df = self.run_calculate_igrf(igrf_mode='station', date=None, igrf_lookup_tolerance=0.01, chunk_size=7)
+
+        for df in [lookup_df, chunked_df]:
+            for col in ['F(nT)', 'H(nT)', 'X(nT)', 'Y(nT)', 'Z(nT)']:
+                np.testing.assert_allclose(df[col], exact_df[col], rtol=0, atol=0.01)
+            np.testing.assert_allclose(df['SV_F(nT/yr)'], exact_df['SV_F(nT/yr)'], rtol=0, atol=1e-3)
+            np.testing.assert_allclose(df['igrf_date'], exact_df['igrf_date'], rtol=0, atol=0)
+
+        magnetopy_logging.info('TestCalculateIGRF: test_calculate_igrf_lookup_table passed successfully.')
+
+    def test_calculate_igrf_lookup_table_antimeridian(self):
+        """
+        Test that a survey across the antimeridian gets a lookup table as wide as the survey, which covers and matches its stations.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestCalculateIGRF')
+
+        magnetopyIGRFHelper = MagnetoPyIGRFHelper()
+        igrf = magnetopyIGRFHelper.load_igrf_coefficients()
+        provider = IGRFCoefficientProvider(igrf)
+
+        rng = np.random.default_rng(0)
+        lat = rng.uniform(-18, -17, 500)
+        lon = (rng.uniform(179.5, 180.5, 500) + 180) % 360 - 180
+        altitude = np.full(500, 0.5)
+
+        output_folder = os.path.abspath('resources/cerritos_igrf')
+        os.makedirs(output_folder, exist_ok=True)
+        stations_file = os.path.join(output_folder, 'antimeridian.csv')
+        pd.DataFrame({'lat': lat, 'lon': lon}).to_csv(stations_file, index=False)
+        lows, highs = CalculateIGRF.position_bounds(stations_file, ['lat', 'lon'], 100)
+        os.remove(stations_file)
+        self.assertLess(highs[1] - lows[1], 1.0)
+        self.assertAlmostEqual(lows[1], lon[lon > 0].min())
+        self.assertAlmostEqual(highs[1], lon[lon < 0].max() + 360)
+
+        table = CalculateIGRF.igrf_lookup_table(magnetopyIGRFHelper, igrf, provider, 2020.5, altitude, lat, lon, 0.01)
+        self.assertLess(table.bounds[1][1] - table.bounds[1][0], 1.0)
+
+        components, covered = table.components(lat, lon, altitude, 2020.5)
+        self.assertTrue(covered.all())
+        coeffs_sv, coeffsm = provider.epoch_coefficients(2020.5)
+        exact = magnetopyIGRFHelper.igrf_components(provider.coefficients(2020.5), coeffs_sv, coeffsm, altitude, lat, lon, igrf.parameters['nmax'])
+        for key in ['X', 'Y', 'Z', 'hoz', 'eff']:
+            np.testing.assert_allclose(components[key], exact[key], rtol=0, atol=0.01)
+
+        magnetopy_logging.info('TestCalculateIGRF: test_calculate_igrf_lookup_table_antimeridian passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,11 @@ from argparse import Namespace
 from logging import getLogger
 
 import os
+import json
+import glob
+import shutil
 import unittest
+import numpy as np
 import pandas as pd
 
 from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
@@ -44,5 +48,209 @@ class TestDiurnalVariation(unittest.TestCase):
         magnetopy_logging.info(f'File "{output_file_path}" deleted successfully.')
         magnetopy_logging.info('TestDiurnalVariation: test_diurnal_variation passed successfully.')
 
+    def test_diurnal_variation_chunked(self):
+        """
+        Test that streaming the stations file in chunks writes the same output as a single pass.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestDiurnalVariation')
+
+        arguments = Namespace(
+            project_name='cerritos_chunked',
+            stations_file=os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv'),
+            stations_cols='date,time,gpslat,gpslon,magfield',
+            base_station_file=os.path.abspath('resources/data_examples/cerritos_estaciones_base.csv'),
+            base_station_cols='date,time,nT',
+            chunk_size=37
+        )
+
+        DiurnalVariation(arguments=arguments)
+
+        output_folder = os.path.abspath('resources/cerritos_chunked')
+        output_file_path = os.path.join(output_folder, MagnetoPyFilesHelper.most_recent_file(folder_path=output_folder))
+
+        output_df = pd.read_csv(output_file_path)
+        expected_output_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_output.csv'))
+
+        self.assertTrue(output_df.equals(expected_output_df))
+
+        os.remove(output_file_path)
+        os.rmdir(output_folder)
+
+        magnetopy_logging.info('TestDiurnalVariation: test_diurnal_variation_chunked passed successfully.')
+
+    def test_diurnal_variation_empty_first_chunk(self):
+        """
+        Test that a first chunk whose rows all fail the date parsing writes no rows, logs their row numbers and the later chunks are still corrected.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestDiurnalVariation')
+
+        output_folder = os.path.abspath('resources/cerritos_empty_first_chunk')
+        os.makedirs(output_folder, exist_ok=True)
+        stations_file = os.path.join(output_folder, 'stations.csv')
+
+        stations_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv'))
+        invalid_df = stations_df.head(5).assign(date='invalid')
+        pd.concat([invalid_df, stations_df]).to_csv(stations_file, index=False)
+
+        arguments = Namespace(
+            project_name='cerritos_empty_first_chunk',
+            stations_file=stations_file,
+            stations_cols='date,time,gpslat,gpslon,magfield',
+            base_station_file=os.path.abspath('resources/data_examples/cerritos_estaciones_base.csv'),
+            base_station_cols='date,time,nT',
+            chunk_size=5
+        )
+
+        try:
+            with self.assertLogs('MagnetoPyFilesHelper', level='WARNING') as logs:
+                DiurnalVariation(arguments=arguments)
+            self.assertIn('5 rows of', logs.output[-1])
+            self.assertIn('rows: 0, 1, 2, 3, 4', logs.output[-1])
+
+            output_file = [file for file in os.listdir(output_folder) if file != 'stations.csv'][0]
+            output_df = pd.read_csv(os.path.join(output_folder, output_file))
+            expected_output_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_output.csv'))
+
+            self.assertTrue(output_df.equals(expected_output_df))
+
+            # The caller can stop the run instead of dropping the rows
+            with self.assertRaises(ValueError):
+                DiurnalVariation(arguments=Namespace(**{**vars(arguments), 'invalid_dates': 'raise'}))
+        finally:
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+        magnetopy_logging.info('TestDiurnalVariation: test_diurnal_variation_empty_first_chunk passed successfully.')
+
+    def test_diurnal_variation_profile(self):
+        """
+        Test that --profile writes a JSON report with every stage next to an unchanged output.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestDiurnalVariation')
+
+        arguments = Namespace(
+            project_name='cerritos_profile',
+            stations_file=os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv'),
+            stations_cols='date,time,gpslat,gpslon,magfield',
+            base_station_file=os.path.abspath('resources/data_examples/cerritos_estaciones_base.csv'),
+            base_station_cols='date,time,nT',
+            chunk_size=37,
+            profile=True,
+            profile_cprofile=True
+        )
+
+        diurnal_variation = DiurnalVariation(arguments=arguments)
+
+        output_folder = os.path.abspath('resources/cerritos_profile')
+        output_df = pd.read_csv(diurnal_variation.output_file)
+        expected_output_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_output.csv'))
+        self.assertTrue(output_df.equals(expected_output_df))
+
+        report_files = glob.glob(os.path.join(output_folder, '*_profile_*.json'))
+        self.assertEqual(len(report_files), 1)
+        with open(report_files[0]) as f:
+            report = json.load(f)
+
+        self.assertEqual(report['command'], 'diurnal-variation')
+        for stage in ['read_base_station', 'parse_base_dates', 'read_stations', 'parse_dates', 'base_matching', 'diurnal_correction', 'save']:
+            self.assertIn(stage, report['stages'])
+            self.assertGreaterEqual(report['stages'][stage]['wall_seconds'], 0)
+            self.assertGreaterEqual(report['stages'][stage]['peak_memory_mb'], 0)
+        self.assertEqual(report['stages']['read_stations']['rows'], len(expected_output_df))
+        self.assertEqual(report['stages']['base_matching']['rows'], len(expected_output_df))
+        self.assertEqual(report['stages']['base_matching']['calls'], report['stages']['parse_dates']['calls'])
+        self.assertTrue(os.path.isfile(report['cprofile']['path']))
+
+        shutil.rmtree(output_folder)
+
+        magnetopy_logging.info('TestDiurnalVariation: test_diurnal_variation_profile passed successfully.')
+
+    def test_diurnal_variation_multiple_bases(self):
+        """
+        Test the correction with two base stations: every station uses the closest base and the
+        level offset between the bases is removed by their own daily means.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestDiurnalVariation')
+
+        output_folder = os.path.abspath('resources/cerritos_multi_base')
+        os.makedirs(output_folder, exist_ok=True)
+
+        base_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_estaciones_base.csv'), dtype={'date': str, 'time': str})
+        base_positions = {'base_south': (19.6605, -101.2130, 0.0), 'base_north': (19.6672, -101.2063, 100.0)}
+        base_station_files = []
+        for name, (lat, lon, offset) in base_positions.items():
+            base_station_file = os.path.join(output_folder, f'{name}.csv')
+            base_df.assign(nT=base_df['nT'] + offset, lat=lat, lon=lon).to_csv(base_station_file, index=False)
+            base_station_files.append(base_station_file)
+
+        arguments = Namespace(
+            project_name='cerritos_multi_base',
+            stations_file=os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv'),
+            stations_cols='date,time,gpslat,gpslon,magfield',
+            base_station_file=base_station_files,
+            base_station_cols='date,time,nT,lat,lon'
+        )
+
+        diurnal_variation = DiurnalVariation(arguments=arguments)
+
+        output_df = pd.read_csv(diurnal_variation.output_file)
+        expected_output_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_output.csv'))
+
+        # Over a few hundred meters the distances are planar, with the longitudes scaled by cos(latitude)
+        north = np.hypot(output_df['sta_gpslat'] - 19.6672, (output_df['sta_gpslon'] + 101.2063) * np.cos(np.radians(19.66)))
+        south = np.hypot(output_df['sta_gpslat'] - 19.6605, (output_df['sta_gpslon'] + 101.2130) * np.cos(np.radians(19.66)))
+        self.assertEqual(output_df['base_station_id'].tolist(), np.where(north < south, 'base_north', 'base_south').tolist())
+        self.assertTrue(set(output_df['base_station_id']) == {'base_north', 'base_south'})
+        self.assertTrue((output_df['base_distance_km'] < 1).all())
+        np.testing.assert_allclose(output_df['diurnal_var_corr'], expected_output_df['diurnal_var_corr'])
+
+        shutil.rmtree(output_folder)
+
+        magnetopy_logging.info('TestDiurnalVariation: test_diurnal_variation_multiple_bases passed successfully.')
+
+    def test_diurnal_variation_base_index(self):
+        """
+        Test that the base station index is written by the first run, opened by the next ones and
+        gives the same output.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestDiurnalVariation')
+
+        output_folder = os.path.abspath('resources/cerritos_base_index')
+        index_dir = os.path.join(output_folder, 'base_index')
+
+        arguments = Namespace(
+            project_name='cerritos_base_index',
+            stations_file=os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv'),
+            stations_cols='date,time,gpslat,gpslon,magfield',
+            base_station_file=os.path.abspath('resources/data_examples/cerritos_estaciones_base.csv'),
+            base_station_cols='date,time,nT',
+            base_index_dir=index_dir,
+            profile=True
+        )
+
+        expected_output_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_output.csv'))
+        for run, expected_stage in enumerate(['write_base_index', 'open_base_index']):
+            diurnal_variation = DiurnalVariation(arguments=arguments)
+
+            self.assertIn(expected_stage, diurnal_variation.profiler.stages)
+            self.assertEqual(len(os.listdir(index_dir)), 1)
+            self.assertTrue(pd.read_csv(diurnal_variation.output_file).equals(expected_output_df))
+            os.remove(diurnal_variation.output_file)
+
+        self.assertNotIn('parse_base_dates', diurnal_variation.profiler.stages)
+
+        shutil.rmtree(output_folder)
+
+        magnetopy_logging.info('TestDiurnalVariation: test_diurnal_variation_base_index passed successfully.')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
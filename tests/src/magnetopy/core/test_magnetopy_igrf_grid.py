@@ -0,0 +1,59 @@
+from argparse import Namespace
+from logging import getLogger
+
+import os
+import glob
+import shutil
+import unittest
+import numpy as np
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_conversions_helper import MagnetoPyConversionsHelper
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper, IGRFCoefficientProvider
+from src.magnetopy.magnetopy_core.igrf_grid import IGRFGrid
+
+
+class TestIGRFGrid(unittest.TestCase):
+    def test_igrf_grid(self):
+        """
+        Test that the tiled IGRF grid, computed in a process pool, agrees with the point evaluation.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestIGRFGrid')
+
+        arguments = Namespace(
+            project_name='cerritos_igrf_grid',
+            bbox='19,20.5,-102,-100',
+            resolution=0.25,
+            altitude=2.0,
+            date='2019-03-26',
+            workers=2,
+            memory_budget=0.01,
+            output_format='npz'
+        )
+
+        IGRFGrid(arguments=arguments)
+
+        output_folder = os.path.abspath('resources/cerritos_igrf_grid')
+        grid = np.load(glob.glob(os.path.join(output_folder, '*.npz'))[0])
+        self.assertEqual(grid['F'].shape, (7, 9))
+
+        magnetopyIGRFHelper = MagnetoPyIGRFHelper()
+        igrf = magnetopyIGRFHelper.load_igrf_coefficients()
+        provider = IGRFCoefficientProvider(igrf)
+        date = MagnetoPyConversionsHelper.convert_date_to_decimal_date('2019-03-26')
+        coeffs_sv, coeffsm = provider.epoch_coefficients(date)
+
+        lat, lon = np.meshgrid(grid['lat'], grid['lon'], indexing='ij')
+        points = magnetopyIGRFHelper.igrf_components(provider.coefficients(date), coeffs_sv, coeffsm, 2.0, lat.ravel(), lon.ravel(), igrf.parameters['nmax'])
+
+        np.testing.assert_allclose(grid['F'], points['eff'].reshape(lat.shape), rtol=0, atol=1e-6)
+        np.testing.assert_allclose(grid['SV_Z'], points['dZ'].reshape(lat.shape), rtol=0, atol=1e-6)
+
+        shutil.rmtree(output_folder)
+
+        magnetopy_logging.info('TestIGRFGrid: test_igrf_grid passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()
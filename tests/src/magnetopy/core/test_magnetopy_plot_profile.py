@@ -0,0 +1,50 @@
+from argparse import Namespace
+from logging import getLogger
+
+import os
+import shutil
+import unittest
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_core.plot_profile import PlotProfile
+
+
+class TestPlotProfile(unittest.TestCase):
+    def test_plot_profile_output(self):
+        """
+        Test that several columns are rendered to PNG and SVG files without a display.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestPlotProfile')
+
+        output_folder = os.path.abspath('resources/cerritos_plot_profile')
+
+        for extension, downsample in [('png', 'minmax'), ('svg', 'lttb')]:
+            output_file = os.path.join(output_folder, f'profile.{extension}')
+            arguments = Namespace(
+                project_file=os.path.abspath('resources/data_examples/cerritos_output.csv'),
+                col_to_plot='sta_magfield,diurnal_var_corr',
+                output=output_file,
+                downsample=downsample,
+                width=40,
+                height=300
+            )
+
+            PlotProfile(arguments=arguments)
+
+            self.assertTrue(os.path.getsize(output_file) > 0)
+
+        with open(os.path.join(output_folder, 'profile.png'), 'rb') as f:
+            self.assertEqual(f.read(8), b'\x89PNG\r\n\x1a\n')
+
+        arguments.output = os.path.join(output_folder, 'profile.txt')
+        self.assertRaises(ValueError, PlotProfile, arguments)
+
+        shutil.rmtree(output_folder)
+
+        magnetopy_logging.info('TestPlotProfile: test_plot_profile_output passed successfully.')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+from argparse import Namespace
+from logging import getLogger
+
+import os
+import shutil
+import unittest
+import numpy as np
+import pandas as pd
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_core.calculate_igrf import CalculateIGRF
+from src.magnetopy.magnetopy_core.reduce import Reduce
+
+
+class TestReduce(unittest.TestCase):
+    def test_reduce(self):
+        """
+        Test that the single pass reduction matches the diurnal-variation output and the per-station calculate-igrf output, in one chunk or several.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestReduce')
+
+        stations_file = os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv')
+        output_folder = os.path.abspath('resources/cerritos_reduce')
+
+        arguments = {
+            'project_name': 'cerritos_reduce',
+            'stations_file': stations_file,
+            'stations_cols': 'date,time,gpslat,gpslon,magfield',
+            'base_station_file': os.path.abspath('resources/data_examples/cerritos_estaciones_base.csv'),
+            'base_station_cols': 'date,time,nT',
+            'altitude': 2.0
+        }
+
+        try:
+            reduced_df = pd.read_csv(Reduce(arguments=Namespace(**arguments)).output_file)
+            chunked_df = pd.read_csv(Reduce(arguments=Namespace(**arguments, chunk_size=64)).output_file)
+            igrf_df = pd.read_csv(CalculateIGRF(arguments=Namespace(**arguments, date=None, igrf_mode='station')).output_file)
+        finally:
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+        expected_diurnal_df = pd.read_csv(os.path.abspath('resources/data_examples/cerritos_output.csv'))
+
+        self.assertTrue(reduced_df[expected_diurnal_df.columns].equals(expected_diurnal_df))
+        self.assertTrue(chunked_df.equals(reduced_df))
+        np.testing.assert_allclose(reduced_df['F(nT)'], igrf_df['F(nT)'], rtol=0, atol=1e-9)
+        np.testing.assert_allclose(reduced_df['residual_anomaly'], reduced_df['diurnal_var_corr'] - reduced_df['F(nT)'], rtol=0, atol=1e-9)
+
+        magnetopy_logging.info('TestReduce: test_reduce passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()
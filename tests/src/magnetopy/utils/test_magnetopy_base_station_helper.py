@@ -0,0 +1,176 @@
+from logging import getLogger
+
+import os
+import unittest
+import tempfile
+import numpy as np
+import pandas as pd
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_base_station_helper import MagnetoPyBaseStationHelper
+
+
+class TestMagnetoPyBaseStationHelper(unittest.TestCase):
+    def test_nearest_reading_indices(self):
+        """
+        Test that the sorted matching returns the same readings as the idxmin scan, including ties
+        and duplicated timestamps in an unsorted base series.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyBaseStationHelper')
+
+        rng = np.random.default_rng(0)
+        start = pd.Timestamp('2019-03-26 11:00:00')
+        base_datetimes = pd.Series(start + pd.to_timedelta(rng.integers(0, 3600, 500) * 2, unit='s'))
+        stations_datetimes = pd.Series(start + pd.to_timedelta(rng.integers(-100, 7300, 300), unit='s'))
+
+        expected = [abs(base_datetimes - station_datetime).idxmin() for station_datetime in stations_datetimes]
+        result = MagnetoPyBaseStationHelper.nearest_reading_indices(base_datetimes, stations_datetimes)
+
+        self.assertEqual(result.tolist(), expected)
+
+        magnetopy_logging.info('TestMagnetoPyBaseStationHelper: test_nearest_reading_indices passed successfully.')
+
+    def test_interpolate_readings_and_gaps(self):
+        """
+        Test the linear and cubic base station interpolation and the outage flags, which reject an empty base series.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyBaseStationHelper')
+
+        start = pd.Timestamp('2019-03-26 11:00:00')
+        base_datetimes = pd.Series(start + pd.to_timedelta([0, 10, 20, 30, 400, 410], unit='s'))
+        base_values = pd.Series([100.0, 110.0, 120.0, 130.0, 500.0, 510.0])
+        stations_datetimes = pd.Series(start + pd.to_timedelta([5, 25, 200, 405, 1000], unit='s'))
+
+        linear = MagnetoPyBaseStationHelper.interpolate_readings(base_datetimes, base_values, stations_datetimes, method='linear')
+        np.testing.assert_allclose(linear, [105.0, 125.0, 300.0, 505.0, 510.0])
+
+        cubic = MagnetoPyBaseStationHelper.interpolate_readings(base_datetimes[:4], base_values[:4], stations_datetimes[:2], method='cubic')
+        np.testing.assert_allclose(cubic, [105.0, 125.0])
+
+        gaps = MagnetoPyBaseStationHelper.flag_base_gaps(base_datetimes, stations_datetimes, max_gap=60)
+        self.assertEqual(gaps.tolist(), [False, False, True, False, True])
+
+        with self.assertRaises(ValueError):
+            MagnetoPyBaseStationHelper.flag_base_gaps(base_datetimes[:0], stations_datetimes, max_gap=60)
+
+        magnetopy_logging.info('TestMagnetoPyBaseStationHelper: test_interpolate_readings_and_gaps passed successfully.')
+
+    def test_nearest_base_readings(self):
+        """
+        Test the space-time selection of several base stations against a brute force search.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyBaseStationHelper')
+
+        rng = np.random.default_rng(2)
+        start = np.datetime64('2019-03-26T08:00:00', 'ns')
+        n_bases = 40
+
+        # Every base records a different time window, every 20 s
+        base_lats, base_lons = rng.uniform(19, 20, n_bases), rng.uniform(-102, -101, n_bases)
+        windows = rng.integers(0, 6 * 3600, (n_bases, 2))
+        base_ids, base_datetimes = [], []
+        for base in range(n_bases):
+            seconds = np.arange(windows[base].min(), windows[base].max() + 20, 20)
+            base_ids.append(np.full(seconds.size, base))
+            base_datetimes.append(start + seconds.astype('timedelta64[s]'))
+        base_ids = np.concatenate(base_ids)
+        base_datetimes = np.concatenate(base_datetimes)
+        shuffle = rng.permutation(base_ids.size)
+        base_ids, base_datetimes = base_ids[shuffle], base_datetimes[shuffle]
+
+        stations_lats, stations_lons = rng.uniform(19, 20, 500), rng.uniform(-102, -101, 500)
+        stations_datetimes = start + rng.integers(0, 6 * 3600, 500).astype('timedelta64[s]')
+
+        readings, distances, valid = MagnetoPyBaseStationHelper.nearest_base_readings(
+            base_ids, base_lats[base_ids], base_lons[base_ids], base_datetimes,
+            stations_lats, stations_lons, stations_datetimes, candidates=n_bases
+        )
+
+        base_vectors = MagnetoPyBaseStationHelper.unit_vectors(base_lats, base_lons)
+        for station in range(500):
+            station_vector = MagnetoPyBaseStationHelper.unit_vectors(stations_lats[station:station + 1], stations_lons[station:station + 1])[0]
+            covering = [base for base in np.argsort(np.linalg.norm(base_vectors - station_vector, axis=1))
+                        if base_datetimes[base_ids == base].min() <= stations_datetimes[station] <= base_datetimes[base_ids == base].max()]
+            base = base_ids[readings[station]]
+            self.assertEqual(valid[station], bool(covering))
+            if covering:
+                self.assertEqual(base, covering[0])
+            time_diffs = np.abs(base_datetimes[base_ids == base] - stations_datetimes[station])
+            self.assertEqual(np.abs(base_datetimes[readings[station]] - stations_datetimes[station]), time_diffs.min())
+
+        np.testing.assert_allclose(distances[0], 6371.2 * np.arccos(np.clip(base_vectors[base_ids[readings[0]]] @ MagnetoPyBaseStationHelper.unit_vectors(stations_lats[:1], stations_lons[:1])[0], -1, 1)), rtol=1e-6)
+
+        magnetopy_logging.info('TestMagnetoPyBaseStationHelper: test_nearest_base_readings passed successfully.')
+
+    def test_base_index_missing_values(self):
+        """
+        Test that missing date and time cells are read back from the base station index as missing values.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyBaseStationHelper')
+
+        base_stations_df = pd.DataFrame({
+            'date': pd.Series(['2020/01/01', None, '2020/01/02'], dtype=object),
+            'time': pd.Series(['08:00:00', '08:00:20', None], dtype=object),
+            'nT': [40000.0, 40001.0, np.nan],
+            'datetime': pd.to_datetime(['2020-01-01 08:00:00', None, None])
+        })
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_folder = os.path.join(tmp_dir, 'index')
+            MagnetoPyBaseStationHelper.write_base_index(base_stations_df, index_folder)
+            index_df = MagnetoPyBaseStationHelper.read_base_index(index_folder)
+
+            self.assertEqual(list(index_df['date']), ['2020/01/01', None, '2020/01/02'])
+            self.assertEqual(list(index_df['time']), ['08:00:00', '08:00:20', None])
+            self.assertTrue(np.isnan(index_df['nT'][2]))
+            self.assertTrue(pd.isna(index_df['datetime'][1]))
+            del index_df
+
+        magnetopy_logging.info('TestMagnetoPyBaseStationHelper: test_base_index_missing_values passed successfully.')
+
+    def test_base_index_memmap(self):
+        """
+        Test that the base station index keeps its columns memory-mapped and copies only the taken readings.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyBaseStationHelper')
+
+        base_stations_df = pd.DataFrame({
+            'date': pd.Series(['2020/01/01'] * 3 + ['2020/01/02'] * 3, dtype=object),
+            'nT': np.arange(6, dtype=float),
+            'datetime': pd.date_range('2020-01-01 23:59:30', periods=6, freq='20s')
+        })
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_folder = os.path.join(tmp_dir, 'index')
+            MagnetoPyBaseStationHelper.write_base_index(base_stations_df, index_folder)
+            index_df = MagnetoPyBaseStationHelper.read_base_index(index_folder)
+            index_df.columns = ['base_' + col for col in index_df.columns]
+
+            for col in index_df.columns:
+                values = index_df.memmap(col)
+                self.assertTrue(isinstance(values, np.memmap) or isinstance(values.base, np.memmap))
+            self.assertIsInstance(index_df['base_nT'], np.memmap)
+            self.assertIsInstance(index_df['base_datetime'], np.memmap)
+
+            taken_df = index_df.take(np.array([4, 1]))
+            self.assertEqual(list(taken_df.columns), ['base_date', 'base_nT', 'base_datetime'])
+            self.assertEqual(list(taken_df['base_date']), ['2020/01/02', '2020/01/01'])
+            self.assertEqual(list(taken_df['base_nT']), [4.0, 1.0])
+            self.assertEqual(list(taken_df['base_datetime']), list(base_stations_df['datetime'].take([4, 1])))
+            self.assertNotIsInstance(taken_df['base_nT'].to_numpy(), np.memmap)
+            del index_df, values
+
+        magnetopy_logging.info('TestMagnetoPyBaseStationHelper: test_base_index_memmap passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()
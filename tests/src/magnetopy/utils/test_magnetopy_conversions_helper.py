@@ -0,0 +1,57 @@
+from logging import getLogger
+from datetime import datetime
+
+import unittest
+import numpy as np
+import pandas as pd
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_conversions_helper import MagnetoPyConversionsHelper
+
+
+class TestMagnetoPyConversionsHelper(unittest.TestCase):
+    def test_convert_datetime64_to_decimal_dates(self):
+        """
+        Test the vectorized decimal dates against the scalar conversion, on leap and common
+        years, and the time of day against the exact fraction of the year.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyConversionsHelper')
+
+        rng = np.random.default_rng(0)
+        days = np.concatenate([
+            rng.integers(-25_000, 47_000, 2000),
+            # Century and leap year boundaries
+            (np.array(['1900-03-01', '2000-02-29', '2000-12-31', '2024-02-29', '2100-03-01'], dtype='datetime64[D]') - np.datetime64('1970-01-01', 'D')).astype(np.int64)
+        ])
+        dates = np.datetime64('1970-01-01', 'D') + days.astype('timedelta64[D]')
+
+        expected = [MagnetoPyConversionsHelper.convert_date_to_decimal_date(str(date)) for date in dates]
+        result = MagnetoPyConversionsHelper.convert_datetime64_to_decimal_dates(dates)
+
+        self.assertTrue(np.array_equal(result, expected))
+
+        seconds = rng.integers(0, 86_400 * 1_000_000, dates.size)
+        datetimes = dates.astype('datetime64[us]') + seconds.astype('timedelta64[us]')
+        expected = []
+        for value in datetimes.astype(datetime):
+            start_of_year = datetime(value.year, 1, 1)
+            expected.append(value.year + (value - start_of_year).total_seconds() / (datetime(value.year + 1, 1, 1) - start_of_year).total_seconds())
+        result = MagnetoPyConversionsHelper.convert_datetime64_to_decimal_dates(datetimes)
+
+        np.testing.assert_allclose(result, expected, rtol=0, atol=1e-12)
+
+        series = pd.Series(pd.to_datetime(['2019-03-26 12:00:00', None, '2020-12-31 23:59:59']), index=[5, 6, 7])
+        result = MagnetoPyConversionsHelper.convert_datetimes_to_decimal_dates(series)
+
+        self.assertEqual(result.index.tolist(), [5, 6, 7])
+        self.assertAlmostEqual(result[5], 2019 + 84.5 / 365, places=12)
+        self.assertTrue(np.isnan(result[6]))
+        self.assertAlmostEqual(result[7], 2021 - 1 / 86_400 / 366, places=12)
+
+        magnetopy_logging.info('TestMagnetoPyConversionsHelper: test_convert_datetime64_to_decimal_dates passed successfully.')
+
+
+if __name__ == '__main__':
+    unittest.main()
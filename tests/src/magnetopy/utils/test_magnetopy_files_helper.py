@@ -0,0 +1,159 @@
+from logging import getLogger
+
+import os
+import shutil
+import unittest
+import numpy as np
+import pandas as pd
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_files_helper import MagnetoPyFilesHelper, MagnetoPyChunkWriter
+
+
+class TestMagnetoPyFilesHelper(unittest.TestCase):
+    def test_parse_date_time_columns(self):
+        """
+        Test that the column parser normalizes every supported date and time format and drops and reports the rows that fail, which the caller logs or raises.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyFilesHelper')
+
+        df = pd.DataFrame({
+            'date': ['26/03/2019', '27/03/2019', '2019-03-28', 'not a date', '29/03/2019'],
+            'time': [120204, 95959, '01:02:03 PM', 120000, 'noon'],
+            'nT': [1.0, 2.0, 3.0, 4.0, 5.0]
+        })
+
+        result, failed_rows = MagnetoPyFilesHelper.parse_date_time_columns(df.copy(), 'date', 'time')
+
+        self.assertEqual(result['date'].tolist(), ['2019-03-26', '2019-03-27', '2019-03-28'])
+        self.assertEqual(result['time'].tolist(), ['12:02:04', '09:59:59', '13:02:03'])
+        self.assertEqual(result['nT'].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(result['datetime'].tolist(), pd.to_datetime(result['date'] + ' ' + result['time']).tolist())
+
+        self.assertEqual(list(failed_rows.columns), ['row', 'date', 'time', 'invalid'])
+        self.assertEqual(failed_rows['row'].tolist(), [3, 4])
+        self.assertEqual(failed_rows['date'].tolist(), ['not a date', '29/03/2019'])
+        self.assertEqual(failed_rows['time'].tolist(), [120000, 'noon'])
+        self.assertEqual(failed_rows['invalid'].tolist(), ['date', 'time'])
+
+        both_failed, both_failed_rows = MagnetoPyFilesHelper.parse_date_time_columns(df.iloc[[0, 3]].assign(time=['120204', 'noon']), 'date', 'time')
+        self.assertEqual(len(both_failed), 1)
+        self.assertEqual(both_failed_rows.to_dict('records'), [{'row': 3, 'date': 'not a date', 'time': 'noon', 'invalid': 'date,time'}])
+
+        # The caller logs the dropped rows or stops
+        with self.assertLogs('MagnetoPyFilesHelper', level='WARNING') as logs:
+            MagnetoPyFilesHelper.check_failed_rows(failed_rows, 'stations.csv')
+        self.assertIn('2 rows of "stations.csv" with an invalid date or time were dropped, rows: 3, 4', logs.output[0])
+        with self.assertRaises(ValueError):
+            MagnetoPyFilesHelper.check_failed_rows(failed_rows, 'stations.csv', 'raise')
+        MagnetoPyFilesHelper.check_failed_rows(failed_rows.iloc[:0], 'stations.csv', 'raise')
+
+        magnetopy_logging.info('TestMagnetoPyFilesHelper: test_parse_date_time_columns passed successfully.')
+
+    def test_read_columns(self):
+        """
+        Test the column-projected reader, its explicit dtypes, its chunks and the header verification.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyFilesHelper')
+
+        file_path = os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv')
+        columns = ['date', 'time', 'gpslat', 'gpslon', 'magfield']
+        dtypes = MagnetoPyFilesHelper.column_dtypes(columns)
+
+        df = MagnetoPyFilesHelper.read_columns(file_path, columns, dtypes=dtypes)
+        expected_df = pd.read_csv(file_path, dtype={'time': str})[columns]
+
+        self.assertEqual(list(df.columns), columns)
+        self.assertTrue(df.equals(expected_df))
+
+        chunks = list(MagnetoPyFilesHelper.read_columns(file_path, columns, dtypes=dtypes, chunksize=50))
+        self.assertEqual([len(chunk) for chunk in chunks], [50, 50, 50, 20])
+        self.assertTrue(pd.concat(chunks).equals(expected_df))
+
+        self.assertIsNone(MagnetoPyFilesHelper.read_columns(file_path, columns + ['altitude']))
+        self.assertIsNone(MagnetoPyFilesHelper.read_columns(file_path + '.missing', columns))
+
+        magnetopy_logging.info('TestMagnetoPyFilesHelper: test_read_columns passed successfully.')
+
+    def test_chunk_writer(self):
+        """
+        Test that every output format written in chunks reads back as the written columns, with the npz dtypes widened by later chunks.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyFilesHelper')
+
+        columns = ['date', 'time', 'gpslat', 'gpslon', 'magfield']
+        df = MagnetoPyFilesHelper.read_columns(os.path.abspath('resources/data_examples/cerritos_datos_estaciones.csv'), columns, MagnetoPyFilesHelper.column_dtypes(columns))
+        output_cols = ['date', 'gpslat', 'magfield']
+
+        try:
+            for output_format, compression in [('csv', None), ('csv', 'gzip'), ('parquet', 'zstd'), ('feather', 'lz4'), ('npz', 'zip')]:
+                writer = MagnetoPyChunkWriter('test_chunk_writer', output_format, compression, output_cols)
+                for start in range(0, len(df), 64):
+                    writer.write(df.iloc[start:start + 64])
+                file_path = writer.close()
+
+                output_df = MagnetoPyFilesHelper.read_data(file_path, output_cols)
+                self.assertEqual(writer.rows, len(df))
+                pd.testing.assert_frame_equal(output_df, df[output_cols], check_dtype=False)
+
+            # Later chunks widen the dtypes of the first one: an integer column gets a NaN and a text column longer strings
+            writer = MagnetoPyChunkWriter('test_chunk_writer', 'npz')
+            writer.write(pd.DataFrame({'count': [1, 2], 'label': ['a', 'b']}))
+            writer.write(pd.DataFrame({'count': [np.nan, 4.5], 'label': ['long label', 'c']}))
+            with np.load(writer.close()) as data:
+                np.testing.assert_array_equal(data['index'], [0, 1, 2, 3])
+                np.testing.assert_array_equal(data['count'], [1.0, 2.0, np.nan, 4.5])
+                self.assertEqual(data['label'].tolist(), ['a', 'b', 'long label', 'c'])
+
+            with self.assertRaises(ValueError):
+                MagnetoPyChunkWriter('test_chunk_writer', 'feather', 'gzip')
+        finally:
+            shutil.rmtree(os.path.abspath('resources/test_chunk_writer'), ignore_errors=True)
+
+        magnetopy_logging.info('TestMagnetoPyFilesHelper: test_chunk_writer passed successfully.')
+
+    def test_chunk_writer_dtype_changes(self):
+        """
+        Test that every output format holds chunks whose dtypes change: an integer column that gets a NaN and a text column that starts with only missing values.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyFilesHelper')
+
+        chunks = [pd.DataFrame({'count': [1, 2], 'label': [None, None]}),
+                  pd.DataFrame({'count': [np.nan, 4.0], 'label': ['long label', None]}),
+                  pd.DataFrame({'count': [5, 6], 'label': ['c', 'd']})]
+        expected_count = [1.0, 2.0, np.nan, 4.0, 5.0, 6.0]
+        expected_label = [None, None, 'long label', None, 'c', 'd']
+
+        try:
+            for output_format, compression in [('csv', None), ('csv', 'gzip'), ('parquet', 'zstd'), ('feather', 'lz4'), ('npz', 'zip')]:
+                writer = MagnetoPyChunkWriter('test_chunk_writer', output_format, compression)
+                for chunk in chunks:
+                    writer.write(chunk)
+                file_path = writer.close()
+
+                output_df = MagnetoPyFilesHelper.read_data(file_path, ['count', 'label'])
+                self.assertIsNotNone(output_df, output_format)
+                np.testing.assert_array_equal(output_df['count'].to_numpy(dtype=float), expected_count)
+                self.assertEqual([None if pd.isna(label) else label for label in output_df['label']], expected_label, output_format)
+
+            # Chunks that no shared type can hold are rejected
+            writer = MagnetoPyChunkWriter('test_chunk_writer', 'parquet')
+            writer.write(pd.DataFrame({'count': [1, 2]}))
+            writer.write(pd.DataFrame({'count': ['a', 'b']}))
+            with self.assertRaises(ValueError):
+                writer.close()
+        finally:
+            shutil.rmtree(os.path.abspath('resources/test_chunk_writer'), ignore_errors=True)
+
+        magnetopy_logging.info('TestMagnetoPyFilesHelper: test_chunk_writer_dtype_changes passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()
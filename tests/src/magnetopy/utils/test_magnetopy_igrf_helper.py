@@ -0,0 +1,198 @@
+from logging import getLogger
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from scipy import interpolate
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_igrf_helper import MagnetoPyIGRFHelper, IGRFCoefficientProvider, IGRFLookupTable
+
+
+class TestMagnetoPyIGRFHelper(unittest.TestCase):
+    def setUp(self):
+        self.magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyIGRFHelper')
+        self.magnetopyIGRFHelper = MagnetoPyIGRFHelper()
+        self.igrf = self.magnetopyIGRFHelper.load_igrf_coefficients()
+
+        rng = np.random.default_rng(0)
+        self.radius = 6371.2 + rng.uniform(0, 10, 3000)
+        self.theta = rng.uniform(0, 180, 3000)
+        self.theta[:2] = [0., 180.]
+        self.phi = rng.uniform(-180, 180, 3000)
+
+    def test_synth_values_matrix_kernel(self):
+        """
+        Test that the matrix kernel agrees with the reference loop kernel, for one and several coefficient sets.
+
+        :return: Nothing to return
+        """
+        coeffs = self.igrf.coeffs[:, -3:].T
+
+        for nmin in [1, 3]:
+            matrix = self.magnetopyIGRFHelper.synth_values(coeffs, self.radius, self.theta, self.phi, nmin=nmin, kernel='matrix')
+
+            for k in range(coeffs.shape[0]):
+                loop = self.magnetopyIGRFHelper.synth_values(coeffs[k], self.radius, self.theta, self.phi, nmin=nmin)
+                for B_matrix, B_loop in zip(matrix, loop):
+                    np.testing.assert_allclose(B_matrix[k], B_loop, rtol=0, atol=1e-8)
+
+        grid = self.magnetopyIGRFHelper.synth_values(coeffs[0], 6371.2, self.theta[2:12], self.phi[:5], grid=True)
+        grid_matrix = self.magnetopyIGRFHelper.synth_values(coeffs[0], 6371.2, self.theta[2:12], self.phi[:5], grid=True, kernel='matrix')
+        for B_matrix, B_loop in zip(grid_matrix, grid):
+            np.testing.assert_allclose(B_matrix, B_loop, rtol=0, atol=1e-8)
+
+        self.magnetopy_logging.info('TestMagnetoPyIGRFHelper: test_synth_values_matrix_kernel passed successfully.')
+
+    def test_synth_values_stack(self):
+        """
+        Test that a stack of coefficient sets gives the same components as one synth_values call per set, at points and on a grid.
+
+        :return: Nothing to return
+        """
+        coeffs = self.igrf.coeffs[:, -1]
+        per_point_coeffs = self.igrf.coeffs[:, -3:].T[np.arange(self.theta.size) % 3]
+        coeffs_sv = self.igrf.coeffs[:, -1] - self.igrf.coeffs[:, -2]
+
+        stacked = self.magnetopyIGRFHelper.synth_values_stack([coeffs, per_point_coeffs, coeffs_sv], self.radius, self.theta, self.phi)
+        for k, coeffs_set in enumerate([coeffs, per_point_coeffs, coeffs_sv]):
+            single = self.magnetopyIGRFHelper.synth_values(coeffs_set, self.radius, self.theta, self.phi)
+            for B_stacked, B_single in zip(stacked, single):
+                np.testing.assert_allclose(B_stacked[k], B_single, rtol=0, atol=1e-9)
+
+        stacked = self.magnetopyIGRFHelper.synth_values_stack([coeffs, coeffs_sv], 6371.2, self.theta[2:12], self.phi[:5], grid=True)
+        for k, coeffs_set in enumerate([coeffs, coeffs_sv]):
+            single = self.magnetopyIGRFHelper.synth_values(coeffs_set, 6371.2, self.theta[2:12], self.phi[:5], grid=True)
+            for B_stacked, B_single in zip(stacked, single):
+                self.assertEqual(B_stacked[k].shape, (10, 5))
+                np.testing.assert_allclose(B_stacked[k], B_single, rtol=0, atol=1e-9)
+
+        with self.assertRaises(ValueError):
+            self.magnetopyIGRFHelper.synth_values_stack([coeffs, per_point_coeffs[:10]], self.radius, self.theta, self.phi)
+
+        self.magnetopy_logging.info('TestMagnetoPyIGRFHelper: test_synth_values_stack passed successfully.')
+
+    def test_legendre_poly_packed(self):
+        """
+        Test that the packed Legendre engine agrees with the dense reference layout and that it and the synthesis reuse the output buffer.
+
+        :return: Nothing to return
+        """
+        nmax = self.igrf.parameters['nmax']
+        Pnm = self.magnetopyIGRFHelper.legendre_poly(nmax, self.theta)
+
+        out = np.empty((2, (nmax+1)*(nmax+2)//2, self.theta.size))
+        packed = self.magnetopyIGRFHelper.legendre_poly_packed(nmax, self.theta, out=out)
+        self.assertIs(packed, out)
+
+        for n in range(nmax+1):
+            for m in range(n+1):
+                np.testing.assert_allclose(packed[0, n*(n+1)//2 + m], Pnm[n, m], rtol=0, atol=1e-12)
+                np.testing.assert_allclose(packed[1, n*(n+1)//2 + m], Pnm[m, n+1], rtol=0, atol=1e-12)
+
+        with self.assertRaises(ValueError):
+            self.magnetopyIGRFHelper.legendre_poly_packed(nmax, self.theta[:10], out=out)
+
+        # The synthesis computes its Legendre functions in the buffer passed down to it
+        expected = packed.copy()
+        out[:] = 0.
+        coeffs = self.igrf.coeffs[:, -1]
+        with_buffer = self.magnetopyIGRFHelper.synth_values(coeffs, self.radius, self.theta, self.phi, legendre_out=out)
+        without_buffer = self.magnetopyIGRFHelper.synth_values(coeffs, self.radius, self.theta, self.phi)
+        np.testing.assert_array_equal(out, expected)
+        for B_buffer, B in zip(with_buffer, without_buffer):
+            np.testing.assert_array_equal(B_buffer, B)
+
+        self.magnetopy_logging.info('TestMagnetoPyIGRFHelper: test_legendre_poly_packed passed successfully.')
+
+    def test_igrf_coefficients_cache(self):
+        """
+        Test that the binary cache returns the parsed coefficients and is invalidated when the shc-file content changes.
+
+        :return: Nothing to return
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shc_file = os.path.join(tmp_dir, 'IGRF13.shc')
+            shutil.copy(os.path.abspath('resources/igrf13/IGRF13.shc'), shc_file)
+
+            self.assertIsNone(self.magnetopyIGRFHelper.read_igrf_cache(shc_file))
+
+            time, coeffs, parameters = self.magnetopyIGRFHelper.parse_shc_file(shc_file)
+            self.magnetopyIGRFHelper.write_igrf_cache(shc_file, time, coeffs, parameters)
+
+            cached = self.magnetopyIGRFHelper.read_igrf_cache(shc_file)
+            np.testing.assert_array_equal(cached.time, self.igrf.time)
+            np.testing.assert_array_equal(cached.coeffs, self.igrf.coeffs)
+            self.assertEqual(cached.parameters, self.igrf.parameters)
+
+            with open(shc_file, 'a') as f:
+                f.write('# edited\n')
+            os.utime(shc_file, ns=(0, 0))
+            self.assertIsNone(self.magnetopyIGRFHelper.read_igrf_cache(shc_file))
+
+        self.magnetopy_logging.info('TestMagnetoPyIGRFHelper: test_igrf_coefficients_cache passed successfully.')
+
+    def test_igrf_coefficient_provider(self):
+        """
+        Test that the coefficient provider matches interp1d for scalar and vectorized dates and bounds its cache.
+
+        :return: Nothing to return
+        """
+        f = interpolate.interp1d(self.igrf.time, self.igrf.coeffs, fill_value='extrapolate')
+        provider = IGRFCoefficientProvider(self.igrf, cache_size=4)
+
+        np.testing.assert_allclose(provider.coefficients(2019.23), f(2019.23))
+
+        dates = np.array([2019.23, 2021.5, 2019.23, 2026.1, 2014.9])
+        np.testing.assert_allclose(provider.coefficients(dates), f(dates).T)
+        np.testing.assert_allclose(provider.coefficients(2003.2), f(2003.2))
+        self.assertEqual(provider.cache_info()['dates'], 4)
+
+        dates = np.linspace(1990, 2024, 50)
+        np.testing.assert_allclose(provider.coefficients(dates), f(dates).T)
+        self.assertEqual(provider.cache_info()['dates'], 4)
+
+        coeffs_sv, coeffsm = provider.epoch_coefficients(2019.23)
+        np.testing.assert_allclose(coeffsm, f(2015.0))
+        np.testing.assert_allclose(coeffs_sv, f(2016.0) - f(2015.0))
+
+        self.magnetopy_logging.info('TestMagnetoPyIGRFHelper: test_igrf_coefficient_provider passed successfully.')
+
+    def test_igrf_lookup_table(self):
+        """
+        Test that the lookup table is within its tolerance of the exact synthesis and leaves the points it does not cover as NaN.
+
+        :return: Nothing to return
+        """
+        provider = IGRFCoefficientProvider(self.igrf)
+        nmax = self.igrf.parameters['nmax']
+        table = IGRFLookupTable(self.magnetopyIGRFHelper, self.igrf, provider, 2020.5, (20, 21), (-105, -104), (0, 3), tolerance=0.05)
+        self.assertLessEqual(table.max_error, 0.05)
+
+        rng = np.random.default_rng(1)
+        lat, lon, altitude = rng.uniform(20, 21, 2000), rng.uniform(-105, -104, 2000), rng.uniform(0, 3, 2000)
+        dates = rng.uniform(2020.0, 2024.9, 2000)
+
+        components, covered = table.components(lat, lon, altitude, dates)
+        self.assertTrue(covered.all())
+
+        coeffs_sv, coeffsm = provider.epoch_coefficients(dates)
+        exact = self.magnetopyIGRFHelper.igrf_components(provider.coefficients(dates), coeffs_sv, coeffsm, altitude, lat, lon, nmax)
+        for key in ['X', 'Y', 'Z', 'hoz', 'eff']:
+            np.testing.assert_allclose(components[key], exact[key], rtol=0, atol=0.05)
+        for key in ['dX', 'dY', 'dZ', 'effs']:
+            np.testing.assert_allclose(components[key], exact[key], rtol=0, atol=1e-3)
+        for key in ['dec', 'inc', 'decs', 'incs']:
+            np.testing.assert_allclose(components[key], exact[key], rtol=0, atol=1e-4)
+
+        # Outside the box or the epoch of the table
+        components, covered = table.components(np.array([19.5, 20.5]), np.array([-104.5, -104.5]), 1.0, np.array([2020.5, 2019.5]))
+        self.assertFalse(covered.any())
+        self.assertTrue(np.isnan(components['eff']).all())
+
+        self.magnetopy_logging.info('TestMagnetoPyIGRFHelper: test_igrf_lookup_table passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+from logging import getLogger
+
+import io
+import sys
+import logging
+import unittest
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+
+
+class TestMagnetopyLogging(unittest.TestCase):
+    def test_set_level(self):
+        """
+        Test that loggers are created once and that the level applies to existing and new loggers.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetopyLogging')
+
+        self.assertIs(MagnetopyLogging.create_magnetopy_logging(logger='TestMagnetopyLogging'), magnetopy_logging)
+        self.assertEqual(len(magnetopy_logging.handlers), 1)
+
+        stream = io.StringIO()
+        magnetopy_logging.handlers[0].stream = stream
+
+        try:
+            MagnetopyLogging.set_level('warning')
+            magnetopy_logging.info('hidden record')
+            magnetopy_logging.warning('shown record')
+            self.assertEqual(MagnetopyLogging.create_magnetopy_logging(logger='TestMagnetopyLogging: new').level, logging.WARNING)
+        finally:
+            MagnetopyLogging.set_level(logging.DEBUG)
+            magnetopy_logging.handlers[0].stream = sys.stderr
+
+        self.assertNotIn('hidden record', stream.getvalue())
+        self.assertIn('shown record', stream.getvalue())
+
+        with self.assertRaises(ValueError):
+            MagnetopyLogging.set_level('verbose')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+from logging import getLogger
+
+import unittest
+import numpy as np
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_plot_helper import MagnetoPyPlotHelper
+
+
+class TestMagnetoPyPlotHelper(unittest.TestCase):
+    def test_minmax_downsample(self):
+        """
+        Test that the min/max downsampling keeps the extremes of every bucket in order.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyPlotHelper')
+
+        rng = np.random.default_rng(0)
+        y = rng.normal(size=100_003)
+        y[51_234] = 50.0
+        x = np.arange(y.size)
+
+        sampled_x, sampled_y = MagnetoPyPlotHelper.minmax_downsample(x, y, 500)
+
+        self.assertLessEqual(sampled_x.size, 1000)
+        self.assertTrue(np.all(np.diff(sampled_x) > 0))
+        self.assertTrue(np.array_equal(sampled_y, y[sampled_x]))
+        self.assertEqual(sampled_y.max(), 50.0)
+        self.assertEqual(sampled_y.min(), y.min())
+
+        bucket_size = -(-y.size // 500)
+        buckets = sampled_x // bucket_size
+        for bucket in [0, 250, buckets[-1]]:
+            bucket_values = y[bucket * bucket_size:(bucket + 1) * bucket_size]
+            self.assertEqual(set(sampled_y[buckets == bucket]), {bucket_values.min(), bucket_values.max()})
+
+        magnetopy_logging.info('TestMagnetoPyPlotHelper: test_minmax_downsample passed successfully.')
+
+    def test_lttb_downsample(self):
+        """
+        Test the LTTB downsampling against a straightforward implementation of the algorithm.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyPlotHelper')
+
+        rng = np.random.default_rng(1)
+        y = np.cumsum(rng.normal(size=10_000))
+        x = np.arange(y.size)
+        threshold = 300
+
+        sampled_x, sampled_y = MagnetoPyPlotHelper.lttb_downsample(x, y, threshold)
+
+        every = (y.size - 2) / (threshold - 2)
+        expected = [0]
+        for bucket in range(threshold - 2):
+            start = int(np.floor(bucket * every)) + 1
+            stop = int(np.floor((bucket + 1) * every)) + 1
+            next_stop = min(int(np.floor((bucket + 2) * every)) + 1, y.size - 1)
+            if bucket == threshold - 3:
+                average_x, average_y = x[-1], y[-1]
+            else:
+                average_x, average_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+            a = expected[-1]
+            areas = [abs((x[a] - average_x) * (y[i] - y[a]) - (x[a] - x[i]) * (average_y - y[a])) for i in range(start, stop)]
+            expected.append(start + int(np.argmax(areas)))
+        expected.append(y.size - 1)
+
+        self.assertEqual(sampled_x.size, threshold)
+        self.assertTrue(np.array_equal(sampled_x, expected))
+
+        magnetopy_logging.info('TestMagnetoPyPlotHelper: test_lttb_downsample passed successfully.')
+
+    def test_downsample_nan(self):
+        """
+        Test that NaN values are dropped and short profiles are returned unchanged.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyPlotHelper')
+
+        y = np.array([1.0, np.nan, 3.0, 2.0])
+        x, y = MagnetoPyPlotHelper.downsample(np.arange(4), y, 100, 'lttb')
+
+        self.assertTrue(np.array_equal(x, [0, 2, 3]))
+        self.assertTrue(np.array_equal(y, [1.0, 3.0, 2.0]))
+        self.assertRaises(ValueError, MagnetoPyPlotHelper.downsample, x, y, 100, 'mean')
+
+        magnetopy_logging.info('TestMagnetoPyPlotHelper: test_downsample_nan passed successfully.')
+
+
+if __name__ == '__main__':
+    unittest.main()
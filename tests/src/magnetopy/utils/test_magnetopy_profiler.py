@@ -0,0 +1,43 @@
+from logging import getLogger
+
+import unittest
+import tracemalloc
+import numpy as np
+
+from src.magnetopy.magnetopy_utils.magnetopy_logging import MagnetopyLogging
+from src.magnetopy.magnetopy_utils.magnetopy_profiler import MagnetoPyProfiler
+
+
+class TestMagnetoPyProfiler(unittest.TestCase):
+    def test_nested_stages_memory_peak(self):
+        """
+        Test that a stage keeps the memory peak of the stages nested in it, also when they belong to another profiler.
+
+        :return: Nothing to return
+        """
+        magnetopy_logging: getLogger = MagnetopyLogging().create_magnetopy_logging(logger='TestMagnetoPyProfiler')
+
+        outer_profiler = MagnetoPyProfiler(enabled=True)
+        inner_profiler = MagnetoPyProfiler(enabled=True)
+
+        try:
+            with outer_profiler.stage('process_files'):
+                for _ in range(2):
+                    with inner_profiler.stage('synthesis'):
+                        buffer = np.ones(2 ** 22)
+                        del buffer
+                with outer_profiler.stage('save'):
+                    pass
+        finally:
+            tracemalloc.stop()
+
+        inner_peak = inner_profiler.stages['synthesis']['peak_memory_mb']
+        self.assertGreaterEqual(inner_peak, 32)
+        self.assertGreaterEqual(outer_profiler.stages['process_files']['peak_memory_mb'], inner_peak)
+        self.assertLess(outer_profiler.stages['save']['peak_memory_mb'], 1)
+        self.assertEqual(MagnetoPyProfiler.ACTIVE_STAGES, [])
+
+        magnetopy_logging.info('TestMagnetoPyProfiler: test_nested_stages_memory_peak passed successfully.')
+
+if __name__ == '__main__':
+    unittest.main()